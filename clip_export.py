@@ -0,0 +1,479 @@
+import collections
+import concurrent.futures
+import http.client
+import io
+import json
+import logging
+import os
+import pathlib
+import re
+import threading
+import time
+import urllib.request
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from clip_jobs import JobError, Segment
+
+logger = logging.getLogger(__name__)
+
+# Bytes copied per read from a clip response
+CHUNK_SIZE = 256 * 1024
+
+# Clip requests opened ahead of the one being copied
+DEFAULT_CONCURRENCY = 4
+
+# Largest form body accepted by the export server
+MAX_REQUEST_BYTES = 4 * 1024 * 1024
+
+# Archive entry listing the clips an export left out
+ERRORS_NAME = "export_errors.txt"
+
+_JOB_PATH_RE = re.compile(r"^/jobs/([0-9a-f]{64})(/result)?$")
+
+ExportClip = collections.namedtuple("ExportClip", ["name", "url", "start", "end"])
+ExportClip.__doc__ = "A clip to export; start and end are seconds within url, None for the whole file."
+
+
+class _BodyCutShort(Exception):
+    """
+    A clip body stopped part way and could not be resumed.
+    """
+
+
+class _StreamSink(io.RawIOBase):
+    """
+    Unseekable file object that collects what ZipFile writes until drained.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _open_clip(url, timeout, offset=0):
+    headers = {"User-Agent": "video-stream-player-export"}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+    request = urllib.request.Request(url, headers=headers)
+    response = urllib.request.urlopen(request, timeout=timeout)
+    if offset and getattr(response, "status", None) != 206:
+        response.close()
+        raise OSError(f"{url} does not support resuming")
+    return response
+
+
+def _open_entry(source, timeout):
+    # Windowed clips arrive as futures of their cut, a local file
+    if isinstance(source, concurrent.futures.Future):
+        source = pathlib.Path(source.result()).as_uri()
+    return _open_clip(source, timeout)
+
+
+def _copy_body(response, entry, name, url, chunk_size, timeout):
+    """
+    Copy a clip body into an open ZIP entry, yielding after every chunk.
+
+    A read that fails part way is resumed once with a Range request.
+
+    Raises:
+        _BodyCutShort: If the resume fails too.
+    """
+    length = int(response.headers.get("Content-Length") or 0)
+    copied = 0
+    resumed = False
+    try:
+        while True:
+            try:
+                chunk = response.read(chunk_size)
+                if not chunk and copied < length:
+                    # Partial reads report a dropped connection as the end of the body
+                    raise http.client.IncompleteRead(b"", length - copied)
+            except (OSError, http.client.HTTPException) as error:
+                # URLError and socket timeouts are OSErrors; a short body is IncompleteRead
+                response.close()
+                if not resumed:
+                    resumed = True
+                    try:
+                        response = _open_clip(url, timeout, copied)
+                        length = copied + int(response.headers.get("Content-Length") or 0)
+                        continue
+                    except (OSError, ValueError) as resume_error:
+                        error = resume_error
+                raise _BodyCutShort(f"stopped after {copied} bytes: {error}") from error
+            if not chunk:
+                return
+            entry.write(chunk)
+            copied += len(chunk)
+            yield
+    finally:
+        response.close()
+
+
+def stream_zip(clips, concurrency=DEFAULT_CONCURRENCY, chunk_size=CHUNK_SIZE, timeout=30):
+    """
+    Generate a STORE-mode ZIP of video clips while it is being produced.
+
+    Up to `concurrency` clip requests are opened ahead so round-trips
+    overlap, but bodies are copied one at a time, so memory stays around one
+    chunk no matter how large the archive gets. Clips that cannot be fetched
+    are skipped; a body that fails part way is resumed once with a Range
+    request, or else its entry is left out of the central directory. Either
+    way the archive ends with an export_errors.txt entry naming those clips.
+
+    Args:
+        clips (list): (file name, URL) pairs, in archive order. The URL may
+            be a Future of a local file path, such as a cut still being made;
+            it is waited for only when its entry is reached.
+        concurrency (int): Maximum number of clip requests open at once.
+        chunk_size (int): Bytes read from a response per iteration.
+        timeout (float): Socket timeout for clip requests, in seconds.
+
+    Yields:
+        bytes: Consecutive pieces of the archive.
+    """
+    concurrency = max(1, concurrency)
+    sink = _StreamSink()
+    pending = {}
+    failed = []
+    pool = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+
+    def start(index):
+        if index < len(clips) and index not in pending:
+            pending[index] = pool.submit(_open_entry, clips[index][1], timeout)
+
+    try:
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for index, (name, url) in enumerate(clips):
+                for ahead in range(index, index + concurrency):
+                    start(ahead)
+
+                try:
+                    response = pending.pop(index).result()
+                except (OSError, ValueError, RuntimeError) as error:
+                    # RuntimeError covers failed cuts (JobError)
+                    logger.warning("Skipping %s: %s", name, error)
+                    failed.append(f"{name}: {error}")
+                    continue
+
+                info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                length = int(response.headers.get("Content-Length") or 0)
+                try:
+                    with archive.open(info, "w", force_zip64=length > zipfile.ZIP64_LIMIT) as entry:
+                        for _ in _copy_body(response, entry, name, response.geturl(), chunk_size, timeout):
+                            yield sink.drain()
+                except _BodyCutShort as error:
+                    # Its bytes are already sent, but unzip tools list only the central directory
+                    logger.warning("Leaving out %s: %s", name, error)
+                    archive.filelist.remove(info)
+                    archive.NameToInfo.pop(info.filename, None)
+                    failed.append(f"{name}: {error}")
+                yield sink.drain()
+
+            if failed:
+                report = "Clips left out of this export:\n" + "".join(line + "\n" for line in failed)
+                archive.writestr(ERRORS_NAME, report)
+        yield sink.drain()
+    finally:
+        # Close responses opened ahead of a consumer that stopped early
+        pool.shutdown(wait=True, cancel_futures=True)
+        for future in pending.values():
+            if not future.cancelled() and future.exception() is None:
+                future.result().close()
+
+
+def _safe_name(name):
+    name = str(name).replace("\\", "/").split("/")[-1].strip()
+    return name or "clip.mp4"
+
+
+def _seconds(value):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise ValueError("Clip start and end must be non-negative numbers")
+    return float(value)
+
+
+def _clip_list(clips):
+    if not isinstance(clips, list):
+        raise ValueError("Expected a list of clips")
+
+    parsed = []
+    for clip in clips:
+        if not isinstance(clip, dict) or not isinstance(clip.get("url"), str):
+            raise ValueError("Every clip needs a url")
+        start, end = _seconds(clip.get("start")), _seconds(clip.get("end"))
+        if start is not None and end is not None and end <= start:
+            raise ValueError("Clip end must follow its start")
+        parsed.append(ExportClip(_safe_name(clip.get("name", "")), clip["url"], start, end))
+    return parsed
+
+
+def parse_clips(payload):
+    """
+    Validate an export request: a JSON list of {"name": ..., "url": ...},
+    optionally with "start" and "end" in seconds for a window of the URL.
+
+    Returns:
+        list: ExportClip tuples.
+
+    Raises:
+        ValueError: If the payload is malformed.
+    """
+    return _clip_list(json.loads(payload))
+
+
+class _ExportHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _send_json(self, status, value):
+        body = json.dumps(value).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "content-type")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        jobs = self.server.jobs
+        if url.path == "/jobs":
+            # Lets the player choose between server jobs and doing the work itself
+            self._send_json(200, {"jobs": jobs is not None})
+            return
+
+        match = _JOB_PATH_RE.match(url.path)
+        if match is None or jobs is None:
+            self.send_error(404)
+            return
+
+        job_id = match.group(1)
+        if not match.group(2):
+            status = jobs.status(job_id)
+            if status is None:
+                self._send_json(404, {"error": "Unknown job"})
+            else:
+                self._send_json(200, status)
+            return
+
+        path = jobs.result_path(job_id)
+        if path is None:
+            self.send_error(404, "Job not finished")
+            return
+        name = _safe_name(parse_qs(url.query).get("name", ["video.mp4"])[0])
+        # Keep the queue from evicting the video while it is sent
+        jobs.lease(path)
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            jobs.release(path)
+            self.send_error(404, "Job result was evicted")
+            return
+        try:
+            with f:
+                self.send_response(200)
+                self.send_header("Content-Type", "video/mp4")
+                self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+                self.send_header("Content-Disposition", f'attachment; filename="{name}"')
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+        finally:
+            jobs.release(path)
+
+    def _submit_job(self, body):
+        jobs = self.server.jobs
+        if jobs is None:
+            self._send_json(404, {"error": "This server has no job queue"})
+            return
+        try:
+            clips = _clip_list(json.loads(body).get("clips"))
+            if not clips:
+                raise ValueError("A job needs at least one clip")
+        except (ValueError, AttributeError) as error:
+            self._send_json(400, {"error": str(error)})
+            return
+
+        refused = [clip.url for clip in clips if not self.server.is_allowed(clip.url)]
+        if refused:
+            self._send_json(403, {"error": "Clip source not allowed: " + refused[0]})
+            return
+
+        try:
+            job_id = jobs.submit([Segment(clip.url, clip.start, clip.end) for clip in clips])
+        except (OSError, JobError) as error:
+            self._send_json(502, {"error": str(error)})
+            return
+        self._send_json(202, jobs.status(job_id))
+
+    def _zip_entries(self, clips):
+        """
+        Return (file name, URL) pairs for stream_zip, and the futures of the
+        cuts among them. Windowed clips are cut in the background and given
+        as futures of their cut, so the archive starts streaming before the
+        cuts are done. Each cut is leased until _release_cuts.
+        """
+        jobs = self.server.jobs
+        windowed = [clip for clip in clips if clip.start is not None or clip.end is not None]
+        if windowed and jobs is None:
+            logger.info("No job queue: exporting %d windowed clips as whole files", len(windowed))
+        if not windowed or jobs is None:
+            return [(clip.name, clip.url) for clip in clips], []
+
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.server.concurrency)
+        cuts = {clip: pool.submit(jobs.cut, Segment(clip.url, clip.start, clip.end)) for clip in windowed}
+        # Worker threads finish the queued cuts without anyone waiting here
+        pool.shutdown(wait=False)
+        return [(clip.name, cuts.get(clip, clip.url)) for clip in clips], list(cuts.values())
+
+    def _release_cuts(self, cuts):
+        def release(future):
+            if not future.cancelled() and future.exception() is None:
+                self.server.jobs.release(future.result())
+
+        # Cuts still running when the export ends are released once done
+        for future in cuts:
+            future.add_done_callback(release)
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            self.send_error(400, "Invalid Content-Length")
+            return
+        if length > MAX_REQUEST_BYTES:
+            self.send_error(413, "Export request too large")
+            return
+
+        try:
+            body = self.rfile.read(length).decode("utf-8")
+        except UnicodeDecodeError:
+            self.send_error(400, "Export request is not UTF-8")
+            return
+        if urlsplit(self.path).path == "/jobs":
+            self._submit_job(body)
+            return
+
+        try:
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                clips = parse_clips(body)
+            else:
+                # The player submits a form so the browser treats the reply as a download
+                clips = parse_clips(parse_qs(body).get("clips", ["[]"])[0])
+        except ValueError as error:
+            self.send_error(400, str(error))
+            return
+
+        refused = [clip.url for clip in clips if not self.server.is_allowed(clip.url)]
+        if refused:
+            self.send_error(403, "Clip source not allowed: " + refused[0])
+            return
+        entries, cuts = self._zip_entries(clips)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Disposition", 'attachment; filename="video_clips.zip"')
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            for chunk in stream_zip(entries, concurrency=self.server.concurrency):
+                if chunk:
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info("Export client disconnected")
+            self.close_connection = True
+        finally:
+            self._release_cuts(cuts)
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+class ExportServer(ThreadingHTTPServer):
+    """
+    HTTP server that answers POSTed clip lists with a streamed ZIP.
+
+    With a job queue it also cuts windowed clips before zipping them, and
+    runs cut and reel jobs: POST /jobs with {"clips": [...]} queues one and
+    returns its status, GET /jobs/<id> reports progress, and
+    GET /jobs/<id>/result?name=<file name> downloads the finished MP4.
+    GET /jobs answers {"jobs": false} for a server without a queue, which
+    also answers POST /jobs with 404; the player then cuts and joins clips
+    in the browser.
+
+    Args:
+        address (tuple): (host, port) to listen on.
+        concurrency (int): Clip requests opened ahead per export.
+        allowed_url_prefixes (list): If given, only clip URLs starting with
+            one of these prefixes are exported. Set this whenever the server
+            is reachable by untrusted users, since it fetches the URLs it is
+            sent.
+        jobs (clip_jobs.JobQueue): Queue that cuts and joins clips.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, concurrency=DEFAULT_CONCURRENCY, allowed_url_prefixes=None, jobs=None):
+        super().__init__(address, _ExportHandler)
+        self.concurrency = concurrency
+        self.allowed_url_prefixes = tuple(allowed_url_prefixes or ())
+        self.jobs = jobs
+
+    def is_allowed(self, url):
+        if not url.startswith(("http://", "https://")):
+            return False
+        return not self.allowed_url_prefixes or url.startswith(self.allowed_url_prefixes)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+
+def start_export_server(host="127.0.0.1", port=8502, **kwargs):
+    """
+    Run an ExportServer on a background thread.
+
+    Inside a Streamlit app, wrap this in st.cache_resource so the server is
+    started once per process, and pass its url to video_stream_player's
+    export_url.
+
+    Returns:
+        ExportServer: The running server.
+    """
+    server = ExportServer((host, port), **kwargs)
+    thread = threading.Thread(target=server.serve_forever, name="clip-export", daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,338 @@
+import collections
+import concurrent.futures
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+
+from source_version import read_version
+
+logger = logging.getLogger(__name__)
+
+# Disk space cut segments and finished videos may use before the least
+# recently used are removed
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+
+# Clips whose validators are looked up at once when a job is submitted
+VALIDATOR_CONCURRENCY = 8
+
+# Share of a job's progress taken by cutting; concatenation is the rest
+CUT_SHARE = 0.9
+
+Segment = collections.namedtuple("Segment", ["url", "start", "end"])
+Segment.__doc__ = "Part of a source video: start and end in seconds, None for the file's own ends."
+
+
+class JobError(RuntimeError):
+    pass
+
+
+def _source_id(url, timeout):
+    """
+    Return the validator and size that identify a source's content.
+    """
+    try:
+        version = read_version(url, timeout, "video-stream-player-jobs")
+    except urllib.error.HTTPError as error:
+        raise JobError(f"HTTP {error.code} for {url}") from None
+    return [version.validator, version.size]
+
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+def _run_ffmpeg(arguments):
+    completed = subprocess.run(["ffmpeg", "-v", "error", "-y"] + arguments, capture_output=True)
+    if completed.returncode != 0:
+        message = completed.stderr.decode("utf-8", "replace").strip().splitlines()
+        raise JobError(message[-1] if message else f"ffmpeg exited with {completed.returncode}")
+
+
+def cut_segment(segment, path, timeout=60):
+    """
+    Copy one segment of a source into an MP4 without re-encoding.
+
+    The cut starts at the keyframe at or before segment.start, so the result
+    may begin up to one GOP early. Timecode and data tracks are dropped so
+    segments can be concatenated.
+    """
+    arguments = ["-rw_timeout", str(int(timeout * 1_000_000))]
+    if segment.start:
+        # Input seeking with stream copy lands on the keyframe before start
+        arguments += ["-ss", str(segment.start)]
+    arguments += ["-i", segment.url]
+    if segment.end is not None:
+        arguments += ["-t", str(segment.end - (segment.start or 0))]
+    arguments += [
+        "-map", "0:v?", "-map", "0:a?", "-c", "copy",
+        "-avoid_negative_ts", "make_zero", "-movflags", "+faststart", "-f", "mp4", path,
+    ]
+    _run_ffmpeg(arguments)
+
+
+def concat_segments(paths, path):
+    """
+    Join MP4s with the same codecs into one, without re-encoding.
+    """
+    fd, list_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".txt")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for segment_path in paths:
+                escaped = os.path.abspath(segment_path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        _run_ffmpeg([
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            "-map", "0:v?", "-map", "0:a?", "-c", "copy", "-movflags", "+faststart", "-f", "mp4", path,
+        ])
+    finally:
+        os.remove(list_path)
+
+
+class JobQueue:
+    """
+    Cuts and joins clips into MP4 files by stream copy, in a process pool.
+
+    A job is a list of segments. A job with one segment yields that cut on
+    its own, and a longer one yields the segments joined into a single
+    video, such as a highlight reel. Jobs and cut segments are named by a
+    hash of their sources' URLs, validators (ETag or Last-Modified) and
+    sizes, and their times. Submitting a job that is already queued,
+    running or finished returns the same job, and reels sharing clips
+    share the cuts. When output_dir outgrows max_bytes, the least recently
+    used files are removed, except those leased to a running job or a
+    reader. Requires ffmpeg on the PATH.
+
+    Args:
+        output_dir (str): Where segments and finished videos are kept.
+        workers (int): ffmpeg processes run at once, one per CPU by default.
+        max_bytes (int): Disk space output_dir may use.
+        timeout (float): Network timeout for reading sources, in seconds.
+    """
+
+    def __init__(self, output_dir, workers=None, max_bytes=DEFAULT_MAX_BYTES, timeout=60):
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError("JobQueue needs ffmpeg on the PATH")
+
+        self.output_dir = output_dir
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        os.makedirs(os.path.join(output_dir, "segments"), exist_ok=True)
+        os.makedirs(os.path.join(output_dir, "results"), exist_ok=True)
+
+        self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._cuts = {}
+        # path -> number of holders; leased files are not evicted
+        self._leases = collections.Counter()
+
+    def _segment_path(self, digest):
+        return os.path.join(self.output_dir, "segments", f"{digest}.mp4")
+
+    def result_path(self, job_id):
+        """
+        Return the finished video of a job, or None while it is not done.
+        """
+        path = os.path.join(self.output_dir, "results", f"{job_id}.mp4")
+        if not os.path.exists(path):
+            return None
+        # Access times drive eviction and are often disabled on mounts
+        os.utime(path)
+        return path
+
+    def lease(self, path):
+        """
+        Keep a segment or finished video from being evicted until release is
+        called for it, for example while it is being sent to a client.
+        """
+        with self._lock:
+            self._leases[path] += 1
+
+    def release(self, path):
+        with self._lock:
+            self._leases[path] -= 1
+            if self._leases[path] <= 0:
+                del self._leases[path]
+
+    def status(self, job_id):
+        """
+        Return a job's state as a dict, or None for an unknown job.
+
+        The dict holds "id", "state" (queued, running, done or failed),
+        "progress" from 0 to 1, and "error" for failed jobs.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        # Finished by an earlier process
+        if self.result_path(job_id):
+            return {"id": job_id, "state": "done", "progress": 1.0, "error": None}
+        return None
+
+    def submit(self, segments):
+        """
+        Queue a job, or return the matching job if one exists.
+
+        Args:
+            segments (list): Segment tuples, in output order.
+
+        Returns:
+            str: The job id.
+
+        Raises:
+            JobError: If a source cannot be reached.
+        """
+        if not segments:
+            raise ValueError("A job needs at least one segment")
+
+        segments = [Segment(*segment) for segment in segments]
+        urls = list(dict.fromkeys(segment.url for segment in segments))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=VALIDATOR_CONCURRENCY) as pool:
+            source_ids = dict(zip(urls, pool.map(lambda url: _source_id(url, self.timeout), urls)))
+        digests = [_digest([s.url, source_ids[s.url], s.start, s.end]) for s in segments]
+        job_id = _digest(digests)
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["state"] != "failed":
+                return job_id
+            if self.result_path(job_id):
+                self._jobs[job_id] = {"id": job_id, "state": "done", "progress": 1.0, "error": None}
+                return job_id
+            self._jobs[job_id] = {"id": job_id, "state": "queued", "progress": 0.0, "error": None}
+
+        thread = threading.Thread(
+            target=self._run, args=(job_id, segments, digests), name=f"clip-job-{job_id[:8]}", daemon=True
+        )
+        thread.start()
+        return job_id
+
+    def cut(self, segment):
+        """
+        Cut one segment and wait for it.
+
+        Returns:
+            str: Path of the cut, kept in the segment cache. It is leased to
+            the caller, who must release it once done reading.
+        """
+        segment = Segment(*segment)
+        digest = _digest([segment.url, _source_id(segment.url, self.timeout), segment.start, segment.end])
+        path = self._segment_path(digest)
+        self.lease(path)
+        try:
+            return self._cut(segment, digest).result()
+        except BaseException:
+            self.release(path)
+            raise
+
+    def _cut(self, segment, digest):
+        """
+        Return a future for a cut, sharing one in progress for the same segment.
+        """
+        path = self._segment_path(digest)
+        with self._lock:
+            future = self._cuts.get(digest)
+            if future is not None:
+                return future
+            if os.path.exists(path):
+                os.utime(path)
+                future = concurrent.futures.Future()
+                future.set_result(path)
+                return future
+
+            temp_path = path + ".part"
+            future = concurrent.futures.Future()
+            self._cuts[digest] = future
+            work = self._pool.submit(cut_segment, segment, temp_path, self.timeout)
+
+        def finished(work):
+            with self._lock:
+                self._cuts.pop(digest, None)
+            try:
+                work.result()
+                os.replace(temp_path, path)
+            except BaseException as error:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                future.set_exception(error)
+            else:
+                future.set_result(path)
+
+        work.add_done_callback(finished)
+        return future
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _run(self, job_id, segments, digests):
+        started = time.monotonic()
+        self._update(job_id, state="running")
+        result = os.path.join(self.output_dir, "results", f"{job_id}.mp4")
+        # Other jobs finishing meanwhile must not evict this job's segments
+        leased = [self._segment_path(digest) for digest in digests]
+        for path in leased:
+            self.lease(path)
+        try:
+            futures = [self._cut(segment, digest) for segment, digest in zip(segments, digests)]
+            for done, _ in enumerate(concurrent.futures.as_completed(futures), 1):
+                self._update(job_id, progress=CUT_SHARE * done / len(futures))
+            paths = [future.result() for future in futures]
+
+            temp_path = result + ".part"
+            if len(paths) == 1:
+                shutil.copyfile(paths[0], temp_path)
+            else:
+                self._pool.submit(concat_segments, paths, temp_path).result()
+            os.replace(temp_path, result)
+        except (OSError, ValueError, RuntimeError) as error:
+            # RuntimeError covers JobError and a broken process pool
+            logger.warning("Job %s failed: %s", job_id, error)
+            if os.path.exists(result + ".part"):
+                os.remove(result + ".part")
+            self._update(job_id, state="failed", error=str(error))
+            return
+        finally:
+            for path in leased:
+                self.release(path)
+
+        self._update(job_id, state="done", progress=1.0)
+        logger.info("Job %s: %d segments in %.1fs", job_id, len(segments), time.monotonic() - started)
+        self._evict()
+
+    def _evict(self):
+        files = []
+        for folder in ("segments", "results"):
+            directory = os.path.join(self.output_dir, folder)
+            for name in os.listdir(directory):
+                if name.endswith(".mp4"):
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            with self._lock:
+                if path in self._leases:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,267 @@
+import asyncio
+import collections
+import http.client
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from mp4_parser import LARGE_BOX_HEADER_SIZE, MP4Error, parse_movie, read_box_header
+from source_version import read_version, response_version
+
+logger = logging.getLogger(__name__)
+
+# Bytes requested from the start of a clip; enough for ftyp and most moov boxes
+HEAD_BYTES = 64 * 1024
+
+# Top-level boxes skipped while looking for moov before giving up
+MAX_BOX_HOPS = 16
+
+# Largest moov box read, so a corrupt size cannot trigger a huge download
+MAX_MOOV_BYTES = 64 * 1024 * 1024
+
+DEFAULT_CONCURRENCY = 16
+
+USER_AGENT = "video-stream-player-probe"
+
+ClipInfo = collections.namedtuple(
+    "ClipInfo", ["url", "size", "duration", "codecs", "width", "height", "error"]
+)
+ClipInfo.__doc__ = """
+Probe result. codecs is an RFC 6381 string such as "avc1.640028, mp4a.40.2";
+error is None for playable clips and a short reason otherwise.
+"""
+
+
+class _RangesUnsupported(Exception):
+    pass
+
+
+class ProbeCache:
+    """
+    SQLite store of probe results, keyed by URL and validator.
+
+    The validator is the response's ETag, or its Last-Modified date and size
+    when there is no ETag, so a clip that changes behind the same URL is
+    probed again; clips served with neither are not cached. The database
+    may be shared by several processes.
+
+    Args:
+        path (str): Location of the database file.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS probes ("
+            "url TEXT PRIMARY KEY, validator TEXT NOT NULL, info TEXT NOT NULL, probed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def lookup(self, url, validator):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT info FROM probes WHERE url = ? AND validator = ?", (url, validator)
+            ).fetchone()
+        if row is None:
+            return None
+        return ClipInfo(url=url, error=None, **json.loads(row[0]))
+
+    def store(self, url, validator, info):
+        fields = {name: getattr(info, name) for name in ("size", "duration", "codecs", "width", "height")}
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO probes (url, validator, info, probed_at) VALUES (?, ?, ?, ?)",
+                (url, validator, json.dumps(fields), time.time()),
+            )
+            self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+def _fetch_range(url, start, end, timeout):
+    """
+    GET bytes start..end (inclusive) of a clip.
+
+    Returns:
+        tuple: (body, SourceVersion of the clip).
+    """
+    request = urllib.request.Request(url, headers={"Range": f"bytes={start}-{end}", "User-Agent": USER_AGENT})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        version = response_version(response)
+        if version.ranges:
+            return response.read(end - start + 1), version
+        if start:
+            raise _RangesUnsupported()
+        # The whole clip is coming; read only what was asked for
+        return response.read(end + 1), version
+
+
+def _read_movie(url, head, size, timeout):
+    """
+    Find the moov box, fetching further ranges when it is not in `head`.
+    """
+    data = head
+    data_start = 0
+    offset = 0
+    for _ in range(MAX_BOX_HOPS):
+        position = offset - data_start
+        box = read_box_header(data, position, None if size is None else size - data_start)
+        if box is None:
+            if size is not None and offset >= size:
+                break
+            # Header not in the buffer: fetch the next box header
+            data = _fetch_range(url, offset, offset + LARGE_BOX_HEADER_SIZE - 1, timeout)[0]
+            data_start = offset
+            continue
+
+        if box.type == b"moov":
+            if box.size is None or box.size > MAX_MOOV_BYTES:
+                raise MP4Error("moov box too large")
+            if position + box.size > len(data):
+                data = _fetch_range(url, offset, offset + box.size - 1, timeout)[0]
+                data_start = offset
+            # Keep the size found above, which may have come from the file size
+            return parse_movie(data, box._replace(offset=offset - data_start))
+        if box.size is None:
+            break
+        offset += box.size
+    raise MP4Error("No moov box found")
+
+
+def probe_clip(url, cache=None, timeout=15):
+    """
+    Probe one clip: check that it can be fetched and read its metadata.
+
+    Args:
+        url (str): Clip URL.
+        cache (ProbeCache): Cache consulted before the clip's head is
+            downloaded, and updated after parsing.
+        timeout (float): Socket timeout per request, in seconds.
+
+    Returns:
+        ClipInfo: The result. Fetch failures are reported in its error
+        field; a clip that is fetched but cannot be parsed gets empty
+        metadata instead.
+    """
+    try:
+        if cache is not None:
+            # One byte is enough for the validator, so cached clips cost a
+            # round trip but no body
+            validator = read_version(url, timeout, USER_AGENT).validator
+            cached = cache.lookup(url, validator) if validator is not None else None
+            if cached is not None:
+                return cached
+
+        # The clip may have changed since the validator was read
+        head, version = _fetch_range(url, 0, HEAD_BYTES - 1, timeout)
+        size = version.size
+
+        try:
+            movie = _read_movie(url, head, size, timeout)
+        except _RangesUnsupported:
+            # Playable, but reading a trailing moov would mean downloading the clip
+            info = ClipInfo(url, size, None, None, None, None, None)
+        except MP4Error as error:
+            # The clip can be fetched, and the browser may still play what
+            # this parser cannot read, so only its metadata is missing
+            logger.info("No metadata for %s: %s", url, error)
+            info = ClipInfo(url, size, None, None, None, None, None)
+        else:
+            info = ClipInfo(
+                url=url,
+                size=size,
+                duration=movie.duration,
+                codecs=", ".join(movie.codecs) or None,
+                width=movie.width or None,
+                height=movie.height or None,
+                error=None,
+            )
+        if cache is not None and version.validator is not None:
+            cache.store(url, version.validator, info)
+        return info
+    except urllib.error.HTTPError as error:
+        reason = f"HTTP {error.code}"
+    except (OSError, http.client.HTTPException) as error:
+        # URLError, timeouts and responses that break off
+        reason = str(getattr(error, "reason", None) or error)
+    logger.warning("Probe failed for %s: %s", url, reason)
+    return ClipInfo(url, None, None, None, None, None, reason)
+
+
+async def probe_clips(urls, cache_path=None, concurrency=DEFAULT_CONCURRENCY, timeout=15):
+    """
+    Probe many clips concurrently.
+
+    Args:
+        urls (list): Clip URLs; duplicates are probed once.
+        cache_path (str): SQLite file caching results across sessions and
+            processes. None disables caching.
+        concurrency (int): Maximum number of clips probed at once.
+        timeout (float): Socket timeout per request, in seconds.
+
+    Returns:
+        dict: ClipInfo for every URL.
+    """
+    cache = ProbeCache(cache_path) if cache_path else None
+    limit = asyncio.Semaphore(max(1, concurrency))
+
+    async def probe(url):
+        async with limit:
+            return await asyncio.to_thread(probe_clip, url, cache, timeout)
+
+    try:
+        unique = list(dict.fromkeys(urls))
+        results = await asyncio.gather(*(probe(url) for url in unique))
+    finally:
+        if cache is not None:
+            cache.close()
+    return dict(zip(unique, results))
+
+
+def probe_playlist(video_dict, cache_path=None, concurrency=DEFAULT_CONCURRENCY, timeout=15):
+    """
+    Probe every clip of a playlist and return it with the results added.
+
+    Each clip gains "duration" (seconds), "size" (bytes), "width", "height"
+    and, unless already set, "codecs". Clips that cannot be played get an
+    "error" field instead, which the player uses to skip them. Call it
+    before video_stream_player, ideally under st.cache_data.
+
+    Args:
+        video_dict (dict): Playlist in the format video_stream_player takes.
+        cache_path (str): SQLite file caching results, see probe_clips.
+        concurrency (int): Maximum number of clips probed at once.
+        timeout (float): Socket timeout per request, in seconds.
+
+    Returns:
+        dict: A new playlist; video_dict is not modified.
+    """
+    urls = [clip["url"] for clip in video_dict.values()]
+    results = asyncio.run(probe_clips(urls, cache_path, concurrency, timeout))
+
+    probed = {}
+    for title, clip in video_dict.items():
+        info = results[clip["url"]]
+        clip = dict(clip)
+        if info.error:
+            clip["error"] = info.error
+        else:
+            for field in ("duration", "size", "width", "height"):
+                if getattr(info, field) is not None:
+                    clip[field] = getattr(info, field)
+            if info.codecs and "codecs" not in clip:
+                clip["codecs"] = info.codecs
+        probed[title] = clip
+    return probed
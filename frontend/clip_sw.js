@@ -0,0 +1,248 @@
+// Clip cache service worker: keeps whole clip bodies in Cache Storage so
+// playback, replays, prefetches and downloads share one copy of each clip.
+//
+// The player posts { type: 'config', urls, maxBytes } with the clip URLs it
+// may load; requests for those URLs are answered from the cache, slicing the
+// stored body for Range requests. Other requests are not intercepted.
+
+const CACHE_NAME = 'video-stream-player-clips-v1';
+const STATE_KEY = './clip-cache-state';
+// Leave room for other storage of the origin
+const STORAGE_SHARE = 0.5;
+const STATE_SAVE_DELAY_MS = 2000;
+
+let clipUrls = new Set();
+let maxBytes = 512 * 1024 * 1024;
+// url -> { size, lastAccess }
+let entries = new Map();
+const inflight = new Map();
+let stateLoaded = null;
+// Whether clipUrls holds the saved list, so requests can be matched at once
+let stateReady = false;
+let saveTimer = null;
+
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', event => {
+  event.waitUntil(self.clients.claim());
+});
+
+// The URL list and LRU metadata survive the worker being stopped
+function loadState() {
+  if (!stateLoaded) {
+    stateLoaded = caches.open(CACHE_NAME)
+      .then(cache => cache.match(STATE_KEY))
+      .then(response => response ? response.json() : null)
+      .then(state => {
+        if (!state) return;
+        clipUrls = new Set(state.urls);
+        maxBytes = state.maxBytes;
+        entries = new Map(state.entries);
+      })
+      .catch(() => {})
+      .then(() => { stateReady = true; });
+  }
+  return stateLoaded;
+}
+
+// Read as soon as the worker starts, which it does again after being stopped
+loadState();
+
+function scheduleSave() {
+  if (saveTimer) return;
+  saveTimer = setTimeout(async () => {
+    saveTimer = null;
+    const cache = await caches.open(CACHE_NAME);
+    const state = { urls: Array.from(clipUrls), maxBytes: maxBytes, entries: Array.from(entries) };
+    await cache.put(STATE_KEY, new Response(JSON.stringify(state)));
+  }, STATE_SAVE_DELAY_MS);
+}
+
+self.addEventListener('message', event => {
+  const message = event.data;
+  if (!message || message.type !== 'config') return;
+
+  event.waitUntil(loadState().then(() => {
+    clipUrls = new Set(message.urls);
+    maxBytes = message.maxBytes || maxBytes;
+    scheduleSave();
+    return evict();
+  }));
+});
+
+// Byte budget: the configured maximum, capped by what the origin may use
+async function budget() {
+  let limit = maxBytes;
+  if (navigator.storage && navigator.storage.estimate) {
+    const estimate = await navigator.storage.estimate();
+    const ours = totalBytes();
+    const available = (estimate.quota - estimate.usage + ours) * STORAGE_SHARE;
+    limit = Math.min(limit, available);
+  }
+  return limit;
+}
+
+function totalBytes() {
+  let total = 0;
+  entries.forEach(entry => { total += entry.size; });
+  return total;
+}
+
+// Drop least recently used clips until the cache fits its budget
+async function evict(keepUrl) {
+  const limit = await budget();
+  let total = totalBytes();
+  if (total <= limit) return;
+
+  const cache = await caches.open(CACHE_NAME);
+  const byAge = Array.from(entries).sort((a, b) => a[1].lastAccess - b[1].lastAccess);
+  for (const [url, entry] of byAge) {
+    if (total <= limit) break;
+    if (url === keepUrl) continue;
+    await cache.delete(url);
+    entries.delete(url);
+    total -= entry.size;
+  }
+  scheduleSave();
+}
+
+function touch(url, size) {
+  const entry = entries.get(url) || { size: size, lastAccess: 0 };
+  entry.lastAccess = Date.now();
+  if (size !== undefined) entry.size = size;
+  entries.set(url, entry);
+  scheduleSave();
+}
+
+function parseRange(header, size) {
+  const match = /^bytes=(\d*)-(\d*)$/.exec(header || '');
+  if (!match) return null;
+
+  let start;
+  let end;
+  if (match[1]) {
+    start = Number(match[1]);
+    end = match[2] ? Math.min(Number(match[2]), size - 1) : size - 1;
+  } else if (match[2]) {
+    start = Math.max(0, size - Number(match[2]));
+    end = size - 1;
+  } else {
+    return null;
+  }
+  return start <= end && start < size ? { start: start, end: end } : 'unsatisfiable';
+}
+
+// Answer a request from a cached body, honouring its Range header
+async function respondFromCache(request, cached) {
+  const blob = await cached.blob();
+  const contentType = cached.headers.get('Content-Type') || 'video/mp4';
+  const range = parseRange(request.headers.get('Range'), blob.size);
+
+  if (range === 'unsatisfiable') {
+    return new Response(null, { status: 416, headers: { 'Content-Range': 'bytes */' + blob.size } });
+  }
+  if (!range) {
+    return new Response(blob, {
+      status: 200,
+      headers: { 'Content-Type': contentType, 'Content-Length': String(blob.size), 'Accept-Ranges': 'bytes' }
+    });
+  }
+
+  const body = blob.slice(range.start, range.end + 1);
+  return new Response(body, {
+    status: 206,
+    headers: {
+      'Content-Type': contentType,
+      'Content-Length': String(body.size),
+      'Content-Range': 'bytes ' + range.start + '-' + range.end + '/' + blob.size,
+      'Accept-Ranges': 'bytes'
+    }
+  });
+}
+
+async function storeClip(url, response) {
+  try {
+    const cache = await caches.open(CACHE_NAME);
+    await cache.put(url, response);
+    const stored = await cache.match(url);
+    touch(url, (await stored.blob()).size);
+    await evict(url);
+  } catch (error) {
+    console.warn('Failed to cache ' + url + ':', error);
+  }
+}
+
+// Fetch a whole clip, writing it to the cache while the requester receives
+// the same bytes. Others asking for the clip meanwhile wait for the cache.
+function fetchIntoCache(url, event) {
+  let settle;
+  inflight.set(url, new Promise(resolve => { settle = resolve; }));
+  const finish = () => {
+    inflight.delete(url);
+    settle();
+  };
+
+  return fetch(url, { mode: 'cors', credentials: 'omit' }).then(response => {
+    if (response.status !== 200) {
+      finish();
+      return null;
+    }
+
+    const [forCache, forRequester] = response.body.tee();
+    const headers = { 'Content-Type': response.headers.get('Content-Type') || 'video/mp4' };
+    event.waitUntil(storeClip(url, new Response(forCache, { headers: headers })).finally(finish));
+    return new Response(forRequester, { status: 200, headers: headers });
+  }).catch(() => {
+    finish();
+    return null;
+  });
+}
+
+async function handleClipRequest(event) {
+  const request = event.request;
+  const url = request.url;
+  const cache = await caches.open(CACHE_NAME);
+  const range = request.headers.get('Range');
+  // Only an open-ended range from the start asks for the whole body; a
+  // bounded one such as the player's head prefetch wants just those bytes
+  const wholeBody = !range || /^bytes=0-$/.test(range);
+
+  // A partial request while the clip is being cached goes to the network
+  // rather than waiting for the whole body
+  if (inflight.has(url)) {
+    if (!wholeBody) return fetch(request);
+    await inflight.get(url);
+  }
+
+  const cached = await cache.match(url);
+  if (cached) {
+    touch(url);
+    return respondFromCache(request, cached);
+  }
+
+  // A request for the whole clip is answered with its body while it is
+  // cached. Any other range is passed through uncached, so the clip is not
+  // downloaded twice; it is cached once it is read in full.
+  if (wholeBody) {
+    const response = await fetchIntoCache(url, event);
+    if (response) return response;
+  }
+  return fetch(request);
+}
+
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  if (request.method !== 'GET') return;
+
+  if (stateReady) {
+    if (clipUrls.has(request.url)) event.respondWith(handleClipRequest(event));
+    return;
+  }
+
+  // Right after the worker starts the URL list is still being read; only
+  // requests that may be clips wait for it. The player's own files are not.
+  const sameOrigin = new URL(request.url).origin === self.location.origin;
+  if (sameOrigin && request.destination !== 'video') return;
+  event.respondWith(loadState().then(() =>
+    clipUrls.has(request.url) ? handleClipRequest(event) : fetch(request)));
+});
@@ -0,0 +1,2889 @@
+// Video dictionary, received from Python through the component protocol
+let videoDict = {};
+let videoKeys = [];
+const disabledVideos = new Set();
+let isPlaying = false;
+let isDragging = false;
+let isMuted = true;
+let controlsTimeout = null;
+let notificationTimeout = null;
+let currentVideoKey = null;
+let isSettingsOpen = false;
+let isDownloading = false;
+let isDownloadsOpen = false;
+let isPlaylistOpen = false;
+let isLiveMode = false;
+let playlistEnded = false;
+const downloadsMenu = document.getElementById('downloadsMenu');
+const downloadClipBtn = document.getElementById('downloadClipBtn');
+const downloadReelBtn = document.getElementById('downloadReelBtn');
+const sidebar = document.getElementById('sidebar');
+const sidebarOverlay = document.getElementById('sidebarOverlay');
+const playlistBtn = document.getElementById('playlistBtn');
+const sidebarCloseBtn = document.getElementById('sidebarCloseBtn');
+const videoTitleOverlay = document.getElementById('videoTitleOverlay');
+const playlistItems = document.getElementById('playlistItems');
+const playlistDuration = document.getElementById('playlistDuration');
+const downloadPlaylistBtn = document.getElementById('downloadPlaylistBtn');
+const playlistSettingsExpander = document.getElementById('playlistSettingsExpander');
+const playlistSettingsContent = document.getElementById('playlistSettingsContent');
+
+// DOM elements
+// Two stacked layers: videoPlayer is the visible one, standbyPlayer preloads
+// the next clip and is swapped in when the current one ends
+const videoLayers = [document.getElementById('videoPlayer'), document.getElementById('videoPlayerBuffer')];
+let videoPlayer = videoLayers[0];
+let standbyPlayer = videoLayers[1];
+let standbyKey = null;
+let standbyUrl = null;
+const videoWrapper = document.getElementById('videoWrapper');
+const playPauseBtn = document.getElementById('playPauseBtn');
+const muteBtn = document.getElementById('muteBtn');
+const trackingOverlay = document.getElementById('trackingOverlay');
+const trackingMenuItem = document.getElementById('trackingMenuItem');
+const trackingBtn = document.getElementById('trackingBtn');
+const progressContainer = document.getElementById('progressContainer');
+const progressBar = document.getElementById('progressBar');
+const progressGrabber = document.getElementById('progressGrabber');
+const timeDisplay = document.getElementById('timeDisplay');
+const customControls = document.getElementById('customControls');
+const loadingOverlay = document.getElementById('loadingOverlay');
+const loadingText = document.getElementById('loadingText');
+const settingsBtn = document.getElementById('settingsBtn');
+const settingsMenu = document.getElementById('settingsMenu');
+const notification = document.getElementById('notification');
+const downloadBtn = document.getElementById('downloadsBtn');
+const enableAllClipsBtn = document.getElementById('enableAllClipsBtn');
+const disableAllClipsBtn = document.getElementById('disableAllClipsBtn');
+
+// Function to disable/enable sidebar
+function setSidebarDisabled(disabled) {
+  if (disabled) {
+    sidebar.classList.add('disabled');
+    sidebarOverlay.classList.add('visible');
+  } else {
+    sidebar.classList.remove('disabled');
+    sidebarOverlay.classList.remove('visible');
+  }
+}
+
+// Toggle playlist sidebar
+function togglePlaylist() {
+  isPlaylistOpen = !isPlaylistOpen;
+
+  if (isPlaylistOpen) {
+    sidebar.classList.add('visible');
+    videoWrapper.classList.add('playlist-open');
+  } else {
+    sidebar.classList.remove('visible');
+    videoWrapper.classList.remove('playlist-open');
+  }
+}
+
+// Toggle playlist settings expander
+function togglePlaylistSettingsExpander() {
+  const expanderIcon = playlistSettingsExpander.querySelector('.expander-icon');
+  if (playlistSettingsContent.classList.contains('expanded')) {
+    playlistSettingsContent.classList.remove('expanded');
+    expanderIcon.classList.remove('expanded');
+  } else {
+    playlistSettingsContent.classList.add('expanded');
+    expanderIcon.classList.add('expanded');
+  }
+}
+
+// Close playlist sidebar
+function closePlaylist() {
+  isPlaylistOpen = false;
+  sidebar.classList.remove('visible');
+  videoWrapper.classList.remove('playlist-open');
+}
+
+// Show unified notification
+function showUnifiedNotification(message, options = {}) {
+  const { 
+    duration = 3000,
+    showSpinner = false,
+    spinnerText = message,
+    showToast = true
+  } = options;
+
+  if (showToast) {
+    if (notificationTimeout) {
+      clearTimeout(notificationTimeout);
+    }
+
+    notification.textContent = message;
+    notification.classList.add('visible');
+
+    notificationTimeout = setTimeout(() => {
+      notification.classList.remove('visible');
+    }, duration);
+  }
+
+  if (showSpinner) {
+    loadingText.textContent = spinnerText;
+    loadingOverlay.classList.add('visible');
+
+    if (options.spinnerDuration) {
+      setTimeout(() => {
+        loadingOverlay.classList.remove('visible');
+      }, options.spinnerDuration);
+    }
+  } else if (options.hideSpinner) {
+    loadingOverlay.classList.remove('visible');
+  }
+}
+
+// Format time in MM:SS format
+function formatTime(seconds) {
+  const minutes = Math.floor(seconds / 60);
+  const secs = Math.floor(seconds % 60);
+  return `${minutes}:${secs.toString().padStart(2, '0')}`;
+}
+
+// URLs are routed through the media gateway when one is set
+let gatewayUrl = null;
+
+function routeUrl(url) {
+  if (!gatewayUrl) return url;
+  return gatewayUrl + (gatewayUrl.includes('?') ? '&' : '?') + 'url=' + encodeURIComponent(url);
+}
+
+// URL of a clip's main file, which downloads always use
+function clipUrl(videoKey) {
+  return routeUrl(videoDict[videoKey].url);
+}
+
+// Sub-clip windows
+// A clip may be the start..end window, in seconds, of a longer recording.
+// The window is passed as a media fragment, so the browser opens the clip
+// at start, and to the media gateway, which then fetches only the window's
+// bytes of the recording. The progress bar spans the window and the next
+// clip follows at end. Reel mode plays whole files only.
+// How close to the end of a window counts as reaching it
+const WINDOW_END_TOLERANCE = 0.05;
+let windowFrameRequest = null;
+
+// { start, end } of a windowed clip, end being null for the end of the file
+function clipWindow(videoKey) {
+  const clip = videoDict[videoKey];
+  const start = typeof clip.start === 'number' ? clip.start : null;
+  const end = typeof clip.end === 'number' ? clip.end : null;
+  if (start === null && end === null) return null;
+  return { start: start || 0, end: end };
+}
+
+function currentWindow() {
+  if (isReelMode || !currentVideoKey || !hasKey(videoDict, currentVideoKey)) return null;
+  return clipWindow(currentVideoKey);
+}
+
+// URL one of a clip's renditions is played from
+function renditionUrl(url, videoKey) {
+  const span = clipWindow(videoKey);
+  if (!span) return routeUrl(url);
+
+  let routed = routeUrl(url);
+  if (gatewayUrl) {
+    routed += '&start=' + span.start + (span.end !== null ? '&end=' + span.end : '');
+  }
+  return routed + '#t=' + span.start + (span.end !== null ? ',' + span.end : '');
+}
+
+// Length of a clip, known up front for probed playlists and closed windows
+function clipDuration(videoKey) {
+  const clip = videoDict[videoKey];
+  const span = clipWindow(videoKey);
+  if (!span) return clip.duration;
+  const end = span.end !== null ? span.end : clip.duration;
+  return end ? Math.max(0, end - span.start) : undefined;
+}
+
+// The part of the playing media the progress bar spans
+function timelineStart() {
+  const span = currentWindow();
+  return span ? span.start : 0;
+}
+
+function timelineEnd() {
+  const span = currentWindow();
+  const duration = videoPlayer.duration;
+  return span && span.end !== null ? Math.min(span.end, duration) : duration;
+}
+
+// Put a freshly loaded windowed clip at the start of its window
+function enterWindow() {
+  const span = currentWindow();
+  if (!span) return;
+  const time = videoPlayer.currentTime;
+  if (time < span.start - WINDOW_END_TOLERANCE || (span.end !== null && time >= span.end)) {
+    videoPlayer.currentTime = span.start;
+  }
+}
+
+function checkWindowEnd(mediaTime) {
+  const span = currentWindow();
+  if (!span || span.end === null || isDragging || videoPlayer.paused) return;
+  if (mediaTime >= span.end - WINDOW_END_TOLERANCE) loadNextVideo();
+}
+
+// timeupdate fires only every quarter second or so; follow frames where the
+// browser can, so a window stops on its last frame
+function watchWindowEnd() {
+  if (windowFrameRequest) {
+    windowFrameRequest.layer.cancelVideoFrameCallback(windowFrameRequest.handle);
+    windowFrameRequest = null;
+  }
+  const layer = videoPlayer;
+  if (!currentWindow() || typeof layer.requestVideoFrameCallback !== 'function') return;
+
+  const onFrame = (now, metadata) => {
+    windowFrameRequest = null;
+    if (layer !== videoPlayer) return;
+    checkWindowEnd(metadata.mediaTime);
+    if (layer === videoPlayer && !windowFrameRequest && currentWindow()) {
+      windowFrameRequest = { layer: layer, handle: layer.requestVideoFrameCallback(onFrame) };
+    }
+  };
+  windowFrameRequest = { layer: layer, handle: layer.requestVideoFrameCallback(onFrame) };
+}
+
+// Renditions
+// Clips may list other encodings as renditions: [{url, bitrate, height, codecs}]
+// with bitrate in bits per second. The clip's own url is the top rendition.
+// Where several codecs exist for a height, the smallest one this device
+// decodes smoothly and power-efficiently is used.
+// Each clip is loaded in the best rendition the measured throughput affords,
+// so quality moves up or down at clip boundaries; within a clip it only
+// steps down, when playback stalls or drops frames.
+// Share of the measured throughput a rendition may use
+const ABR_SAFETY_FACTOR = 0.7;
+const ABR_HEALTHY_SAFETY_FACTOR = 0.9;
+// Buffer ahead above which the safer factor is relaxed
+const ABR_HEALTHY_BUFFER_SECONDS = 20;
+// Buffer ahead at which browsers stop downloading, skewing throughput samples
+const ABR_FULL_BUFFER_SECONDS = 30;
+// Frames to watch before judging the dropped-frame rate
+const ABR_FRAME_WINDOW = 120;
+const ABR_MAX_DROPPED_RATIO = 0.15;
+const qualityMenuItem = document.getElementById('qualityMenuItem');
+const qualityControls = document.getElementById('qualityControls');
+// 'auto' or the chosen height in pixels
+let qualitySetting = 'auto';
+let playingRendition = null;
+// Renditions at or above this height dropped too many frames on this device
+let smoothHeightLimit = Infinity;
+let bufferSample = null;
+let frameSample = null;
+
+// A clip's renditions, lowest bitrate first
+function renditionLadder(videoKey) {
+  return clipRenditions(videoDict[videoKey]);
+}
+
+function clipRenditions(clip) {
+  const main = {
+    url: clip.url,
+    height: clip.height || 0,
+    width: clip.width || 0,
+    // Probed playlists know the size and duration of the main file
+    bitrate: clip.bitrate || (clip.size && clip.duration ? clip.size * 8 / clip.duration : Infinity),
+    codecs: clip.codecs || null,
+    framerate: clip.framerate || 0
+  };
+  if (!Array.isArray(clip.renditions) || clip.renditions.length === 0) return [main];
+
+  const ladder = clip.renditions.map(r => ({
+    url: r.url,
+    height: r.height || 0,
+    width: r.width || 0,
+    bitrate: r.bitrate || Infinity,
+    codecs: r.codecs || null,
+    framerate: r.framerate || clip.framerate || 0
+  }));
+  ladder.push(main);
+  return ladder.sort((a, b) => a.bitrate - b.bitrate || a.height - b.height);
+}
+
+// The renditions worth choosing between, lowest quality first: one per
+// height, the most efficient encoding this device can decode. A rendition
+// without a height stands on its own, and the main file without one is
+// taken to be the best.
+function renditionChoices(videoKey) {
+  const ladder = renditionLadder(videoKey);
+  const playable = ladder.filter(r => decodeScore(r) > 0);
+  // Nothing is known to decode: let the browser try the main file's ladder
+  const candidates = playable.length > 0 ? playable : ladder;
+
+  const byHeight = new Map();
+  candidates.forEach((r, index) => {
+    const group = r.height ? r.height : 'rendition' + index;
+    const best = byHeight.get(group);
+    // The ladder is sorted by bitrate, so the first of a score is the smallest
+    if (!best || decodeScore(r) > decodeScore(best)) byHeight.set(group, r);
+  });
+
+  const level = r => r.height || (r.url === videoDict[videoKey].url ? Infinity : 0);
+  return Array.from(byHeight.values()).sort((a, b) => level(a) - level(b) || a.bitrate - b.bitrate);
+}
+
+// Bits per second a rendition may use, or 0 before anything is known
+function abrBudget() {
+  let throughput = measuredThroughput;
+  const connection = navigator.connection;
+  if (!throughput && connection && connection.downlink) {
+    // downlink is in megabits per second
+    throughput = connection.downlink * 125000;
+  }
+  const factor = bufferAhead() > ABR_HEALTHY_BUFFER_SECONDS ? ABR_HEALTHY_SAFETY_FACTOR : ABR_SAFETY_FACTOR;
+  return throughput * 8 * factor;
+}
+
+function selectRendition(videoKey) {
+  const choices = renditionChoices(videoKey);
+  if (choices.length === 1) return choices[0];
+
+  if (qualitySetting !== 'auto') {
+    const fitting = choices.filter(r => r.height && r.height <= qualitySetting);
+    return fitting.length > 0 ? fitting[fitting.length - 1] : choices[0];
+  }
+
+  // Without an estimate start low: the first frame matters more than the first seconds' quality
+  const budget = abrBudget();
+  let choice = choices[0];
+  choices.forEach(r => {
+    if (r.bitrate <= budget && (!r.height || r.height < smoothHeightLimit)) choice = r;
+  });
+  return choice;
+}
+
+// Decoding support
+// MediaCapabilities is asked once per codec and size for the whole session;
+// answers are kept in sessionStorage so reruns and new playlists reuse them.
+const DECODING_STORAGE_KEY = 'video-stream-player-decoding';
+const DEFAULT_FRAMERATE = 30;
+// Config key -> { supported, smooth, powerEfficient }
+const decodingSupport = new Map();
+
+try {
+  Object.entries(JSON.parse(sessionStorage.getItem(DECODING_STORAGE_KEY) || '{}'))
+    .forEach(([key, info]) => decodingSupport.set(key, info));
+} catch (error) {
+  // Storage is unavailable in some sandboxed frames; ask again instead
+}
+
+function splitCodecs(codecs) {
+  const parts = codecs.split(',').map(codec => codec.trim()).filter(Boolean);
+  const isAudio = codec => /^(mp4a|opus|ac-3|ec-3|flac)/.test(codec);
+  return { video: parts.find(codec => !isAudio(codec)) || null, audio: parts.find(isAudio) || null };
+}
+
+function decodingKey(rendition) {
+  return rendition.codecs + '@' + (rendition.height || 0) + '@' + (rendition.framerate || DEFAULT_FRAMERATE);
+}
+
+// 2: smooth and power-efficient, 1: decodable or unknown, 0: not decodable
+function decodeScore(rendition) {
+  if (!rendition.codecs) return 1;
+
+  const info = decodingSupport.get(decodingKey(rendition));
+  if (info) {
+    if (!info.supported) return 0;
+    return info.smooth && info.powerEfficient ? 2 : 1;
+  }
+  // Not asked yet, or no MediaCapabilities: trust the element's own answer
+  return videoPlayer.canPlayType('video/mp4; codecs="' + rendition.codecs + '"') ? 1 : 0;
+}
+
+function decodingConfiguration(rendition) {
+  const codecs = splitCodecs(rendition.codecs);
+  const height = rendition.height || 1080;
+  const configuration = {
+    type: 'file',
+    video: {
+      contentType: 'video/mp4; codecs="' + codecs.video + '"',
+      width: rendition.width || Math.round(height * 16 / 9),
+      height: height,
+      bitrate: Number.isFinite(rendition.bitrate) ? rendition.bitrate : 5000000,
+      framerate: rendition.framerate || DEFAULT_FRAMERATE
+    }
+  };
+  if (codecs.audio) {
+    configuration.audio = { contentType: 'audio/mp4; codecs="' + codecs.audio + '"' };
+  }
+  return configuration;
+}
+
+// Ask about every codec and size in a playlist that has not been asked about yet
+async function queryDecodingSupport(dict) {
+  if (!navigator.mediaCapabilities) return;
+
+  const pending = new Map();
+  Object.keys(dict).forEach(videoKey => {
+    const clip = dict[videoKey];
+    // Only clips with a choice of encodings need an answer
+    if (!Array.isArray(clip.renditions) || clip.renditions.length === 0) return;
+    clipRenditions(clip).forEach(r => {
+      const key = r.codecs ? decodingKey(r) : null;
+      if (key && !decodingSupport.has(key) && !pending.has(key) && splitCodecs(r.codecs).video) {
+        pending.set(key, r);
+      }
+    });
+  });
+  if (pending.size === 0) return;
+
+  await Promise.all(Array.from(pending, async ([key, rendition]) => {
+    try {
+      const info = await navigator.mediaCapabilities.decodingInfo(decodingConfiguration(rendition));
+      decodingSupport.set(key, {
+        supported: info.supported,
+        smooth: info.smooth,
+        powerEfficient: info.powerEfficient
+      });
+    } catch (error) {
+      // Malformed codec strings are rejected rather than reported unsupported
+      decodingSupport.set(key, { supported: false, smooth: false, powerEfficient: false });
+    }
+  }));
+
+  try {
+    sessionStorage.setItem(DECODING_STORAGE_KEY, JSON.stringify(Object.fromEntries(decodingSupport)));
+  } catch (error) {
+    // Not persisted; answers still hold for this page
+  }
+}
+
+// URL a clip is played from
+function playbackUrl(videoKey) {
+  return renditionUrl(selectRendition(videoKey).url, videoKey);
+}
+
+function renditionForUrl(videoKey, url) {
+  return renditionLadder(videoKey).find(r => renditionUrl(r.url, videoKey) === url) || null;
+}
+
+// Every URL a clip may be played or downloaded from
+function clipUrls(videoKey) {
+  const urls = renditionLadder(videoKey).map(r => routeUrl(r.url));
+  if (clipWindow(videoKey) && gatewayUrl) {
+    // Windows are requested from the gateway under their own URL
+    renditionLadder(videoKey).forEach(r => urls.push(renditionUrl(r.url, videoKey).split('#')[0]));
+  }
+  return urls;
+}
+
+// Seconds buffered from the playback position onwards
+function bufferAhead() {
+  const buffered = videoPlayer.buffered;
+  const time = videoPlayer.currentTime;
+  for (let i = 0; i < buffered.length; i++) {
+    if (buffered.start(i) <= time && time <= buffered.end(i)) return buffered.end(i) - time;
+  }
+  return 0;
+}
+
+function bufferedSeconds(media) {
+  let total = 0;
+  for (let i = 0; i < media.buffered.length; i++) total += media.buffered.end(i) - media.buffered.start(i);
+  return total;
+}
+
+// Estimate throughput from how fast the playing rendition buffers
+function sampleThroughput() {
+  const rendition = playingRendition;
+  if (isReelMode || !rendition || !Number.isFinite(rendition.bitrate)) return;
+
+  const src = videoPlayer.getAttribute('src');
+  const seconds = bufferedSeconds(videoPlayer);
+  const now = performance.now();
+  if (!bufferSample || bufferSample.src !== src || seconds < bufferSample.seconds) {
+    bufferSample = { src: src, seconds: seconds, time: now };
+    return;
+  }
+
+  const elapsed = (now - bufferSample.time) / 1000;
+  if (elapsed < 1) return;
+  if (bufferAhead() < ABR_FULL_BUFFER_SECONDS) {
+    recordThroughput((seconds - bufferSample.seconds) * rendition.bitrate / 8, elapsed);
+  }
+  bufferSample = { src: src, seconds: seconds, time: now };
+}
+
+// Cap quality on devices that cannot decode the playing rendition smoothly
+function checkDroppedFrames() {
+  if (isReelMode || !playingRendition || !playingRendition.height) return;
+  if (typeof videoPlayer.getVideoPlaybackQuality !== 'function') return;
+
+  const quality = videoPlayer.getVideoPlaybackQuality();
+  const src = videoPlayer.getAttribute('src');
+  if (!frameSample || frameSample.src !== src || quality.totalVideoFrames < frameSample.total) {
+    frameSample = { src: src, total: quality.totalVideoFrames, dropped: quality.droppedVideoFrames };
+    return;
+  }
+
+  const frames = quality.totalVideoFrames - frameSample.total;
+  if (frames < ABR_FRAME_WINDOW) return;
+  const ratio = (quality.droppedVideoFrames - frameSample.dropped) / frames;
+  frameSample = { src: src, total: quality.totalVideoFrames, dropped: quality.droppedVideoFrames };
+
+  if (ratio > ABR_MAX_DROPPED_RATIO && playingRendition.height < smoothHeightLimit) {
+    smoothHeightLimit = playingRendition.height;
+    stepDownRendition();
+  }
+}
+
+// Playback stalled with nothing buffered: the link is slower than the rendition
+function handleStall() {
+  if (isReelMode || !playingRendition || seekState.inFlight || bufferAhead() > 0.5) return;
+  // Waiting for the first frame of a clip is startup, not a stall
+  if (videoPlayer.played.length === 0 || videoPlayer.seeking) return;
+  if (Number.isFinite(playingRendition.bitrate)) {
+    measuredThroughput = Math.min(measuredThroughput || Infinity, playingRendition.bitrate / 8 * ABR_SAFETY_FACTOR);
+  }
+  stepDownRendition();
+}
+
+// Switch the playing clip to the next rendition down, keeping its position
+function stepDownRendition() {
+  if (qualitySetting !== 'auto' || !hasKey(videoDict, currentVideoKey)) return;
+  const choices = renditionChoices(currentVideoKey);
+  const index = choices.findIndex(r => r.url === playingRendition.url);
+  if (index > 0) switchRendition(choices[index - 1]);
+}
+
+function switchRendition(rendition) {
+  const url = renditionUrl(rendition.url, currentVideoKey);
+  if (isReelMode || videoPlayer.getAttribute('src') === url) return;
+
+  const layer = videoPlayer;
+  const time = layer.currentTime;
+  const wasPlaying = !layer.paused;
+  playingRendition = rendition;
+  resetSeeks();
+  layer.src = url;
+  layer.onloadedmetadata = () => {
+    if (layer !== videoPlayer) return;
+    layer.currentTime = time;
+    if (wasPlaying) layer.play().catch(err => console.error("Error resuming video:", err));
+  };
+  renderQualityMenu();
+  // The standby clip may have been loaded at the old quality
+  scheduleUpcoming();
+}
+
+function renderQualityMenu() {
+  const heights = currentVideoKey && hasKey(videoDict, currentVideoKey)
+    ? renditionChoices(currentVideoKey).map(r => r.height).filter(Boolean).reverse()
+    : [];
+  qualityMenuItem.hidden = heights.length < 2;
+  if (qualityMenuItem.hidden) return;
+
+  const playingHeight = playingRendition && playingRendition.height;
+  const options = [['auto', 'Auto' + (qualitySetting === 'auto' && playingHeight ? ' (' + playingHeight + 'p)' : '')]]
+    .concat(heights.map(height => [String(height), height + 'p']));
+  qualityControls.replaceChildren(...options.map(([value, label]) => {
+    const button = document.createElement('button');
+    button.className = 'menu-button';
+    button.dataset.quality = value;
+    button.textContent = label;
+    button.classList.toggle('active', String(qualitySetting) === value);
+    return button;
+  }));
+}
+
+function setQuality(value) {
+  qualitySetting = value === 'auto' ? 'auto' : Number(value);
+  if (currentVideoKey && hasKey(videoDict, currentVideoKey)) {
+    const rendition = selectRendition(currentVideoKey);
+    if (!playingRendition || rendition.url !== playingRendition.url) switchRendition(rendition);
+  }
+  renderQualityMenu();
+  scheduleUpcoming();
+}
+
+// Clips that cannot be played, reported by clip_probe or found during
+// playback, mapped to the reason. They are disabled so every playback path
+// skips them; enabling one again retries it.
+const brokenVideos = new Map();
+
+function markBroken(videoKey, reason) {
+  brokenVideos.set(videoKey, reason);
+  disabledVideos.add(videoKey);
+}
+
+// Get active (not disabled) videos
+function getActiveVideos() {
+  return videoKeys.filter(k => !disabledVideos.has(k));
+}
+
+// Update progress bar and time display
+function updateProgressBar() {
+  if (!currentVideoKey || !videoPlayer.duration) return;
+
+  const start = timelineStart();
+  const currentTime = Math.max(0, videoPlayer.currentTime - start);
+  const duration = timelineEnd() - start;
+  const progress = Math.min(100, (currentTime / duration) * 100);
+
+  progressBar.style.width = `${progress}%`;
+
+  const formattedCurrentTime = formatTime(currentTime);
+  const formattedDuration = formatTime(duration);
+  timeDisplay.textContent = `${formattedCurrentTime} / ${formattedDuration}`;
+}
+
+// Seek to the time under a mouse position, or to the event whose marker is
+// there. Imprecise seeks, used while dragging, may land on a nearby keyframe.
+function setVideoTimeFromPosition(posX, precise = true) {
+  if (!videoPlayer.duration) return;
+
+  const start = timelineStart();
+  const event = precise ? eventAtPosition(posX) : null;
+  const newTime = event ? event.time : start + (timelineEnd() - start) * positionFraction(posX);
+
+  requestSeek(newTime, precise);
+  updateProgressBar();
+}
+
+// Seeking
+// Only one seek is in flight at a time. Positions requested meanwhile
+// replace each other and the latest is applied once the decoder is done, so
+// scrubbing never queues up seeks behind the cursor.
+// A seek that has not completed after this long is given up on
+const SEEK_STALL_MS = 2000;
+const seekState = { inFlight: false, pending: null, startedAt: 0 };
+const seekStats = { count: 0, coalesced: 0, totalMs: 0, maxMs: 0 };
+// Clip URL -> keyframe times in seconds; null while loading or unavailable
+const keyframeIndexes = new Map();
+
+function keyframeTimes(videoKey) {
+  const clip = videoDict[videoKey];
+  if (!clip) return null;
+  if (Array.isArray(clip.keyframes)) return clip.keyframes;
+  if (!gatewayUrl) return null;
+
+  // The media gateway indexes the keyframes of the clips it caches
+  const url = clipUrl(videoKey);
+  if (!keyframeIndexes.has(url)) {
+    keyframeIndexes.set(url, null);
+    fetch(url + '&index=keyframes')
+      .then(response => response.ok ? response.json() : null)
+      .then(index => {
+        if (index) keyframeIndexes.set(url, index.keyframes.map(keyframe => keyframe[0]));
+      })
+      .catch(error => console.warn('Failed to load keyframes:', error));
+  }
+  return keyframeIndexes.get(url);
+}
+
+// The keyframe nearest to `time` in a sorted list of keyframe times
+function nearestKeyframe(times, time) {
+  let low = 0;
+  let high = times.length - 1;
+  while (low < high) {
+    const middle = (low + high + 1) >> 1;
+    if (times[middle] <= time) {
+      low = middle;
+    } else {
+      high = middle - 1;
+    }
+  }
+  const next = times[low + 1];
+  return next !== undefined && next - time < time - times[low] ? next : times[low];
+}
+
+// Snap a playback position to a keyframe of the clip it falls in
+function snapToKeyframe(time) {
+  let videoKey = currentVideoKey;
+  let clipStart = 0;
+  const segment = isReelMode ? findReelSegment(time) : null;
+  if (segment) {
+    videoKey = segment.key;
+    clipStart = segment.start;
+  }
+
+  const times = videoKey ? keyframeTimes(videoKey) : null;
+  if (!times || times.length === 0) return time;
+  return clipStart + nearestKeyframe(times, time - clipStart);
+}
+
+function requestSeek(time, precise) {
+  if (seekState.pending) seekStats.coalesced++;
+  seekState.pending = { time: time, precise: precise };
+
+  if (seekState.inFlight && performance.now() - seekState.startedAt > SEEK_STALL_MS) {
+    seekState.inFlight = false;
+  }
+  if (!seekState.inFlight) startNextSeek();
+}
+
+function startNextSeek() {
+  const request = seekState.pending;
+  seekState.pending = null;
+  if (!request) return;
+
+  seekState.inFlight = true;
+  seekState.startedAt = performance.now();
+  if (request.precise) {
+    videoPlayer.currentTime = request.time;
+  } else if (typeof videoPlayer.fastSeek === 'function') {
+    videoPlayer.fastSeek(request.time);
+  } else {
+    videoPlayer.currentTime = snapToKeyframe(request.time);
+  }
+}
+
+function resetSeeks() {
+  seekState.inFlight = false;
+  seekState.pending = null;
+}
+
+function logSeekStats() {
+  if (!seekStats.count) return;
+  console.debug('Seeks: ' + seekStats.count + ' completed, ' + seekStats.coalesced + ' coalesced, ' +
+    'average ' + Math.round(seekStats.totalMs / seekStats.count) + ' ms, slowest ' +
+    Math.round(seekStats.maxMs) + ' ms');
+}
+
+// Fraction of the progress bar at a mouse position
+function positionFraction(posX) {
+  const rect = progressContainer.getBoundingClientRect();
+  return Math.max(0, Math.min(1, (posX - rect.left) / rect.width));
+}
+
+// Scrub previews
+// Clips may name a thumbnail index (see thumbnails.py) describing a sprite
+// sheet of evenly spaced frames. Hovering or dragging on the progress bar
+// shows frames from the sprite while the video catches up with the cursor.
+const scrubPreview = document.getElementById('scrubPreview');
+const scrubPreviewImage = document.getElementById('scrubPreviewImage');
+const scrubPreviewTime = document.getElementById('scrubPreviewTime');
+// Index URL -> sprite index; null while loading or when unavailable
+const thumbnailIndexes = new Map();
+
+function thumbnailIndex(videoKey) {
+  const url = videoDict[videoKey] && videoDict[videoKey].thumbnails;
+  if (!url) return null;
+
+  if (!thumbnailIndexes.has(url)) {
+    thumbnailIndexes.set(url, null);
+    fetch(url)
+      .then(response => response.ok ? response.json() : null)
+      .then(index => {
+        if (!index) return;
+        index.spriteUrl = new URL(index.sprite, new URL(url, location.href)).href;
+        // Fetch the sprite now so the first hover already shows frames
+        new Image().src = index.spriteUrl;
+        thumbnailIndexes.set(url, index);
+      })
+      .catch(error => console.warn('Failed to load thumbnails:', error));
+  }
+  return thumbnailIndexes.get(url);
+}
+
+function showScrubPreview(posX) {
+  if (!videoPlayer.duration) return;
+
+  const fraction = positionFraction(posX);
+  const start = timelineStart();
+  const time = start + (timelineEnd() - start) * fraction;
+
+  // In reel mode the bar spans every clip; preview the one under the mouse
+  let videoKey = currentVideoKey;
+  let clipTime = time;
+  const segment = isReelMode ? findReelSegment(time) : null;
+  if (segment) {
+    videoKey = segment.key;
+    clipTime = time - segment.start;
+  }
+
+  const index = videoKey ? thumbnailIndex(videoKey) : null;
+  if (index) {
+    const tile = Math.min(index.count - 1, Math.floor(clipTime / index.interval));
+    const x = (tile % index.columns) * index.width;
+    const y = Math.floor(tile / index.columns) * index.height;
+    scrubPreviewImage.style.width = index.width + 'px';
+    scrubPreviewImage.style.height = index.height + 'px';
+    scrubPreviewImage.style.backgroundImage = 'url("' + index.spriteUrl + '")';
+    scrubPreviewImage.style.backgroundPosition = -x + 'px ' + -y + 'px';
+  }
+  scrubPreviewImage.hidden = !index;
+  scrubPreviewTime.textContent = formatTime(time - start);
+  const event = eventAtPosition(posX);
+  scrubPreviewEvent.hidden = !event;
+  if (event) scrubPreviewEvent.textContent = describeEvent(event);
+  scrubPreview.style.left = (fraction * 100) + '%';
+  scrubPreview.classList.add('visible');
+}
+
+function hideScrubPreview() {
+  scrubPreview.classList.remove('visible');
+}
+
+// Event markers
+// Clips may carry event annotations (passes, shots, runs...), inline or as
+// the URL of a JSON list. Their times on the playing timeline are kept in a
+// sorted index; markers are painted once onto a single canvas over the
+// progress bar and looked up by binary search, so neither the DOM nor
+// updateProgressBar grows with the number of events.
+const eventMarkers = document.getElementById('eventMarkers');
+const eventCaption = document.getElementById('eventCaption');
+const scrubPreviewEvent = document.getElementById('scrubPreviewEvent');
+const eventMarkersContext = eventMarkers.getContext('2d');
+// Markers without the active one, composed with it when it changes
+const eventMarkersBase = document.createElement('canvas');
+// How long an event stays active after its time, in seconds
+const EVENT_ACTIVE_SECONDS = 3;
+// Distance from a marker, in CSS pixels, at which the mouse picks it
+const EVENT_HIT_PX = 4;
+const EVENT_COLORS = {
+  goal: '#ffd600',
+  shot: '#ff5252',
+  pass: '#40c4ff',
+  run: '#69f0ae',
+  foul: '#ff9100'
+};
+const EVENT_DEFAULT_COLOR = '#e0e0e0';
+// Events list URL -> events; null while loading or when unavailable
+const eventLists = new Map();
+// { times: sorted Float64Array of media times, events } for the timeline
+let eventIndex = { times: new Float64Array(0), events: [] };
+let activeEvent = -1;
+let eventRenderScheduled = false;
+
+function clipEvents(videoKey) {
+  const events = videoDict[videoKey] && videoDict[videoKey].events;
+  if (Array.isArray(events)) return events;
+  if (typeof events !== 'string') return null;
+
+  if (!eventLists.has(events)) {
+    eventLists.set(events, null);
+    fetch(events)
+      .then(response => response.ok ? response.json() : null)
+      .then(list => {
+        if (!Array.isArray(list)) return;
+        eventLists.set(events, list);
+        scheduleEventMarkers();
+      })
+      .catch(error => console.warn('Failed to load events:', error));
+  }
+  return eventLists.get(events);
+}
+
+// Collect the events of the clips on the timeline, in media time of the
+// active layer: clip time, or clip time plus the clip's start in a reel
+function buildEventIndex() {
+  const entries = [];
+  const addClip = (videoKey, offset, end) => {
+    const events = hasKey(videoDict, videoKey) ? clipEvents(videoKey) : null;
+    if (!events) return;
+    events.forEach(event => {
+      if (typeof event.time !== 'number') return;
+      const time = offset + event.time;
+      if (time < end) entries.push({ time: time, type: event.type || '', label: event.label || '' });
+    });
+  };
+
+  if (isReelMode) {
+    if (reel) reel.segments.forEach(segment => addClip(segment.key, segment.start, segment.end));
+  } else if (currentVideoKey) {
+    addClip(currentVideoKey, 0, Infinity);
+  }
+
+  const start = timelineStart();
+  const end = timelineEnd();
+  const events = entries.filter(event => event.time >= start && event.time <= end);
+  events.sort((a, b) => a.time - b.time);
+  return { times: Float64Array.from(events, event => event.time), events: events };
+}
+
+// Index of the last event at or before `time`, or -1
+function lastEventAtOrBefore(time) {
+  const times = eventIndex.times;
+  let low = 0;
+  let high = times.length;
+  while (low < high) {
+    const middle = (low + high) >> 1;
+    if (times[middle] <= time) {
+      low = middle + 1;
+    } else {
+      high = middle;
+    }
+  }
+  return low - 1;
+}
+
+// Rebuild the index and repaint the markers once per frame at most
+function scheduleEventMarkers() {
+  if (eventRenderScheduled) return;
+  eventRenderScheduled = true;
+  requestAnimationFrame(renderEventMarkers);
+}
+
+function renderEventMarkers() {
+  eventRenderScheduled = false;
+  const ratio = window.devicePixelRatio || 1;
+  const width = Math.round(eventMarkers.clientWidth * ratio);
+  const height = Math.round(eventMarkers.clientHeight * ratio);
+  eventMarkers.width = eventMarkersBase.width = width;
+  eventMarkers.height = eventMarkersBase.height = height;
+
+  eventIndex = videoPlayer.duration ? buildEventIndex() : { times: new Float64Array(0), events: [] };
+  activeEvent = -1;
+  eventCaption.hidden = true;
+
+  const start = timelineStart();
+  const span = timelineEnd() - start;
+  const context = eventMarkersBase.getContext('2d');
+  if (eventIndex.events.length && span > 0 && isFinite(span)) {
+    // One rectangle per pixel column and color, however dense the events
+    const markWidth = Math.max(1, Math.round(ratio * 2));
+    const drawn = new Set();
+    eventIndex.events.forEach(event => {
+      const color = EVENT_COLORS[event.type] || EVENT_DEFAULT_COLOR;
+      const x = Math.round((event.time - start) / span * (width - markWidth));
+      const column = color + x;
+      if (drawn.has(column)) return;
+      drawn.add(column);
+      context.fillStyle = color;
+      context.fillRect(x, 0, markWidth, height);
+    });
+  }
+  updateActiveEvent(videoPlayer.currentTime);
+  composeEventMarkers();
+}
+
+function composeEventMarkers() {
+  const width = eventMarkers.width;
+  const height = eventMarkers.height;
+  eventMarkersContext.clearRect(0, 0, width, height);
+  if (!width || !height) return;
+  eventMarkersContext.drawImage(eventMarkersBase, 0, 0);
+  const start = timelineStart();
+  const span = timelineEnd() - start;
+  if (activeEvent < 0 || !isFinite(span)) return;
+
+  const ratio = window.devicePixelRatio || 1;
+  const markWidth = Math.max(2, Math.round(ratio * 4));
+  const x = Math.round((eventIndex.times[activeEvent] - start) / span * (width - markWidth));
+  eventMarkersContext.fillStyle = 'white';
+  eventMarkersContext.fillRect(x, 0, markWidth, height);
+}
+
+function describeEvent(event) {
+  return event.label ? (event.type ? event.type + ': ' + event.label : event.label) : event.type;
+}
+
+// Called on every timeupdate: a binary search, repainting only on change
+function updateActiveEvent(time) {
+  let index = eventIndex.times.length ? lastEventAtOrBefore(time) : -1;
+  if (index >= 0 && time - eventIndex.times[index] > EVENT_ACTIVE_SECONDS) index = -1;
+  if (index === activeEvent) return;
+
+  activeEvent = index;
+  eventCaption.hidden = index < 0;
+  if (index >= 0) eventCaption.textContent = describeEvent(eventIndex.events[index]);
+  composeEventMarkers();
+}
+
+// The event whose marker is under a mouse position, or null
+function eventAtPosition(posX) {
+  if (!eventIndex.times.length || !videoPlayer.duration) return null;
+
+  const start = timelineStart();
+  const span = timelineEnd() - start;
+  if (!(span > 0) || !isFinite(span)) return null;
+  const time = start + span * positionFraction(posX);
+  const before = lastEventAtOrBefore(time);
+  let nearest = before;
+  if (before + 1 < eventIndex.times.length &&
+      (before < 0 || eventIndex.times[before + 1] - time < time - eventIndex.times[before])) {
+    nearest = before + 1;
+  }
+  const distance = Math.abs(eventIndex.times[nearest] - time) / span * progressContainer.clientWidth;
+  return distance <= EVENT_HIT_PX ? eventIndex.events[nearest] : null;
+}
+
+new ResizeObserver(scheduleEventMarkers).observe(eventMarkers);
+
+// Tracking overlay
+// Clips may name a tracking file (see tracking_data.py) holding the
+// positions of players and ball in every frame. A worker draws them on an
+// OffscreenCanvas over the video; the main thread only posts the media time
+// of each frame the video presents.
+const TRACKING_WORKER_URL = '@@tracking_worker.js@@';
+let trackingWorker = null;
+let showTracking = true;
+let trackingFrameRequest = null;
+// Whether the overlay may show markers, so clearing it is posted only once
+let trackingDrawn = false;
+
+function trackingUrl(videoKey) {
+  const clip = videoKey && hasKey(videoDict, videoKey) ? videoDict[videoKey] : null;
+  // Resolved here, as the worker would resolve it against its own URL
+  return clip && clip.tracking ? new URL(clip.tracking, location.href).href : null;
+}
+
+function isTrackingSupported() {
+  return typeof trackingOverlay.transferControlToOffscreen === 'function' || trackingWorker !== null;
+}
+
+function getTrackingWorker() {
+  if (!trackingWorker && isTrackingSupported()) {
+    const canvas = trackingOverlay.transferControlToOffscreen();
+    trackingWorker = new Worker(TRACKING_WORKER_URL);
+    trackingWorker.postMessage({ type: 'canvas', canvas: canvas }, [canvas]);
+    // Also fires once right away, sizing the canvas
+    new ResizeObserver(resizeTrackingOverlay).observe(trackingOverlay);
+  }
+  return trackingWorker;
+}
+
+function resizeTrackingOverlay() {
+  const ratio = window.devicePixelRatio || 1;
+  trackingWorker.postMessage({
+    type: 'resize',
+    width: Math.round(trackingOverlay.clientWidth * ratio),
+    height: Math.round(trackingOverlay.clientHeight * ratio)
+  });
+}
+
+// Clip and clip time of a media time of the active layer
+function clipAtMediaTime(mediaTime) {
+  if (!isReelMode) return { key: currentVideoKey, time: mediaTime };
+  const segment = findReelSegment(mediaTime);
+  return segment ? { key: segment.key, time: mediaTime - segment.start } : { key: null, time: mediaTime };
+}
+
+function postTrackingFrame(mediaTime) {
+  if (!isTrackingSupported()) return;
+  const clip = clipAtMediaTime(mediaTime);
+  const url = showTracking ? trackingUrl(clip.key) : null;
+  if (!url && !trackingDrawn) return;
+  trackingDrawn = Boolean(url);
+  getTrackingWorker().postMessage({
+    type: 'frame',
+    url: url,
+    time: clip.time,
+    videoWidth: videoPlayer.videoWidth,
+    videoHeight: videoPlayer.videoHeight
+  });
+}
+
+function wantsTrackingFrames() {
+  return showTracking && isTrackingSupported() && (isReelMode || trackingUrl(currentVideoKey) !== null);
+}
+
+// Follow the frames the active layer presents while the overlay has
+// something to draw, falling back to animation frames in browsers without
+// requestVideoFrameCallback
+function updateTrackingOverlay() {
+  trackingMenuItem.hidden = !isTrackingSupported() || trackingUrl(currentVideoKey) === null;
+
+  if (trackingFrameRequest) {
+    const request = trackingFrameRequest;
+    if (request.videoFrame) request.layer.cancelVideoFrameCallback(request.handle);
+    else cancelAnimationFrame(request.handle);
+    trackingFrameRequest = null;
+  }
+
+  const layer = videoPlayer;
+  postTrackingFrame(layer.currentTime);
+  if (!wantsTrackingFrames()) return;
+
+  const onFrame = (mediaTime) => {
+    trackingFrameRequest = null;
+    if (layer !== videoPlayer) return;
+    postTrackingFrame(mediaTime);
+    if (wantsTrackingFrames()) requestFrame();
+  };
+  const requestFrame = () => {
+    if (typeof layer.requestVideoFrameCallback === 'function') {
+      const handle = layer.requestVideoFrameCallback((now, metadata) => onFrame(metadata.mediaTime));
+      trackingFrameRequest = { layer: layer, handle: handle, videoFrame: true };
+    } else {
+      const handle = requestAnimationFrame(() => onFrame(layer.currentTime));
+      trackingFrameRequest = { layer: layer, handle: handle, videoFrame: false };
+    }
+  };
+  requestFrame();
+}
+
+// Fetch an upcoming clip's tracking file before it plays
+function preloadTracking(videoKey) {
+  const url = trackingUrl(videoKey);
+  if (url && showTracking && isTrackingSupported()) {
+    getTrackingWorker().postMessage({ type: 'load', url: url });
+  }
+}
+
+function toggleTracking() {
+  showTracking = !showTracking;
+  trackingBtn.textContent = showTracking ? 'Hide' : 'Show';
+  updateTrackingOverlay();
+}
+
+// Toggle settings menu
+function toggleSettingsMenu() {
+  isSettingsOpen = !isSettingsOpen;
+  if (isSettingsOpen) {
+    settingsMenu.classList.add('visible');
+  } else {
+    settingsMenu.classList.remove('visible');
+  }
+}
+
+// Toggle downloads menu
+function toggleDownloadsMenu() {
+  isDownloadsOpen = !isDownloadsOpen;
+  if (isDownloadsOpen) {
+    downloadsMenu.classList.add('visible');
+    if (isSettingsOpen) {
+      isSettingsOpen = false;
+      settingsMenu.classList.remove('visible');
+    }
+  } else {
+    downloadsMenu.classList.remove('visible');
+  }
+}
+
+// Prefetching: warm the opening bytes of upcoming clips so transitions
+// start from the HTTP cache instead of a cold request
+const PREFETCH_CHUNK_BYTES = 2 * 1024 * 1024;
+const PREFETCH_BYTE_BUDGET = 48 * 1024 * 1024;
+const PREFETCH_MAX_DEPTH = 6;
+const PREFETCH_LOOKAHEAD_SECONDS = 15;
+const preloadContainer = document.getElementById('preloadContainer');
+const prefetches = new Map();
+// Bytes per second, from prefetches and playback
+let measuredThroughput = 0;
+let prefetchedBytes = 0;
+
+// How many upcoming clips to warm, based on the connection and measured throughput
+function prefetchDepth() {
+  const connection = navigator.connection;
+  if (connection && connection.saveData) return 0;
+  if (connection && /2g/.test(connection.effectiveType || '')) return 1;
+  if (!measuredThroughput) return 2;
+
+  // Openings we can fetch within the lookahead window at the measured rate
+  const depth = Math.floor(measuredThroughput * PREFETCH_LOOKAHEAD_SECONDS / PREFETCH_CHUNK_BYTES);
+  return Math.max(1, Math.min(PREFETCH_MAX_DEPTH, depth));
+}
+
+// Active clips that follow the current one, in playback order
+function getUpcomingVideos(count) {
+  const activeVideos = getActiveVideos();
+  const start = activeVideos.indexOf(currentVideoKey) + 1;
+  return activeVideos.slice(start, start + count);
+}
+
+function recordThroughput(bytes, seconds) {
+  if (bytes < 64 * 1024 || seconds <= 0) return;
+  const sample = bytes / seconds;
+  measuredThroughput = measuredThroughput ? 0.7 * measuredThroughput + 0.3 * sample : sample;
+}
+
+// Fall back to a hidden media element when the clip host refuses fetch()
+function prefetchWithElement(entry) {
+  const element = document.createElement('video');
+  element.muted = true;
+  element.preload = 'auto';
+  element.src = entry.url;
+  preloadContainer.appendChild(element);
+  entry.element = element;
+}
+
+async function prefetchClip(url) {
+  const entry = { url: url, controller: new AbortController(), element: null, bytes: 0, done: false };
+  prefetches.set(url, entry);
+
+  const startedAt = performance.now();
+  try {
+    const response = await fetch(url, {
+      headers: { Range: 'bytes=0-' + (PREFETCH_CHUNK_BYTES - 1) },
+      signal: entry.controller.signal
+    });
+    if (!response.ok) throw new Error('Prefetch failed: ' + response.status);
+
+    const reader = response.body.getReader();
+    while (entry.bytes < PREFETCH_CHUNK_BYTES) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      entry.bytes += value.byteLength;
+      prefetchedBytes += value.byteLength;
+    }
+    reader.cancel().catch(() => {});
+    entry.done = true;
+    recordThroughput(entry.bytes, (performance.now() - startedAt) / 1000);
+  } catch (error) {
+    if (entry.controller.signal.aborted) return;
+    prefetchWithElement(entry);
+  }
+}
+
+function cancelPrefetch(url) {
+  const entry = prefetches.get(url);
+  if (!entry) return;
+
+  entry.controller.abort();
+  if (entry.element) {
+    entry.element.removeAttribute('src');
+    entry.element.load();
+    entry.element.remove();
+  }
+  prefetchedBytes -= entry.bytes;
+  prefetches.delete(url);
+}
+
+// Bring prefetches in line with the upcoming clips: start missing ones and
+// cancel those that were disabled, removed or already played
+function schedulePrefetch() {
+  // The next clip itself is loaded by the standby layer
+  const wanted = getUpcomingVideos(prefetchDepth() + 1).slice(1).map(playbackUrl);
+  const wantedSet = new Set(wanted);
+
+  Array.from(prefetches.keys()).forEach(url => {
+    if (!wantedSet.has(url)) cancelPrefetch(url);
+  });
+
+  wanted.forEach(url => {
+    if (prefetches.has(url)) return;
+    if (prefetchedBytes + PREFETCH_CHUNK_BYTES > PREFETCH_BYTE_BUDGET) return;
+    prefetchClip(url);
+  });
+}
+
+// Swap the standby layer in; it is already parked on the next clip's first
+// frame, so playback continues without a black frame or reload
+function swapToStandby() {
+  const previous = videoPlayer;
+  videoPlayer = standbyPlayer;
+  standbyPlayer = previous;
+  standbyKey = null;
+  standbyUrl = null;
+
+  videoPlayer.muted = isMuted;
+  videoPlayer.classList.add('active-layer');
+  previous.classList.remove('active-layer');
+  previous.onloadedmetadata = null;
+  previous.pause();
+}
+
+function clearStandby() {
+  if (standbyKey === null) return;
+  standbyKey = null;
+  standbyUrl = null;
+  standbyPlayer.removeAttribute('src');
+  standbyPlayer.load();
+}
+
+// Load the next active clip into the standby layer
+function prepareStandby() {
+  const nextKey = getUpcomingVideos(1)[0] || null;
+  if (nextKey === null) {
+    clearStandby();
+    return;
+  }
+
+  const url = playbackUrl(nextKey);
+  if (standbyKey === nextKey && standbyUrl === url) return;
+
+  standbyKey = nextKey;
+  standbyUrl = url;
+  standbyPlayer.pause();
+  standbyPlayer.src = url;
+  standbyPlayer.load();
+  preloadTracking(nextKey);
+}
+
+// Reel mode: stitch the active clips into one Media Source Extensions
+// timeline, so a whole highlight reel plays through a single decoder.
+// Clips must be fragmented MP4s.
+const DEFAULT_REEL_CODECS = 'avc1.640028, mp4a.40.2';
+const REEL_LOOKAHEAD_SECONDS = 60;
+const REEL_BACK_BUFFER_SECONDS = 30;
+let reelRequested = false;
+let isReelMode = false;
+let reel = null;
+
+function reelMimeType(videoKey, rendition) {
+  const codecs = (rendition && rendition.codecs) || videoDict[videoKey].codecs || DEFAULT_REEL_CODECS;
+  return 'video/mp4; codecs="' + codecs + '"';
+}
+
+function isReelSupported(videoKey) {
+  return !clipWindow(videoKey) && 'MediaSource' in window && MediaSource.isTypeSupported(reelMimeType(videoKey));
+}
+
+// End time of everything appended so far
+function reelEnd() {
+  const buffered = reel.sourceBuffer.buffered;
+  return buffered.length ? buffered.end(buffered.length - 1) : 0;
+}
+
+function waitForUpdateEnd(sourceBuffer) {
+  return new Promise((resolve, reject) => {
+    const onUpdateEnd = () => { cleanup(); resolve(); };
+    const onError = () => { cleanup(); reject(new Error('SourceBuffer append failed')); };
+    const cleanup = () => {
+      sourceBuffer.removeEventListener('updateend', onUpdateEnd);
+      sourceBuffer.removeEventListener('error', onError);
+    };
+    sourceBuffer.addEventListener('updateend', onUpdateEnd);
+    sourceBuffer.addEventListener('error', onError);
+  });
+}
+
+// Append a chunk, dropping already-played media once if the buffer is full
+async function appendToReel(data) {
+  const sourceBuffer = reel.sourceBuffer;
+  try {
+    sourceBuffer.appendBuffer(data);
+  } catch (error) {
+    if (error.name !== 'QuotaExceededError') throw error;
+    const evictEnd = videoPlayer.currentTime - REEL_BACK_BUFFER_SECONDS;
+    if (evictEnd <= 0) throw error;
+    sourceBuffer.remove(0, evictEnd);
+    await waitForUpdateEnd(sourceBuffer);
+    sourceBuffer.appendBuffer(data);
+  }
+  await waitForUpdateEnd(sourceBuffer);
+}
+
+// Stream one clip into the reel right after what is already buffered
+async function appendClipToReel(videoKey) {
+  const current = reel;
+  const rendition = selectRendition(videoKey);
+  const url = routeUrl(rendition.url);
+  const mimeType = reelMimeType(videoKey, rendition);
+
+  if (mimeType !== current.mimeType && current.sourceBuffer.changeType) {
+    current.sourceBuffer.changeType(mimeType);
+    current.mimeType = mimeType;
+  }
+
+  const start = reelEnd();
+  // In sequence mode the offset is where the clip's first frame lands
+  current.sourceBuffer.timestampOffset = start;
+
+  const response = await fetch(url);
+  if (!response.ok) throw new Error('Failed to fetch ' + videoKey + ': ' + response.status);
+
+  const reader = response.body.getReader();
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done || reel !== current) break;
+    await appendToReel(value);
+  }
+  if (reel !== current) return;
+
+  current.segments.push({ key: videoKey, url: url, start: start, end: reelEnd() });
+  current.appendedKeys.add(videoKey);
+  renderReelBoundaries();
+  scheduleEventMarkers();
+}
+
+// Next active clip to append, following the playlist order
+function nextReelClip() {
+  const lastKey = reel.segments.length ? reel.segments[reel.segments.length - 1].key : null;
+  const start = lastKey === null ? videoKeys.indexOf(reel.firstKey) : videoKeys.indexOf(lastKey) + 1;
+  for (let i = Math.max(start, 0); i < videoKeys.length; i++) {
+    const key = videoKeys[i];
+    if (!disabledVideos.has(key) && !reel.appendedKeys.has(key)) return key;
+  }
+  return null;
+}
+
+// Keep appending clips until enough of the reel is buffered ahead
+async function pumpReel() {
+  if (!reel || reel.appending || reel.mediaSource.readyState === 'closed') return;
+  const current = reel;
+  current.appending = true;
+
+  try {
+    while (reel === current && reelEnd() - videoPlayer.currentTime < REEL_LOOKAHEAD_SECONDS) {
+      const videoKey = nextReelClip();
+      if (videoKey === null) {
+        if (current.mediaSource.readyState === 'open' && !isLiveMode) {
+          current.mediaSource.endOfStream();
+        }
+        break;
+      }
+      try {
+        await appendClipToReel(videoKey);
+      } catch (error) {
+        console.warn('Skipping clip in reel:', error);
+        current.appendedKeys.add(videoKey);
+      }
+    }
+  } finally {
+    current.appending = false;
+  }
+}
+
+// Start a new reel whose first clip is videoKey
+function startReel(videoKey) {
+  stopReel();
+
+  const mediaSource = new MediaSource();
+  reel = {
+    mediaSource: mediaSource,
+    sourceBuffer: null,
+    mimeType: reelMimeType(videoKey),
+    objectUrl: URL.createObjectURL(mediaSource),
+    firstKey: videoKey,
+    segments: [],
+    appendedKeys: new Set(),
+    appending: false
+  };
+
+  const current = reel;
+  mediaSource.addEventListener('sourceopen', () => {
+    if (reel !== current || current.sourceBuffer) return;
+    current.sourceBuffer = mediaSource.addSourceBuffer(current.mimeType);
+    current.sourceBuffer.mode = 'sequence';
+    pumpReel();
+  });
+
+  videoPlayer.src = reel.objectUrl;
+}
+
+function stopReel() {
+  if (!reel) return;
+  URL.revokeObjectURL(reel.objectUrl);
+  reel = null;
+  renderReelBoundaries();
+  scheduleEventMarkers();
+}
+
+function findReelSegment(time) {
+  if (!reel) return null;
+  return reel.segments.find(segment => time >= segment.start && time < segment.end) || null;
+}
+
+// Play videoKey inside the reel, seeking if it is already appended
+function playReelFrom(videoKey) {
+  const segment = reel ? reel.segments.find(s => s.key === videoKey) : null;
+  if (segment) {
+    videoPlayer.currentTime = segment.start;
+  } else {
+    startReel(videoKey);
+  }
+}
+
+// Track which clip the reel is in and skip clips disabled after appending
+function syncReelPosition() {
+  const segment = findReelSegment(videoPlayer.currentTime);
+  if (!segment) return;
+
+  if (disabledVideos.has(segment.key) || !hasKey(videoDict, segment.key)) {
+    const next = reel.segments.find(s => s.start >= segment.end &&
+      !disabledVideos.has(s.key) && hasKey(videoDict, s.key));
+    if (next) {
+      videoPlayer.currentTime = next.start;
+    } else {
+      videoPlayer.currentTime = segment.end;
+    }
+    return;
+  }
+
+  if (segment.key !== currentVideoKey) {
+    currentVideoKey = segment.key;
+    videoTitleOverlay.textContent = segment.key;
+    updateSidebar();
+    updateTrackingOverlay();
+  }
+  pumpReel();
+}
+
+// Clip boundaries shown on the progress bar
+function renderReelBoundaries() {
+  progressContainer.querySelectorAll('.reel-boundary').forEach(el => el.remove());
+  if (!reel || !videoPlayer.duration || !isFinite(videoPlayer.duration)) return;
+
+  reel.segments.slice(1).forEach(segment => {
+    const tick = document.createElement('div');
+    tick.classList.add('reel-boundary');
+    tick.style.left = (segment.start / videoPlayer.duration * 100) + '%';
+    progressContainer.appendChild(tick);
+  });
+}
+
+// Switch between per-clip playback and reel mode, keeping the current clip
+function setReelMode(enabled) {
+  if (enabled === reelRequested) return;
+  reelRequested = enabled;
+
+  const resumeKey = currentVideoKey;
+  isReelMode = enabled;
+  stopReel();
+  clearStandby();
+  Array.from(prefetches.keys()).forEach(cancelPrefetch);
+  currentVideoKey = null;
+  if (resumeKey) loadVideo(resumeKey);
+}
+
+// Prepare everything that follows the current clip
+function scheduleUpcoming() {
+  if (isReelMode) {
+    requestMoreClipsIfNeeded(videoKeys.indexOf(currentVideoKey));
+    pumpReel();
+    return;
+  }
+  prepareStandby();
+  schedulePrefetch();
+  requestMoreClipsIfNeeded(videoKeys.indexOf(currentVideoKey));
+}
+
+// Load a specific video by key
+function loadVideo(videoKey) {
+  if (!videoKey || disabledVideos.has(videoKey)) return;
+
+  currentVideoKey = videoKey;
+  playlistEnded = false;
+  resetSeeks();
+  thumbnailIndex(videoKey);
+
+  videoTitleOverlay.textContent = videoKey;
+
+  if (isReelMode && !isReelSupported(videoKey)) {
+    isReelMode = false;
+    stopReel();
+    showUnifiedNotification("Reel mode is not supported for these clips, playing them one by one");
+  }
+
+  if (isReelMode) {
+    playReelFrom(videoKey);
+    videoPlayer.play().catch(err => console.error("Error playing reel:", err));
+    updateSidebar();
+    updateTrackingOverlay();
+    scheduleEventMarkers();
+    return;
+  }
+
+  const autoPlay = () => {
+    enterWindow();
+    updateProgressBar();
+    // Auto play the video
+    videoPlayer.play().then(() => {
+      isPlaying = true;
+      playPauseBtn.innerHTML = '<i class="material-icons">pause</i>';
+    }).catch(err => console.error("Error auto-playing video:", err));
+  };
+
+  // A preloaded standby clip is used even if the quality estimate has moved since
+  const standbyRendition = standbyKey === videoKey ? renditionForUrl(videoKey, standbyUrl) : null;
+  if (standbyRendition) {
+    swapToStandby();
+    playingRendition = standbyRendition;
+  } else {
+    playingRendition = selectRendition(videoKey);
+    videoPlayer.src = renditionUrl(playingRendition.url, videoKey);
+  }
+  renderQualityMenu();
+
+  // A ready standby layer already shows the first frame, no spinner needed
+  if (videoPlayer.readyState < HTMLMediaElement.HAVE_CURRENT_DATA) {
+    showUnifiedNotification("Loading video...", { 
+      showSpinner: true, 
+      showToast: false 
+    });
+  }
+
+  if (videoPlayer.readyState >= HTMLMediaElement.HAVE_METADATA) {
+    autoPlay();
+  } else {
+    videoPlayer.onloadedmetadata = autoPlay;
+  }
+
+  updateSidebar();
+  updateMuteButtonText();
+  updateTrackingOverlay();
+  scheduleEventMarkers();
+}
+
+// Load next video in playlist
+function loadNextVideo() {
+  const activeVideos = getActiveVideos();
+  if (activeVideos.length === 0) return;
+
+  // Search the whole playlist, as the current clip may just have been disabled
+  const nextKey = nextSurvivingVideo(videoKeys, currentVideoKey);
+
+  if (nextKey) {
+    loadVideo(nextKey);
+  } else {
+    videoPlayer.pause();
+    playPauseBtn.innerHTML = '<i class="material-icons">play_arrow</i>';
+    isPlaying = false;
+    playlistEnded = true;
+    if (hasMoreClips()) {
+      awaitingPage = true;
+      requestMoreClips();
+      showUnifiedNotification("Loading more clips...");
+    } else {
+      showUnifiedNotification(isLiveMode ? "Waiting for new clips..." : "End of playlist reached");
+    }
+  }
+}
+
+// Playlist sidebar
+// Only the rows in view are in the DOM. Rows have a fixed height so a row's
+// position follows from its index, and they are kept by clip key so an update
+// touches only the rows whose state changed.
+const PLAYLIST_ROW_HEIGHT = 46;
+const PLAYLIST_OVERSCAN_ROWS = 8;
+const playlistSpacer = document.createElement('div');
+playlistSpacer.id = 'playlistSpacer';
+playlistItems.appendChild(playlistSpacer);
+// videoKey -> { element, button, toggle, index, state }
+const playlistRows = new Map();
+let sidebarFrame = null;
+
+function createPlaylistRow(videoKey) {
+  const element = document.createElement('div');
+  element.className = 'video-item';
+  element.dataset.key = videoKey;
+
+  const button = document.createElement('button');
+  button.className = 'video-button';
+  const name = document.createElement('span');
+  name.className = 'video-name';
+  name.textContent = videoKey;
+  const duration = document.createElement('span');
+  duration.className = 'video-duration';
+  button.appendChild(name);
+  button.appendChild(duration);
+
+  const toggle = document.createElement('button');
+  toggle.dataset.action = 'toggle';
+
+  element.appendChild(button);
+  element.appendChild(toggle);
+  playlistSpacer.appendChild(element);
+  return { element: element, button: button, duration: duration, toggle: toggle, index: -1, state: null };
+}
+
+function updatePlaylistRow(row, index, videoKey) {
+  if (row.index !== index) {
+    row.element.style.transform = 'translateY(' + (index * PLAYLIST_ROW_HEIGHT) + 'px)';
+    row.index = index;
+  }
+
+  const disabled = disabledVideos.has(videoKey);
+  const duration = clipDuration(videoKey);
+  const broken = brokenVideos.get(videoKey);
+  const state = [disabled, videoKey === currentVideoKey, duration, broken].join('|');
+  if (row.state === state) return;
+  row.state = state;
+
+  row.button.classList.toggle('disabled', disabled);
+  row.button.classList.toggle('broken', broken !== undefined);
+  row.button.classList.toggle('active-video', videoKey === currentVideoKey);
+  row.button.title = broken !== undefined ? videoKey + ' (' + broken + ')' : videoKey;
+  row.duration.textContent = duration ? formatTime(duration) : '';
+  row.toggle.className = disabled ? 'enable-button' : 'remove-button';
+  row.toggle.innerHTML = '<i class="material-icons" style="font-size: 12px;">' +
+    (disabled ? 'check' : 'close') + '</i>';
+}
+
+function renderSidebar() {
+  sidebarFrame = null;
+  playlistSpacer.style.height = (videoKeys.length * PLAYLIST_ROW_HEIGHT) + 'px';
+
+  const first = Math.max(0, Math.floor(playlistItems.scrollTop / PLAYLIST_ROW_HEIGHT) - PLAYLIST_OVERSCAN_ROWS);
+  const last = Math.min(videoKeys.length,
+    Math.ceil((playlistItems.scrollTop + playlistItems.clientHeight) / PLAYLIST_ROW_HEIGHT) + PLAYLIST_OVERSCAN_ROWS);
+
+  const visible = new Set();
+  for (let i = first; i < last; i++) {
+    const videoKey = videoKeys[i];
+    visible.add(videoKey);
+    let row = playlistRows.get(videoKey);
+    if (!row) {
+      row = createPlaylistRow(videoKey);
+      playlistRows.set(videoKey, row);
+    }
+    updatePlaylistRow(row, i, videoKey);
+  }
+
+  playlistRows.forEach((row, videoKey) => {
+    if (!visible.has(videoKey)) {
+      row.element.remove();
+      playlistRows.delete(videoKey);
+    }
+  });
+
+  if (videoKeys.length) requestMoreClipsIfNeeded(last - 1);
+}
+
+function scheduleSidebarRender() {
+  if (sidebarFrame === null) sidebarFrame = requestAnimationFrame(renderSidebar);
+}
+
+// Update sidebar UI
+function updateSidebar() {
+  renderSidebar();
+  updatePlaylistDuration();
+  updateDownloadPlaylistButton();
+}
+
+// Total length of the active clips, known up front for probed playlists
+function updatePlaylistDuration() {
+  let total = 0;
+  let complete = true;
+  getActiveVideos().forEach(videoKey => {
+    const duration = clipDuration(videoKey);
+    if (duration) {
+      total += duration;
+    } else {
+      complete = false;
+    }
+  });
+  playlistDuration.textContent = total ? formatTime(total) + (complete ? '' : '+') : '';
+}
+
+// One handler serves every row, including rows created later
+playlistItems.addEventListener('click', (event) => {
+  const row = event.target.closest('.video-item');
+  if (!row) return;
+
+  const videoKey = row.dataset.key;
+  if (event.target.closest('[data-action="toggle"]')) {
+    if (disabledVideos.has(videoKey)) {
+      enableVideo(videoKey);
+    } else {
+      disableVideo(videoKey);
+    }
+  } else if (!disabledVideos.has(videoKey)) {
+    loadVideo(videoKey);
+  }
+});
+
+playlistItems.addEventListener('scroll', scheduleSidebarRender, { passive: true });
+new ResizeObserver(scheduleSidebarRender).observe(playlistItems);
+
+// Update download playlist button state
+function updateDownloadPlaylistButton() {
+  const activeVideos = getActiveVideos();
+  if (activeVideos.length < 1 || isDownloading) {
+    downloadPlaylistBtn.disabled = true;
+    downloadPlaylistBtn.textContent = activeVideos.length < 1 ? 
+      "No Active Clips" : "Creating ZIP...";
+  } else {
+    downloadPlaylistBtn.disabled = false;
+    downloadPlaylistBtn.innerHTML = '<i class="material-icons">archive</i> Download as ZIP';
+  }
+}
+
+// Disable a video
+function disableVideo(videoKey) {
+  disabledVideos.add(videoKey);
+
+  if (videoKey === currentVideoKey) {
+    loadNextVideo();
+  }
+
+  updateSidebar();
+  scheduleUpcoming();
+}
+
+// Enable a video
+function enableVideo(videoKey) {
+  disabledVideos.delete(videoKey);
+  brokenVideos.delete(videoKey);
+  updateSidebar();
+  scheduleUpcoming();
+}
+
+// Toggle play/pause
+function togglePlayPause() {
+  if (videoPlayer.paused) {
+    videoPlayer.play();
+    playPauseBtn.innerHTML = '<i class="material-icons">pause</i>';
+    isPlaying = true;
+  } else {
+    videoPlayer.pause();
+    playPauseBtn.innerHTML = '<i class="material-icons">play_arrow</i>';
+    isPlaying = false;
+  }
+}
+
+// Update mute button text
+function updateMuteButtonText() {
+  muteBtn.textContent = videoPlayer.muted ? "Unmute" : "Mute";
+}
+
+// Toggle mute/unmute
+function toggleMute() {
+  isMuted = !videoPlayer.muted;
+  videoLayers.forEach(layer => { layer.muted = isMuted; });
+  updateMuteButtonText();
+}
+
+// Show controls temporarily
+function showControlsTemporarily() {
+  customControls.classList.add('active');
+
+  if (controlsTimeout) {
+    clearTimeout(controlsTimeout);
+  }
+
+  controlsTimeout = setTimeout(() => {
+    if (!videoWrapper.matches(':hover') && !isDragging && !isSettingsOpen && !isDownloadsOpen) {
+      customControls.classList.remove('active');
+    }
+  }, 3000);
+}
+
+// Both layers share the same handlers; only events from the visible one count
+function onActiveVideo(type, handler) {
+  videoLayers.forEach(layer => {
+    layer.addEventListener(type, (e) => {
+      if (e.target === videoPlayer) handler(e);
+    });
+  });
+}
+
+// Video event listeners
+onActiveVideo('timeupdate', () => {
+  if (isReelMode) {
+    syncReelPosition();
+  }
+  if (!isDragging) {
+    updateProgressBar();
+  }
+  updateActiveEvent(videoPlayer.currentTime);
+  checkDroppedFrames();
+  checkWindowEnd(videoPlayer.currentTime);
+});
+
+onActiveVideo('durationchange', () => {
+  renderReelBoundaries();
+  scheduleEventMarkers();
+});
+
+onActiveVideo('progress', sampleThroughput);
+
+onActiveVideo('seeked', () => {
+  if (!seekState.inFlight) return;
+
+  const elapsed = performance.now() - seekState.startedAt;
+  seekStats.count++;
+  seekStats.totalMs += elapsed;
+  seekStats.maxMs = Math.max(seekStats.maxMs, elapsed);
+  seekState.inFlight = false;
+  startNextSeek();
+});
+
+// A clip that cannot be played is skipped instead of stalling the playlist
+videoLayers.forEach(layer => {
+  layer.addEventListener('error', () => {
+    if (isReelMode || !layer.error || !layer.getAttribute('src')) return;
+
+    const videoKey = layer === videoPlayer ? currentVideoKey : standbyKey;
+    if (videoKey === null || !hasKey(videoDict, videoKey)) return;
+
+    markBroken(videoKey, layer.error.message || 'could not be played');
+    if (layer === videoPlayer) {
+      showUnifiedNotification("Skipping " + videoKey + ": it could not be played");
+      loadNextVideo();
+    } else {
+      clearStandby();
+    }
+    updateSidebar();
+    scheduleUpcoming();
+  });
+});
+
+onActiveVideo('ended', () => {
+  loadNextVideo();
+});
+
+// Download current clip (force download using blob)
+async function downloadCurrentClip() {
+  if (!currentVideoKey || !videoDict[currentVideoKey] || isDownloading) return;
+
+  // A window of a recording is cut on the server rather than downloading the recording
+  if (exportUrl && exportJobs !== false && clipWindow(currentVideoKey)) {
+    downloadViaJob([currentVideoKey], clipFilename(currentVideoKey), downloadClipFile);
+    return;
+  }
+  downloadClipFile();
+}
+
+// Download the current clip's file as it is served
+async function downloadClipFile() {
+  if (!currentVideoKey || !videoDict[currentVideoKey] || isDownloading) return;
+  isDownloading = true;
+  setSidebarDisabled(true);
+
+  const videoUrl = clipUrl(currentVideoKey);
+  const filename = clipFilename(currentVideoKey);
+
+  showUnifiedNotification("Starting download...", {
+    showSpinner: true,
+    spinnerText: "Preparing download...",
+    duration: 3000
+  });
+
+  try {
+    // Fetch the video as a blob
+    const blob = await fetchWithRetry(videoUrl, () => {});
+
+    // Create object URL and download link
+    const blobUrl = URL.createObjectURL(blob);
+    const downloadLink = document.createElement('a');
+    downloadLink.href = blobUrl;
+    downloadLink.download = filename;
+    downloadLink.style.display = 'none';
+
+    document.body.appendChild(downloadLink);
+    downloadLink.click();
+
+    // Clean up
+    setTimeout(() => {
+      document.body.removeChild(downloadLink);
+      URL.revokeObjectURL(blobUrl);
+      showUnifiedNotification("Download completed! Check your downloads folder.", {
+        hideSpinner: true
+      });
+      isDownloading = false;
+      setSidebarDisabled(false);
+    }, 1000);
+
+  } catch (error) {
+    console.error('Error downloading clip:', error);
+    showUnifiedNotification('Error: Failed to download clip. ' + (error.message || 'Please try again.'), {
+      hideSpinner: true
+    });
+    isDownloading = false;
+    setSidebarDisabled(false);
+  }
+}
+
+// Downloads
+const ZIP_WORKER_URL = '@@zip_worker.js@@';
+const REEL_WORKER_URL = '@@reel_worker.js@@';
+let exportUrl = null;
+// Whether the export server has a job queue; null until it has answered
+let exportJobs = null;
+const DOWNLOAD_RETRIES = 3;
+const DOWNLOAD_RETRY_DELAY_MS = 500;
+let downloadConcurrency = 4;
+
+function clipFilename(videoKey) {
+  return videoKey.replace(/[^a-z0-9]/gi, '_').toLowerCase() + '.mp4';
+}
+
+function formatBytes(bytes) {
+  if (bytes < 1024 * 1024) return (bytes / 1024).toFixed(0) + ' KB';
+  return (bytes / (1024 * 1024)).toFixed(1) + ' MB';
+}
+
+function sleep(ms) {
+  return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+// Fetch a URL as a blob, retrying network errors and 5xx/429 responses
+// with exponential backoff. onProgress(bytes, totalBytes) receives byte
+// deltas; bytes from a failed attempt are handed back as a negative delta.
+async function fetchWithRetry(url, onProgress) {
+  for (let attempt = 0; ; attempt++) {
+    let received = 0;
+    try {
+      const response = await fetch(url);
+      if (!response.ok) {
+        const error = new Error('Failed to fetch video: ' + response.status);
+        error.retryable = response.status >= 500 || response.status === 429;
+        throw error;
+      }
+
+      const totalBytes = Number(response.headers.get('Content-Length')) || 0;
+      const reader = response.body.getReader();
+      const chunks = [];
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        chunks.push(value);
+        received += value.byteLength;
+        onProgress(value.byteLength, totalBytes);
+      }
+      return new Blob(chunks, { type: response.headers.get('Content-Type') || 'video/mp4' });
+    } catch (error) {
+      if (received) onProgress(-received, 0);
+      const retryable = error.retryable !== undefined ? error.retryable : error instanceof TypeError;
+      if (!retryable || attempt >= DOWNLOAD_RETRIES) throw error;
+      await sleep(DOWNLOAD_RETRY_DELAY_MS * Math.pow(2, attempt));
+    }
+  }
+}
+
+// Aggregate per-file progress into a throughput and ETA readout
+function createDownloadProgress(totalFiles) {
+  const startedAt = performance.now();
+  const sizes = [];
+  let bytes = 0;
+  let filesDone = 0;
+
+  function render() {
+    const elapsed = (performance.now() - startedAt) / 1000;
+    const rate = elapsed > 0 ? bytes / elapsed : 0;
+    const knownSize = sizes.reduce((a, b) => a + b, 0);
+    // Files without a known size are assumed to be average sized
+    const averageSize = sizes.length ? knownSize / sizes.length : 0;
+    const expected = knownSize + averageSize * Math.max(0, totalFiles - sizes.length);
+
+    let text = 'Downloading ' + filesDone + ' of ' + totalFiles + ' clips';
+    if (rate > 0) {
+      text += ' \u2013 ' + formatBytes(rate) + '/s';
+      if (expected > bytes) {
+        text += ', about ' + formatTime((expected - bytes) / rate) + ' left';
+      }
+    }
+    showUnifiedNotification(text, {
+      showSpinner: true,
+      spinnerText: text,
+      showToast: false
+    });
+  }
+
+  const timer = setInterval(render, 500);
+  render();
+
+  return {
+    addBytes(delta) {
+      bytes += delta;
+    },
+    addSize(totalBytes) {
+      sizes.push(totalBytes);
+    },
+    fileDone() {
+      filesDone++;
+    },
+    stop() {
+      clearInterval(timer);
+    }
+  };
+}
+
+// Give every clip a distinct file name inside the archive
+function zipEntries(videoKeys) {
+  const used = new Set();
+  return videoKeys.map(videoKey => {
+    const base = clipFilename(videoKey).replace(/\.mp4$/, '');
+    let name = base + '.mp4';
+    for (let n = 2; used.has(name); n++) name = base + '_' + n + '.mp4';
+    used.add(name);
+    return Object.assign({ name: name, url: clipUrl(videoKey) }, clipWindow(videoKey));
+  });
+}
+
+// Ask where to save an export so it can be streamed straight to disk.
+// Returns null when the browser (or the sandboxed frame) has no file picker.
+async function pickDestination(suggestedName, description, mimeType) {
+  if (!window.showSaveFilePicker) return null;
+  const extension = suggestedName.slice(suggestedName.lastIndexOf('.'));
+  try {
+    return await window.showSaveFilePicker({
+      suggestedName: suggestedName,
+      types: [{ description: description, accept: { [mimeType]: [extension] } }]
+    });
+  } catch (error) {
+    if (error.name === 'AbortError') throw error;
+    return null;
+  }
+}
+
+// Hand a finished export to the browser's downloads
+function saveBlob(blob, filename) {
+  const blobUrl = URL.createObjectURL(blob);
+  const downloadLink = document.createElement('a');
+  downloadLink.href = blobUrl;
+  downloadLink.download = filename;
+  downloadLink.style.display = 'none';
+
+  document.body.appendChild(downloadLink);
+  downloadLink.click();
+
+  // Clean up
+  setTimeout(() => {
+    document.body.removeChild(downloadLink);
+    URL.revokeObjectURL(blobUrl);
+  }, 1000);
+}
+
+// Run an export worker (ZIP_WORKER_URL or REEL_WORKER_URL) and report its progress
+function runExportWorker(workerUrl, clips, fileHandle) {
+  return new Promise((resolve, reject) => {
+    const worker = new Worker(workerUrl);
+    const progress = createDownloadProgress(clips.length);
+    const finish = () => {
+      progress.stop();
+      worker.terminate();
+    };
+
+    worker.onmessage = (event) => {
+      const message = event.data;
+      if (message.type === 'size') {
+        progress.addSize(message.bytes);
+      } else if (message.type === 'bytes') {
+        progress.addBytes(message.bytes);
+      } else if (message.type === 'file') {
+        progress.fileDone();
+      } else if (message.type === 'done') {
+        finish();
+        resolve(message);
+      } else if (message.type === 'error') {
+        finish();
+        reject(new Error(message.message));
+      }
+    };
+    worker.onerror = (event) => {
+      finish();
+      reject(new Error(event.message));
+    };
+
+    worker.postMessage({ clips: clips, fileHandle: fileHandle, concurrency: downloadConcurrency });
+  });
+}
+
+// Hand the clip list to the export server. It streams the archive back as
+// an attachment, so the browser saves it as a normal download.
+function exportViaServer(clips) {
+  let frame = document.getElementById('exportFrame');
+  if (!frame) {
+    frame = document.createElement('iframe');
+    frame.id = 'exportFrame';
+    frame.name = 'exportFrame';
+    frame.style.display = 'none';
+    document.body.appendChild(frame);
+  }
+
+  const form = document.createElement('form');
+  form.method = 'POST';
+  form.action = exportUrl;
+  form.target = 'exportFrame';
+  form.style.display = 'none';
+
+  const input = document.createElement('input');
+  input.type = 'hidden';
+  input.name = 'clips';
+  input.value = JSON.stringify(clips);
+  form.appendChild(input);
+
+  document.body.appendChild(form);
+  form.submit();
+  form.remove();
+
+  showUnifiedNotification('Export started! video_clips.zip will appear in your downloads', {
+    duration: 5000
+  });
+}
+
+// Server-side jobs: the export server cuts windows and joins clips into one
+// MP4 by stream copy, and reports progress while it works
+const JOB_POLL_INTERVAL_MS = 500;
+
+// Ask the export server whether it runs jobs. Servers without a queue (or
+// from before the question existed) leave cutting and joining to the browser.
+function checkExportJobs() {
+  exportJobs = null;
+  if (!exportUrl) return;
+  const url = exportUrl;
+  fetch(url.replace(/\/?$/, '/') + 'jobs')
+    .then(response => response.ok ? response.json() : { jobs: false })
+    .then(capabilities => {
+      if (url === exportUrl) exportJobs = Boolean(capabilities.jobs);
+    })
+    .catch(error => console.warn('Export server unavailable:', error));
+}
+
+async function runExportJob(videoKeys) {
+  const base = exportUrl.replace(/\/?$/, '/');
+  const clips = videoKeys.map(videoKey => Object.assign({ url: clipUrl(videoKey) }, clipWindow(videoKey)));
+  const response = await fetch(base + 'jobs', {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ clips: clips })
+  });
+  if (response.status === 404) {
+    const error = new Error('The export server has no job queue');
+    error.noJobQueue = true;
+    throw error;
+  }
+  let status = await response.json();
+  if (!response.ok) throw new Error(status.error || 'Export server answered ' + response.status);
+
+  while (status.state !== 'done') {
+    if (status.state === 'failed') throw new Error(status.error || 'Export job failed');
+    // A toast rather than the spinner, so the clip keeps playing in view
+    showUnifiedNotification("Preparing video... " + Math.round(status.progress * 100) + "%", {
+      duration: JOB_POLL_INTERVAL_MS * 4
+    });
+    await sleep(JOB_POLL_INTERVAL_MS);
+    const poll = await fetch(base + 'jobs/' + status.id);
+    status = await poll.json();
+    if (!poll.ok) throw new Error(status.error || 'Export server answered ' + poll.status);
+  }
+  return base + 'jobs/' + status.id + '/result';
+}
+
+// Run a cut or join on the export server, or `fallback` in the browser when
+// the server turns out to have no job queue
+async function downloadViaJob(videoKeys, filename, fallback) {
+  if (isDownloading) return;
+  isDownloading = true;
+  updateDownloadPlaylistButton();
+  setSidebarDisabled(true);
+
+  let useFallback = false;
+  try {
+    const resultUrl = await runExportJob(videoKeys);
+    // The result is sent as an attachment, so following the link only downloads it
+    const downloadLink = document.createElement('a');
+    downloadLink.href = resultUrl + '?name=' + encodeURIComponent(filename);
+    downloadLink.style.display = 'none';
+    document.body.appendChild(downloadLink);
+    downloadLink.click();
+    downloadLink.remove();
+    showUnifiedNotification(filename + " will appear in your downloads", {
+      hideSpinner: true,
+      duration: 5000
+    });
+  } catch (error) {
+    if (error.noJobQueue) {
+      exportJobs = false;
+      useFallback = true;
+    } else {
+      console.error('Error exporting video:', error);
+      showUnifiedNotification('Error: Failed to export video. ' + (error.message || 'Please try again.'), {
+        hideSpinner: true
+      });
+    }
+  } finally {
+    isDownloading = false;
+    updateDownloadPlaylistButton();
+    setSidebarDisabled(false);
+  }
+  if (useFallback) fallback();
+}
+
+// Join the active clips into one MP4 in a worker, without a server. Samples
+// are copied where the clips allow and re-encoded with WebCodecs where not;
+// see reel_worker.js.
+async function joinInBrowser(videoKeys, filename) {
+  // The picker must be opened while the click still counts as user activation
+  let fileHandle;
+  try {
+    fileHandle = await pickDestination(filename, 'MP4 video', 'video/mp4');
+  } catch (error) {
+    return;
+  }
+
+  isDownloading = true;
+  updateDownloadPlaylistButton();
+  setSidebarDisabled(true);
+
+  try {
+    const result = await runExportWorker(REEL_WORKER_URL, zipEntries(videoKeys), fileHandle);
+    if (result.blob) saveBlob(result.blob, filename);
+
+    let message = 'Video created! Joined ' + result.added + ' clips as ' + filename;
+    const notes = [];
+    if (result.reencoded) notes.push(result.reencoded + ' re-encoded');
+    if (result.silent) notes.push(result.silent + ' without sound');
+    if (result.skipped) notes.push(result.skipped + ' failed');
+    if (notes.length) message += ' (' + notes.join(', ') + ')';
+    showUnifiedNotification(message, {
+      hideSpinner: true,
+      duration: 5000
+    });
+  } catch (error) {
+    console.error('Error joining clips:', error);
+    showUnifiedNotification('Error: Failed to create video. ' + (error.message || 'Please try again.'), {
+      hideSpinner: true
+    });
+  } finally {
+    isDownloading = false;
+    updateDownloadPlaylistButton();
+    setSidebarDisabled(false);
+  }
+}
+
+// Join the active clips into one MP4, on the export server when there is one
+function downloadReel() {
+  const activeVideos = getActiveVideos();
+  if (activeVideos.length < 1 || isDownloading) return;
+  if (exportUrl && exportJobs !== false) {
+    downloadViaJob(activeVideos, 'highlights.mp4', () => joinInBrowser(activeVideos, 'highlights.mp4'));
+  } else {
+    joinInBrowser(activeVideos, 'highlights.mp4');
+  }
+}
+
+// Download all active clips as ZIP. The archive is written by a worker in
+// STORE mode directly from the response streams, so memory stays around one
+// chunk and the player keeps running during the export.
+async function downloadAllClips() {
+  const activeVideos = getActiveVideos();
+  if (activeVideos.length < 1 || isDownloading) return;
+
+  if (exportUrl) {
+    exportViaServer(zipEntries(activeVideos));
+    return;
+  }
+
+  // The picker must be opened while the click still counts as user activation
+  let fileHandle;
+  try {
+    fileHandle = await pickDestination('video_clips.zip', 'ZIP archive', 'application/zip');
+  } catch (error) {
+    return;
+  }
+
+  isDownloading = true;
+  updateDownloadPlaylistButton();
+  setSidebarDisabled(true);
+
+  // Without a file handle the worker collects the whole archive in memory
+  showUnifiedNotification("Creating ZIP file...", {
+    showSpinner: true,
+    spinnerText: fileHandle ? "Preparing ZIP download..." : "Building the ZIP in memory...",
+    duration: 5000
+  });
+
+  try {
+    const result = await runExportWorker(ZIP_WORKER_URL, zipEntries(activeVideos), fileHandle);
+
+    // No file picker: hand the finished archive to the browser's downloads
+    if (result.blob) saveBlob(result.blob, 'video_clips.zip');
+
+    let message = 'ZIP file created! Downloaded ' + result.added + ' clips as video_clips.zip';
+    if (result.skipped) message += ' (' + result.skipped + ' failed)';
+    showUnifiedNotification(message, {
+      hideSpinner: true,
+      duration: 5000
+    });
+
+  } catch (error) {
+    console.error('Error creating ZIP file:', error);
+    showUnifiedNotification('Error: Failed to create ZIP file. ' + (error.message || 'Please try again.'), {
+      hideSpinner: true
+    });
+  } finally {
+    isDownloading = false;
+    updateDownloadPlaylistButton();
+    setSidebarDisabled(false);
+  }
+}
+
+// Enable all clips in the playlist
+function enableAllClips() {
+  disabledVideos.clear();
+  brokenVideos.clear();
+  updateSidebar();
+  scheduleUpcoming();
+  showUnifiedNotification("All clips enabled");
+}
+
+// Disable all clips in the playlist
+function disableAllClips() {
+  videoKeys.forEach(key => {
+    disabledVideos.add(key);
+  });
+
+  updateSidebar();
+  scheduleUpcoming();
+  showUnifiedNotification("All clips disabled");
+
+  videoPlayer.pause();
+  playPauseBtn.innerHTML = '<i class="material-icons">play_arrow</i>';
+  isPlaying = false;
+}
+
+// Event listeners
+playPauseBtn.addEventListener('click', togglePlayPause);
+settingsBtn.addEventListener('click', toggleSettingsMenu);
+downloadBtn.addEventListener('click', toggleDownloadsMenu);
+playlistBtn.addEventListener('click', togglePlaylist);
+sidebarCloseBtn.addEventListener('click', closePlaylist);
+muteBtn.addEventListener('click', toggleMute);
+trackingBtn.addEventListener('click', toggleTracking);
+onActiveVideo('click', togglePlayPause);
+
+// Progress bar event listeners
+progressContainer.addEventListener('click', (e) => {
+  if (isDragging) return;
+  setVideoTimeFromPosition(e.clientX);
+});
+
+progressContainer.addEventListener('mousemove', (e) => {
+  showScrubPreview(e.clientX);
+});
+progressContainer.addEventListener('mouseleave', () => {
+  if (!isDragging) hideScrubPreview();
+});
+progressContainer.addEventListener('mousedown', (e) => {
+  isDragging = true;
+  progressContainer.classList.add('dragging');
+  setVideoTimeFromPosition(e.clientX, false);
+
+  const wasPlaying = !videoPlayer.paused;
+  if (wasPlaying) {
+    videoPlayer.pause();
+  }
+
+  function handleMouseMove(e) {
+    if (isDragging) {
+      // The bar and preview follow the mouse; the video follows as fast as
+      // the decoder allows, landing on keyframes until the mouse is released
+      showScrubPreview(e.clientX);
+      progressBar.style.width = (positionFraction(e.clientX) * 100) + '%';
+      setVideoTimeFromPosition(e.clientX, false);
+      e.preventDefault();
+    }
+  }
+
+  function handleMouseUp(e) {
+    if (isDragging) {
+      isDragging = false;
+      progressContainer.classList.remove('dragging');
+      setVideoTimeFromPosition(e.clientX);
+      if (!progressContainer.matches(':hover')) hideScrubPreview();
+      logSeekStats();
+
+      if (wasPlaying) {
+        videoPlayer.play();
+      }
+
+      document.removeEventListener('mousemove', handleMouseMove);
+      document.removeEventListener('mouseup', handleMouseUp);
+    }
+  }
+
+  document.addEventListener('mousemove', handleMouseMove);
+  document.addEventListener('mouseup', handleMouseUp);
+});
+
+// Close menus when clicking outside
+document.addEventListener('click', (e) => {
+  if (isSettingsOpen && 
+      !settingsMenu.contains(e.target) && 
+      e.target !== settingsBtn) {
+    isSettingsOpen = false;
+    settingsMenu.classList.remove('visible');
+  }
+
+  if (isDownloadsOpen && 
+      !downloadsMenu.contains(e.target) && 
+      e.target !== downloadBtn) {
+    isDownloadsOpen = false;
+    downloadsMenu.classList.remove('visible');
+  }
+});
+
+// Mouse interaction handlers
+videoWrapper.addEventListener('mousemove', showControlsTemporarily);
+videoWrapper.addEventListener('mouseleave', () => {
+  if (!isDragging && !videoPlayer.paused && !isSettingsOpen && !isDownloadsOpen) {
+    customControls.classList.remove('active');
+  }
+});
+
+onActiveVideo('pause', () => {
+  customControls.classList.add('active');
+  playPauseBtn.innerHTML = '<i class="material-icons">play_arrow</i>';
+  isPlaying = false;
+});
+
+onActiveVideo('contextmenu', (e) => {
+  e.preventDefault();
+  return false;
+});
+
+// Video loading event handlers
+onActiveVideo('canplay', () => {
+  showUnifiedNotification("", { hideSpinner: true, showToast: false });
+
+  if (isPlaying) {
+    videoPlayer.play().catch(err => console.error("Error playing video:", err));
+    playPauseBtn.innerHTML = '<i class="material-icons">pause</i>';
+  }
+});
+
+onActiveVideo('waiting', () => {
+  if (isPlaying) handleStall();
+  showUnifiedNotification("Loading video...", { 
+    showSpinner: true, 
+    showToast: false 
+  });
+});
+
+onActiveVideo('playing', () => {
+  showUnifiedNotification("", { hideSpinner: true, showToast: false });
+  playPauseBtn.innerHTML = '<i class="material-icons">pause</i>';
+  isPlaying = true;
+  watchWindowEnd();
+  updateTrackingOverlay();
+  // Buffer the next clips once the current one no longer competes for bandwidth
+  scheduleUpcoming();
+});
+
+// Download button event listeners
+downloadClipBtn.addEventListener('click', downloadCurrentClip);
+downloadPlaylistBtn.addEventListener('click', downloadAllClips);
+downloadReelBtn.addEventListener('click', downloadReel);
+playlistSettingsExpander.addEventListener('click', togglePlaylistSettingsExpander);
+qualityControls.addEventListener('click', (e) => {
+  const button = e.target.closest('[data-quality]');
+  if (button) setQuality(button.dataset.quality);
+});
+enableAllClipsBtn.addEventListener('click', enableAllClips);
+disableAllClipsBtn.addEventListener('click', disableAllClips);
+
+function hasKey(dict, key) {
+  return Object.prototype.hasOwnProperty.call(dict, key);
+}
+
+// Clip fields that decide what media is played; other fields are metadata
+const CLIP_SOURCE_FIELDS = ['url', 'start', 'end', 'renditions'];
+
+function clipSource(clip) {
+  return JSON.stringify(CLIP_SOURCE_FIELDS.map(field => clip[field]));
+}
+
+// Compute what changed between the playing playlist and a new one.
+// `changed` lists every clip whose fields differ, `sourceChanged` those
+// whose media differs.
+function diffPlaylists(oldDict, newDict) {
+  const oldKeys = Object.keys(oldDict);
+  const newKeys = Object.keys(newDict);
+  let added = newKeys.filter(k => !hasKey(oldDict, k));
+  let removed = oldKeys.filter(k => !hasKey(newDict, k));
+  const changed = newKeys.filter(k =>
+    hasKey(oldDict, k) && JSON.stringify(oldDict[k]) !== JSON.stringify(newDict[k]));
+  const sourceChanged = changed.filter(k => clipSource(oldDict[k]) !== clipSource(newDict[k]));
+
+  // A removed clip that reappears with the same URL under a new title is a rename
+  const addedByUrl = new Map();
+  added.forEach(k => {
+    if (!addedByUrl.has(newDict[k].url)) addedByUrl.set(newDict[k].url, k);
+  });
+  const renamed = new Map();
+  removed.forEach(k => {
+    const newKey = addedByUrl.get(oldDict[k].url);
+    if (newKey !== undefined) {
+      renamed.set(k, newKey);
+      addedByUrl.delete(oldDict[k].url);
+    }
+  });
+  const renamedTo = new Set(renamed.values());
+  added = added.filter(k => !renamedTo.has(k));
+  removed = removed.filter(k => !renamed.has(k));
+
+  return { added, removed, renamed, changed, sourceChanged };
+}
+
+// Pick the clip that should play after a removed one, following the old order
+function nextSurvivingVideo(oldKeys, removedKey) {
+  const start = oldKeys.indexOf(removedKey);
+  for (let i = start + 1; i < oldKeys.length; i++) {
+    const key = oldKeys[i];
+    if (hasKey(videoDict, key) && !disabledVideos.has(key)) return key;
+  }
+  return null;
+}
+
+// Apply a new playlist to the live player without restarting playback
+function applyPlaylist(newDict, isPage) {
+  const oldKeys = videoKeys;
+  const isInitial = oldKeys.length === 0 && currentVideoKey === null;
+  const diff = diffPlaylists(videoDict, newDict);
+
+  videoDict = newDict;
+  videoKeys = Object.keys(newDict);
+
+  // Renamed clips keep their disabled state and, if playing, their position
+  diff.renamed.forEach((newKey, oldKey) => {
+    if (disabledVideos.delete(oldKey)) disabledVideos.add(newKey);
+    if (brokenVideos.has(oldKey)) {
+      brokenVideos.set(newKey, brokenVideos.get(oldKey));
+      brokenVideos.delete(oldKey);
+    }
+    if (currentVideoKey === oldKey) {
+      currentVideoKey = newKey;
+      videoTitleOverlay.textContent = newKey;
+    }
+  });
+  diff.removed.forEach(k => {
+    disabledVideos.delete(k);
+    brokenVideos.delete(k);
+  });
+
+  // Clips the prober could not read are skipped from the start
+  diff.added.concat(diff.changed).forEach(k => {
+    if (newDict[k].error) {
+      markBroken(k, newDict[k].error);
+    } else if (brokenVideos.delete(k)) {
+      disabledVideos.delete(k);
+    }
+  });
+
+  const activeVideos = getActiveVideos();
+  if (currentVideoKey === null) {
+    if (activeVideos.length > 0) {
+      loadVideo(activeVideos[0]);
+      // Set initial playing state
+      isPlaying = true;
+    }
+  } else if (diff.removed.includes(currentVideoKey)) {
+    const nextKey = nextSurvivingVideo(oldKeys, currentVideoKey) || activeVideos[0];
+    if (nextKey) {
+      loadVideo(nextKey);
+    } else {
+      currentVideoKey = null;
+      videoPlayer.pause();
+      videoPlayer.removeAttribute('src');
+      videoPlayer.load();
+      videoTitleOverlay.textContent = '';
+    }
+  } else if (diff.changed.includes(currentVideoKey) && disabledVideos.has(currentVideoKey)) {
+    loadNextVideo();
+  } else if (diff.sourceChanged.includes(currentVideoKey)) {
+    loadVideo(currentVideoKey);
+  } else if (diff.changed.includes(currentVideoKey)) {
+    // Metadata only: keep playing and refresh what is drawn from it
+    renderQualityMenu();
+    updateTrackingOverlay();
+  } else if (playlistEnded && (isLiveMode || awaitingPage)) {
+    // Continue with the first clip produced, or paged in, since it ran out
+    const nextKey = diff.added.find(k => !disabledVideos.has(k));
+    if (nextKey) loadVideo(nextKey);
+  }
+
+  awaitingPage = false;
+  if (!isInitial && !isPage && diff.added.length > 0) {
+    showUnifiedNotification(diff.added.length === 1 ?
+      "Clip added: " + diff.added[0] : diff.added.length + " clips added");
+  }
+
+  updateMuteButtonText();
+  updateSidebar();
+  scheduleUpcoming();
+  // Annotations may have been added or changed
+  scheduleEventMarkers();
+}
+
+// Opt-in service worker cache shared by playback, replays and downloads
+const CLIP_SW_URL = 'clip_sw.js';
+const CLIP_CACHE_PREFIX = 'video-stream-player-clips';
+let clipCacheBytes = 0;
+let lastClipCacheConfig = null;
+
+async function configureClipCache() {
+  if (!('serviceWorker' in navigator)) return;
+
+  const urls = videoKeys.flatMap(clipUrls);
+  const config = JSON.stringify([clipCacheBytes, urls]);
+  if (config === lastClipCacheConfig) return;
+  lastClipCacheConfig = config;
+
+  try {
+    if (!clipCacheBytes) {
+      // Opting out removes the worker and everything it stored
+      const registration = await navigator.serviceWorker.getRegistration();
+      if (registration) {
+        await registration.unregister();
+        const names = await caches.keys();
+        await Promise.all(names.filter(n => n.startsWith(CLIP_CACHE_PREFIX)).map(n => caches.delete(n)));
+      }
+      return;
+    }
+
+    await navigator.serviceWorker.register(CLIP_SW_URL);
+    const registration = await navigator.serviceWorker.ready;
+    registration.active.postMessage({
+      type: 'config',
+      urls: urls,
+      maxBytes: clipCacheBytes
+    });
+  } catch (error) {
+    console.warn('Clip cache unavailable:', error);
+  }
+}
+
+// Streamlit component protocol
+function sendToStreamlit(type, data) {
+  window.parent.postMessage(Object.assign({ isStreamlitMessage: true, type: type }, data), '*');
+}
+
+function setFrameHeight() {
+  sendToStreamlit('streamlit:setFrameHeight', { height: document.body.scrollHeight });
+}
+
+function setComponentValue(value) {
+  sendToStreamlit('streamlit:setComponentValue', { value: value, dataType: 'json' });
+}
+
+// Compact playlists, as produced by playlist_codec.encode_playlist. Entries
+// assemble their URL and fields only when read.
+const COMPACT_FORMAT_VERSION = 1;
+const CLIP_INDEX = Symbol('clipIndex');
+const COLUMN_TYPES = { u8: Uint8Array, u16: Uint16Array, u32: Uint32Array, f64: Float64Array };
+
+function base64Bytes(text) {
+  const binary = atob(text);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i);
+  return bytes;
+}
+
+function decodeColumn(column) {
+  return new COLUMN_TYPES[column.type](base64Bytes(column.data).buffer);
+}
+
+async function inflateJson(text) {
+  const stream = new Blob([base64Bytes(text)]).stream().pipeThrough(new DecompressionStream('deflate'));
+  return JSON.parse(await new Response(stream).text());
+}
+
+async function decodePlaylist(payload) {
+  if (payload.format !== 'compact') return payload;
+  if (payload.version !== COMPACT_FORMAT_VERSION) {
+    throw new Error('Unsupported playlist format version ' + payload.version);
+  }
+  if (payload.deflate) payload = await inflateJson(payload.deflate);
+
+  const prefix = decodeColumn(payload.prefix);
+  const query = decodeColumn(payload.query);
+  const numbers = Object.keys(payload.numbers).map(field => [field, decodeColumn(payload.numbers[field])]);
+  const values = Object.entries(payload.values);
+
+  function CompactClip(index) {
+    this[CLIP_INDEX] = index;
+  }
+  const clip = CompactClip.prototype;
+  Object.defineProperty(clip, 'url', {
+    get() {
+      const i = this[CLIP_INDEX];
+      return payload.prefixes[prefix[i]] + payload.names[i] + payload.queries[query[i]];
+    }
+  });
+  // Plain form, used when comparing playlists
+  clip.toJSON = function() {
+    const i = this[CLIP_INDEX];
+    const plain = { url: this.url };
+    numbers.forEach(([field, column]) => {
+      if (!Number.isNaN(column[i])) plain[field] = column[i];
+    });
+    values.forEach(([field, column]) => {
+      if (column[i] !== null) plain[field] = column[i];
+    });
+    return plain;
+  };
+  numbers.forEach(([field, column]) => {
+    Object.defineProperty(clip, field, {
+      get() {
+        const value = column[this[CLIP_INDEX]];
+        return Number.isNaN(value) ? undefined : value;
+      }
+    });
+  });
+  values.forEach(([field, column]) => {
+    Object.defineProperty(clip, field, {
+      get() {
+        const value = column[this[CLIP_INDEX]];
+        return value === null ? undefined : value;
+      }
+    });
+  });
+
+  const dict = {};
+  payload.keys.forEach((key, index) => {
+    dict[key] = new CompactClip(index);
+  });
+  return dict;
+}
+
+// Paged playlists: Python sends the first clips of a long playlist and
+// extends the window when the player asks, so the page size, not the
+// playlist length, decides how much is sent before the first frame
+// Request the next page when this few clips are left to play or scroll to
+const PAGE_REQUEST_MARGIN = 10;
+let playlistTotal = 0;
+let pageSize = 0;
+let requestedClips = 0;
+let awaitingPage = false;
+
+function hasMoreClips() {
+  return videoKeys.length < playlistTotal;
+}
+
+function requestMoreClips() {
+  const target = videoKeys.length + pageSize;
+  if (!pageSize || !hasMoreClips() || requestedClips >= target) return;
+  requestedClips = target;
+  setComponentValue({ type: 'load_more', loaded: target });
+}
+
+function requestMoreClipsIfNeeded(index) {
+  if (index >= videoKeys.length - PAGE_REQUEST_MARGIN) requestMoreClips();
+}
+
+// Streamlit sends the arguments on every rerun; only act when they change
+let lastPlaylistJson = null;
+// Playlists may decode asynchronously; only the latest one is applied
+let playlistGeneration = 0;
+
+window.addEventListener('message', (event) => {
+  if (!event.data || event.data.type !== 'streamlit:render') return;
+
+  const args = event.data.args;
+  isLiveMode = Boolean(args.live);
+  downloadConcurrency = Math.max(1, args.download_concurrency || 4);
+  if ((args.export_url || null) !== exportUrl) {
+    exportUrl = args.export_url || null;
+    checkExportJobs();
+  }
+  gatewayUrl = args.gateway_url || null;
+  clipCacheBytes = (args.clip_cache_mb || 0) * 1024 * 1024;
+  setReelMode(Boolean(args.reel));
+
+  const payload = args.videos || {};
+  pageSize = args.page_size || 0;
+  const playlistJson = JSON.stringify(payload);
+  if (playlistJson !== lastPlaylistJson) {
+    lastPlaylistJson = playlistJson;
+    const generation = ++playlistGeneration;
+    decodePlaylist(payload).then(async videos => {
+      // Known answers return at once; new codecs cost a few milliseconds
+      await queryDecodingSupport(videos);
+      if (generation !== playlistGeneration) return;
+      // A longer window of an unchanged playlist is a page, not new clips
+      const isPage = pageSize > 0 && args.total === playlistTotal;
+      playlistTotal = args.total || Object.keys(videos).length;
+      applyPlaylist(videos, isPage);
+      requestedClips = Math.min(requestedClips, videoKeys.length);
+      configureClipCache();
+    }).catch(error => {
+      console.error('Failed to decode playlist:', error);
+      showUnifiedNotification("Failed to load playlist");
+    });
+  } else {
+    playlistTotal = args.total || videoKeys.length;
+    configureClipCache();
+  }
+
+  setFrameHeight();
+});
+
+// Streamlit resize handling
+window.addEventListener('resize', function() {
+  window.setTimeout(setFrameHeight, 100);
+});
+
+sendToStreamlit('streamlit:componentReady', { apiVersion: 1 });
+setFrameHeight();
@@ -0,0 +1,1236 @@
+// Reel worker: joins clips into a single MP4 in the browser.
+//
+// Each clip's moov box is read first, then its samples are fetched with
+// Range requests one window at a time and written straight to the output,
+// so memory stays around two windows however long the reel is. Packets are
+// copied whenever the output can carry them: clips that share one encoding
+// are remuxed unchanged, and H.264 clips whose parameter sets differ are
+// joined in an avc3 track that carries them in-band. Only clips in another
+// codec or size, and audio that cannot be copied, go through WebCodecs.
+// Like the server's stream-copy cuts, every clip starts on the keyframe at
+// or before its start.
+//
+// The media data is written first and the moov box last; the mdat size is
+// patched into the header once known.
+//
+// Input message:  { clips: [{ name, url, start, end }], fileHandle, concurrency }
+// Output messages: { type: 'size', bytes }, { type: 'bytes', bytes },
+//                  { type: 'file' },
+//                  { type: 'done', added, skipped, reencoded, silent, blob },
+//                  { type: 'error', message }
+
+const RETRIES = 3;
+const RETRY_DELAY_MS = 500;
+const PROGRESS_INTERVAL_MS = 200;
+// Merge buffered parts of an in-memory video so the browser can page them out
+const BLOB_COMPACT_BYTES = 16 * 1024 * 1024;
+// Bytes requested from the start of a clip; enough for ftyp and most moov boxes
+const HEAD_BYTES = 64 * 1024;
+// Top-level boxes skipped while looking for moov before giving up
+const MAX_BOX_HOPS = 16;
+// Largest moov box read, so a corrupt size cannot trigger a huge download
+const MAX_MOOV_BYTES = 64 * 1024 * 1024;
+// Sample bytes fetched per window; one window is written while the next downloads
+const WINDOW_BYTES = 8 * 1024 * 1024;
+// A window whose tracks lie further apart than this many times its size is
+// fetched one track at a time
+const MAX_SPAN_WASTE = 2;
+// Seconds of one track written before switching to the other
+const CHUNK_SECONDS = 1;
+// Frames queued in a decoder or encoder before demuxing waits
+const CODEC_QUEUE_SIZE = 16;
+const CODEC_POLL_MS = 50;
+// Keyframe interval of re-encoded video, in seconds
+const KEYFRAME_INTERVAL = 2;
+const DEFAULT_VIDEO_BITRATE = 8000000;
+const AUDIO_BITRATE = 128000;
+// H.264 encoders tried for re-encoded video, most capable first
+const H264_CODECS = ['avc1.640033', 'avc1.4d0033', 'avc1.420033'];
+const MOVIE_TIMESCALE = 1000;
+// Used when clips' video timescales differ
+const VIDEO_TIMESCALE = 90000;
+const AAC_FRAME_SAMPLES = 1024;
+// Encoded silent AAC-LC frames by channel count, filling in for clips
+// without usable audio
+const SILENT_AAC_FRAMES = {
+  1: new Uint8Array([0x00, 0xC8, 0x00, 0x80, 0x23, 0x80]),
+  2: new Uint8Array([0x21, 0x00, 0x49, 0x90, 0x02, 0x19, 0x00, 0x23, 0x80])
+};
+const VISUAL_SAMPLE_ENTRY_SIZE = 78;
+const AUDIO_SAMPLE_ENTRY_SIZE = 28;
+const MAX_32 = 0xFFFFFFFF;
+
+function sleep(ms) {
+  return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+// Progress is batched so large exports don't flood the main thread
+let pendingBytes = 0;
+let lastReport = 0;
+
+function reportBytes(bytes, force) {
+  pendingBytes += bytes;
+  const now = performance.now();
+  if (pendingBytes && (force || now - lastReport >= PROGRESS_INTERVAL_MS)) {
+    self.postMessage({ type: 'bytes', bytes: pendingBytes });
+    pendingBytes = 0;
+    lastReport = now;
+  }
+}
+
+// GET bytes start..end (inclusive) of a clip, retrying network errors and 5xx/429.
+// Returns the bytes and the clip's total size, or null when not stated.
+async function fetchRange(url, start, end) {
+  for (let attempt = 0; ; attempt++) {
+    try {
+      const response = await fetch(url, { headers: { Range: 'bytes=' + start + '-' + end } });
+      if (!response.ok) {
+        const error = new Error('Failed to fetch ' + url + ': ' + response.status);
+        error.retryable = response.status >= 500 || response.status === 429;
+        throw error;
+      }
+      if (response.status !== 206) {
+        response.body.cancel().catch(() => {});
+        throw new Error('Server cannot send parts of ' + url);
+      }
+      const total = Number((response.headers.get('Content-Range') || '').split('/')[1]);
+      const bytes = new Uint8Array(await response.arrayBuffer());
+      if (bytes.length < end - start + 1 && (!total || end < total)) {
+        const error = new Error('Short read from ' + url);
+        error.retryable = true;
+        throw error;
+      }
+      return { bytes: bytes, total: total || null };
+    } catch (error) {
+      const retryable = error.retryable !== undefined ? error.retryable : error instanceof TypeError;
+      if (!retryable || attempt >= RETRIES) throw error;
+      await sleep(RETRY_DELAY_MS * Math.pow(2, attempt));
+    }
+  }
+}
+
+async function openSink(fileHandle) {
+  if (fileHandle) {
+    const writable = await fileHandle.createWritable();
+    return {
+      write: chunk => writable.write(chunk),
+      patch: (position, chunk) => writable.write({ type: 'write', position: position, data: chunk }),
+      close: async () => { await writable.close(); return null; },
+      abort: () => writable.abort()
+    };
+  }
+
+  // The first chunk is kept apart so the header can still be patched
+  let head = null;
+  let video = new Blob([]);
+  let parts = [];
+  let partBytes = 0;
+  return {
+    write: async chunk => {
+      if (head === null) {
+        head = chunk;
+        return;
+      }
+      parts.push(chunk);
+      partBytes += chunk.byteLength;
+      if (partBytes >= BLOB_COMPACT_BYTES) {
+        video = new Blob([video, ...parts]);
+        parts = [];
+        partBytes = 0;
+      }
+    },
+    patch: async (position, chunk) => {
+      head.set(chunk, position);
+    },
+    close: async () => new Blob([head, video, ...parts], { type: 'video/mp4' }),
+    abort: async () => {}
+  };
+}
+
+// Boxes
+
+function dataView(bytes) {
+  return new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+}
+
+function fourcc(bytes, offset) {
+  return String.fromCharCode(bytes[offset], bytes[offset + 1], bytes[offset + 2], bytes[offset + 3]);
+}
+
+// Header of the box at `offset`, or null when it is not in `bytes`. A box
+// whose size is zero runs to `end`.
+function readBox(bytes, offset, end) {
+  if (offset < 0 || offset + 8 > bytes.length) return null;
+  const view = dataView(bytes);
+  let size = view.getUint32(offset);
+  let headerSize = 8;
+  if (size === 1) {
+    if (offset + 16 > bytes.length) return null;
+    size = Number(view.getBigUint64(offset + 8));
+    headerSize = 16;
+  } else if (size === 0) {
+    size = end - offset;
+  }
+  const type = fourcc(bytes, offset + 4);
+  if (size < headerSize) throw new Error('Malformed ' + type + ' box');
+  return { type: type, offset: offset, size: size, headerSize: headerSize };
+}
+
+function childBoxes(bytes, start, end) {
+  const boxes = [];
+  for (let offset = start; offset + 8 <= end;) {
+    const box = readBox(bytes, offset, end);
+    if (box === null || offset + box.size > end) break;
+    boxes.push(box);
+    offset += box.size;
+  }
+  return boxes;
+}
+
+// Follow a path of box types below `parent`
+function findBox(bytes, parent, path) {
+  let box = parent;
+  for (const type of path) {
+    box = childBoxes(bytes, box.offset + box.headerSize, box.offset + box.size).find(b => b.type === type);
+    if (!box) return null;
+  }
+  return box;
+}
+
+function payload(bytes, box) {
+  return bytes.subarray(box.offset + box.headerSize, box.offset + box.size);
+}
+
+// Read the moov box of a clip, fetching further ranges when it is not in the head
+async function readMovie(url) {
+  let { bytes, total } = await fetchRange(url, 0, HEAD_BYTES - 1);
+  let dataStart = 0;
+  let offset = 0;
+  for (let hop = 0; hop < MAX_BOX_HOPS; hop++) {
+    if (total !== null && offset >= total) break;
+    const box = readBox(bytes, offset - dataStart, total === null ? Infinity : total - dataStart);
+    if (box === null) {
+      // Header not in the buffer: fetch the next box header
+      bytes = (await fetchRange(url, offset, offset + 15)).bytes;
+      dataStart = offset;
+      continue;
+    }
+    if (box.type === 'moov') {
+      if (box.size > MAX_MOOV_BYTES) throw new Error('moov box too large');
+      if (box.offset + box.size > bytes.length) {
+        bytes = (await fetchRange(url, offset, offset + box.size - 1)).bytes;
+        return bytes.subarray(0, box.size);
+      }
+      return bytes.subarray(box.offset, box.offset + box.size);
+    }
+    if (box.size === Infinity) break;
+    offset += box.size;
+  }
+  throw new Error('No moov box found');
+}
+
+// MPEG-4 descriptor header: [tag, body offset, body size]
+function readDescriptor(bytes, offset) {
+  const tag = bytes[offset++];
+  let size = 0;
+  for (let i = 0; i < 4; i++) {
+    const byte = bytes[offset++];
+    size = (size << 7) | (byte & 0x7F);
+    if (!(byte & 0x80)) break;
+  }
+  return [tag, offset, size];
+}
+
+// AudioSpecificConfig from an esds box payload
+function audioSpecificConfig(esds) {
+  let [tag, offset] = readDescriptor(esds, 4);
+  if (tag !== 0x03) return null;
+  const flags = esds[offset + 2];
+  offset += 3;
+  if (flags & 0x80) offset += 2;
+  if (flags & 0x40) offset += 1 + esds[offset];
+  if (flags & 0x20) offset += 2;
+  [tag, offset] = readDescriptor(esds, offset);
+  if (tag !== 0x04) return null;
+  offset += 13;
+  if (offset >= esds.length) return null;
+  let size;
+  [tag, offset, size] = readDescriptor(esds, offset);
+  return tag === 0x05 ? esds.slice(offset, offset + size) : null;
+}
+
+function hex(bytes) {
+  return Array.from(bytes, byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+function hevcCodec(format, hvcC) {
+  const profileSpace = hvcC[1] >> 6;
+  const tier = hvcC[1] & 0x20 ? 'H' : 'L';
+  const profile = hvcC[1] & 0x1F;
+  let compatibility = dataView(hvcC).getUint32(2);
+  // The compatibility flags are written in reverse bit order
+  let reversed = 0;
+  for (let i = 0; i < 32; i++) {
+    reversed = (reversed << 1) | (compatibility & 1);
+    compatibility >>>= 1;
+  }
+  const constraints = Array.from(hvcC.subarray(6, 12));
+  while (constraints.length && !constraints[constraints.length - 1]) constraints.pop();
+
+  const parts = [format, (profileSpace ? 'ABC'[profileSpace - 1] : '') + profile, (reversed >>> 0).toString(16).toUpperCase()];
+  parts.push(tier + hvcC[12]);
+  constraints.forEach(byte => parts.push(byte.toString(16).toUpperCase()));
+  return parts.join('.');
+}
+
+// Format, size or sample rate, decoder configuration and codec string of a sample entry
+function parseSampleEntry(bytes, entry) {
+  const body = entry.offset + entry.headerSize;
+  const end = entry.offset + entry.size;
+  const info = { format: entry.type, entry: bytes.slice(entry.offset, end), config: null, codec: entry.type };
+  const view = dataView(bytes);
+
+  if (['avc1', 'avc3', 'hvc1', 'hev1'].includes(entry.type)) {
+    info.width = view.getUint16(body + 24);
+    info.height = view.getUint16(body + 26);
+    for (const box of childBoxes(bytes, body + VISUAL_SAMPLE_ENTRY_SIZE, end)) {
+      if (box.type === 'avcC') {
+        info.config = payload(bytes, box).slice();
+        info.codec = entry.type + '.' + hex(info.config.subarray(1, 4));
+        info.lengthSize = (info.config[4] & 0x03) + 1;
+      } else if (box.type === 'hvcC') {
+        info.config = payload(bytes, box).slice();
+        info.codec = hevcCodec(entry.type, info.config);
+      }
+    }
+  } else if (entry.type === 'mp4a') {
+    info.channels = view.getUint16(body + 16);
+    info.sampleRate = view.getUint32(body + 24) >>> 16;
+    // QuickTime sound descriptions version 1 carry four more fields
+    const extra = view.getUint16(body + 8) === 1 ? 16 : 0;
+    for (const box of childBoxes(bytes, body + AUDIO_SAMPLE_ENTRY_SIZE + extra, end)) {
+      if (box.type === 'esds') info.config = audioSpecificConfig(payload(bytes, box));
+    }
+    if (info.config) {
+      let objectType = info.config[0] >> 3;
+      if (objectType === 31) objectType = 32 + (((info.config[0] & 0x07) << 3) | (info.config[1] >> 5));
+      info.codec = 'mp4a.40.' + objectType;
+    }
+  }
+  // Clips with equal keys can share one sample description
+  info.key = [info.format, info.width, info.height, info.channels, info.sampleRate,
+    info.config ? hex(info.config) : hex(info.entry)].join(':');
+  return info;
+}
+
+function readTable(bytes, box, fieldsPerEntry) {
+  const body = box.offset + box.headerSize;
+  const view = dataView(bytes);
+  const count = view.getUint32(body + 4);
+  return { view: view, start: body + 8, count: count, stride: fieldsPerEntry * 4 };
+}
+
+function parseTrack(bytes, trak) {
+  const hdlr = findBox(bytes, trak, ['mdia', 'hdlr']);
+  const mdhd = findBox(bytes, trak, ['mdia', 'mdhd']);
+  const stbl = findBox(bytes, trak, ['mdia', 'minf', 'stbl']);
+  if (!hdlr || !mdhd || !stbl) return null;
+  const handler = fourcc(bytes, hdlr.offset + hdlr.headerSize + 8);
+  if (handler !== 'vide' && handler !== 'soun') return null;
+
+  const view = dataView(bytes);
+  const mdhdBody = mdhd.offset + mdhd.headerSize;
+  const timescale = view.getUint32(mdhdBody + (bytes[mdhdBody] === 1 ? 20 : 12));
+
+  const tables = {};
+  childBoxes(bytes, stbl.offset + stbl.headerSize, stbl.offset + stbl.size).forEach(box => { tables[box.type] = box; });
+  const chunkBox = tables.stco || tables.co64;
+  if (!tables.stsd || !tables.stts || !tables.stsc || !tables.stsz || !chunkBox) {
+    throw new Error('Incomplete sample tables');
+  }
+
+  const stsdBody = tables.stsd.offset + tables.stsd.headerSize;
+  if (view.getUint32(stsdBody + 4) !== 1) throw new Error('Tracks with several sample descriptions are not supported');
+  const track = parseSampleEntry(bytes, readBox(bytes, stsdBody + 8, tables.stsd.offset + tables.stsd.size));
+  track.handler = handler;
+  track.timescale = timescale;
+
+  const stszBody = tables.stsz.offset + tables.stsz.headerSize;
+  const uniformSize = view.getUint32(stszBody + 4);
+  const count = view.getUint32(stszBody + 8);
+  if (!count) throw new Error('Fragmented MP4 is not supported');
+  const sizes = new Uint32Array(count);
+  for (let i = 0; i < count; i++) sizes[i] = uniformSize || view.getUint32(stszBody + 12 + i * 4);
+
+  const chunks = readTable(bytes, chunkBox, chunkBox.type === 'co64' ? 2 : 1);
+  const chunkOffset = chunk => chunkBox.type === 'co64'
+    ? Number(view.getBigUint64(chunks.start + chunk * 8))
+    : view.getUint32(chunks.start + chunk * 4);
+
+  const offsets = new Float64Array(count);
+  const stsc = readTable(bytes, tables.stsc, 3);
+  let sample = 0;
+  for (let run = 0; run < stsc.count && sample < count; run++) {
+    const entry = stsc.start + run * stsc.stride;
+    const firstChunk = view.getUint32(entry) - 1;
+    const perChunk = view.getUint32(entry + 4);
+    const lastChunk = run + 1 < stsc.count ? view.getUint32(entry + stsc.stride) - 1 : chunks.count;
+    for (let chunk = firstChunk; chunk < lastChunk && sample < count; chunk++) {
+      let offset = chunkOffset(chunk);
+      for (let i = 0; i < perChunk && sample < count; i++) {
+        offsets[sample] = offset;
+        offset += sizes[sample++];
+      }
+    }
+  }
+
+  const dts = new Float64Array(count);
+  const stts = readTable(bytes, tables.stts, 2);
+  let time = 0;
+  sample = 0;
+  for (let run = 0; run < stts.count; run++) {
+    const entry = stts.start + run * stts.stride;
+    const runLength = view.getUint32(entry);
+    const delta = view.getUint32(entry + 4);
+    for (let i = 0; i < runLength && sample < count; i++) {
+      dts[sample++] = time;
+      time += delta;
+    }
+  }
+
+  const cts = new Int32Array(count);
+  if (tables.ctts) {
+    const ctts = readTable(bytes, tables.ctts, 2);
+    const signed = bytes[tables.ctts.offset + tables.ctts.headerSize] === 1;
+    sample = 0;
+    for (let run = 0; run < ctts.count; run++) {
+      const entry = ctts.start + run * ctts.stride;
+      const runLength = view.getUint32(entry);
+      const offset = signed ? view.getInt32(entry + 4) : view.getUint32(entry + 4);
+      for (let i = 0; i < runLength && sample < count; i++) cts[sample++] = offset;
+    }
+  }
+
+  // Without stss every sample is a sync sample
+  let sync = null;
+  if (tables.stss) {
+    sync = new Uint8Array(count);
+    const stss = readTable(bytes, tables.stss, 1);
+    for (let i = 0; i < stss.count; i++) {
+      const number = view.getUint32(stss.start + i * 4);
+      if (number >= 1 && number <= count) sync[number - 1] = 1;
+    }
+  }
+
+  track.samples = { count: count, offsets: offsets, sizes: sizes, dts: dts, cts: cts, sync: sync, end: time };
+  return track;
+}
+
+function parseMovie(moov) {
+  const root = readBox(moov, 0, moov.length);
+  const tracks = childBoxes(moov, root.headerSize, root.size)
+    .filter(box => box.type === 'trak')
+    .map(trak => parseTrack(moov, trak))
+    .filter(track => track !== null);
+  return {
+    video: tracks.find(track => track.handler === 'vide') || null,
+    audio: tracks.find(track => track.handler === 'soun') || null
+  };
+}
+
+// First index whose decode time is at or after `time` seconds
+function lowerBound(track, time) {
+  const target = time * track.timescale;
+  const dts = track.samples.dts;
+  let low = 0;
+  let high = track.samples.count;
+  while (low < high) {
+    const mid = (low + high) >> 1;
+    if (dts[mid] < target) low = mid + 1;
+    else high = mid;
+  }
+  return low;
+}
+
+function isSync(track, index) {
+  return !track.samples.sync || track.samples.sync[index] === 1;
+}
+
+function sampleDuration(track, index) {
+  const samples = track.samples;
+  return (index + 1 < samples.count ? samples.dts[index + 1] : samples.end) - samples.dts[index];
+}
+
+// Pick the samples of a clip's window: video from the keyframe at or before
+// start, and the audio that plays alongside it
+function planClip(clip, movie) {
+  const video = movie.video;
+  if (!video) throw new Error('No video track');
+  const samples = video.samples;
+
+  let first = 0;
+  if (clip.start) {
+    // Last sample decoded at or before start
+    first = lowerBound(video, clip.start);
+    if (first >= samples.count || samples.dts[first] > clip.start * video.timescale) first = Math.max(0, first - 1);
+    while (first > 0 && !isSync(video, first)) first--;
+  }
+  const last = clip.end === null || clip.end === undefined ? samples.count : lowerBound(video, clip.end);
+  if (last <= first) throw new Error('Window holds no frames');
+
+  const plan = {
+    clip: clip,
+    video: video,
+    audio: movie.audio,
+    videoRange: [first, last],
+    audioRange: [0, 0],
+    spanStart: samples.dts[first] / video.timescale,
+    spanEnd: (last < samples.count ? samples.dts[last] : samples.end) / video.timescale
+  };
+  if (plan.audio) {
+    plan.audioRange = [lowerBound(plan.audio, plan.spanStart), lowerBound(plan.audio, plan.spanEnd)];
+  }
+  return plan;
+}
+
+function rangeBytes(track, range) {
+  let bytes = 0;
+  for (let i = range[0]; i < range[1]; i++) bytes += track.samples.sizes[i];
+  return bytes;
+}
+
+function isAvc(track) {
+  return (track.format === 'avc1' || track.format === 'avc3') && track.config !== null;
+}
+
+function isAacLc(track) {
+  return track.codec === 'mp4a.40.2' && track.channels in SILENT_AAC_FRAMES;
+}
+
+function videoDecoderConfig(track) {
+  const config = { codec: track.codec, codedWidth: track.width, codedHeight: track.height };
+  if (track.config) config.description = track.config;
+  return config;
+}
+
+async function isSupported(codecClass, config) {
+  if (!(codecClass in self)) return false;
+  try {
+    return (await self[codecClass].isConfigSupported(config)).supported;
+  } catch (error) {
+    return false;
+  }
+}
+
+async function videoEncoderConfig(width, height, bitrate, framerate) {
+  for (const codec of H264_CODECS) {
+    const config = { codec: codec, width: width, height: height, bitrate: bitrate, framerate: framerate, avc: { format: 'avc' } };
+    if (await isSupported('VideoEncoder', config)) return config;
+  }
+  return null;
+}
+
+// Decide how every clip reaches the output. Video is copied when all clips
+// share one encoding; otherwise the output is H.264 and clips in another
+// codec or size are re-encoded. Audio that differs from the first clip's is
+// re-encoded where WebCodecs can, and replaced by silence where not.
+// Returns the output description; clips that cannot be converted are
+// removed from `plans` and counted as skipped.
+async function planOutput(plans) {
+  const output = { skipped: 0, video: null, audio: null };
+  const reference = plans[0].video;
+
+  if (new Set(plans.map(plan => plan.video.key)).size === 1) {
+    plans.forEach(plan => { plan.videoMode = 'copy'; });
+    output.video = { entry: reference.entry, width: reference.width, height: reference.height };
+  } else {
+    const base = plans.find(plan => isAvc(plan.video)) || plans[0];
+    // Encoders want even dimensions
+    const width = base.video.width & ~1;
+    const height = base.video.height & ~1;
+    plans.forEach(plan => {
+      const video = plan.video;
+      const copyable = isAvc(video) && video.width === width && video.height === height && video.lengthSize === 4;
+      plan.videoMode = copyable ? 'copy' : 'encode';
+    });
+
+    let encoderConfig = null;
+    if (plans.some(plan => plan.videoMode === 'encode')) {
+      const seconds = base.spanEnd - base.spanStart;
+      const bitrate = seconds > 0 ? Math.round(rangeBytes(base.video, base.videoRange) * 8 / seconds) : DEFAULT_VIDEO_BITRATE;
+      const frames = base.videoRange[1] - base.videoRange[0];
+      encoderConfig = await videoEncoderConfig(width, height, bitrate || DEFAULT_VIDEO_BITRATE, seconds > 0 ? frames / seconds : 25);
+    }
+    for (let i = plans.length - 1; i >= 0; i--) {
+      if (plans[i].videoMode !== 'encode') continue;
+      if (!encoderConfig || !(await isSupported('VideoDecoder', videoDecoderConfig(plans[i].video)))) {
+        console.warn('Skipping ' + plans[i].clip.name + ': ' + plans[i].video.codec + ' cannot be re-encoded in this browser');
+        plans.splice(i, 1);
+        output.skipped++;
+      }
+    }
+    if (!plans.length) return output;
+
+    const copied = plans.filter(plan => plan.videoMode === 'copy');
+    const configs = new Set(copied.map(plan => hex(plan.video.config)));
+    output.video = {
+      entry: null,
+      width: width,
+      height: height,
+      encoderConfig: encoderConfig,
+      // Parameter sets travel with the keyframes when clips disagree on them
+      inBand: configs.size > 1 || (copied.length > 0 && copied.length < plans.length),
+      avcC: null
+    };
+  }
+
+  const scales = new Set(plans.map(plan => plan.video.timescale));
+  const scale = scales.values().next().value;
+  const encoding = plans.some(plan => plan.videoMode === 'encode');
+  output.video.timescale = scales.size === 1 && !(encoding && scale < MOVIE_TIMESCALE) ? scale : VIDEO_TIMESCALE;
+
+  const withAudio = plans.find(plan => plan.audio);
+  if (!withAudio) return output;
+  const audio = withAudio.audio;
+  const encoderConfig = { codec: 'mp4a.40.2', sampleRate: audio.sampleRate, numberOfChannels: audio.channels, bitrate: AUDIO_BITRATE };
+  const canEncode = audio.codec === 'mp4a.40.2' && await isSupported('AudioEncoder', encoderConfig);
+  for (const plan of plans) {
+    if (plan.audio && plan.audio.key === audio.key) {
+      plan.audioMode = 'copy';
+    } else if (plan.audio && canEncode && plan.audio.sampleRate === audio.sampleRate && plan.audio.channels === audio.channels &&
+               plan.audio.codec.startsWith('mp4a.40.') &&
+               await isSupported('AudioDecoder', audioDecoderConfig(plan.audio))) {
+      plan.audioMode = 'encode';
+    } else {
+      plan.audioMode = 'silence';
+    }
+  }
+
+  if (!isAacLc(audio) && plans.some(plan => plan.audioMode === 'silence')) {
+    // Gaps can only be filled in AAC-LC; leave the sound out rather than drift
+    console.warn('Clips without matching audio cannot be joined to ' + audio.codec + ' audio; the video will be silent');
+    plans.forEach(plan => { plan.audioMode = null; });
+    return output;
+  }
+
+  output.audio = {
+    entry: audio.entry,
+    timescale: audio.timescale,
+    encoderConfig: canEncode ? encoderConfig : null,
+    silence: isAacLc(audio) ? SILENT_AAC_FRAMES[audio.channels] : null,
+    // Length of an AAC frame in the track's timescale
+    frameTicks: audio.sampleRate ? Math.round(AAC_FRAME_SAMPLES * audio.timescale / audio.sampleRate) : 0
+  };
+  return output;
+}
+
+function audioDecoderConfig(track) {
+  return { codec: track.codec, sampleRate: track.sampleRate, numberOfChannels: track.channels, description: track.config };
+}
+
+// Output
+
+function concatBytes(parts) {
+  const out = new Uint8Array(parts.reduce((total, part) => total + part.length, 0));
+  let offset = 0;
+  for (const part of parts) {
+    out.set(part, offset);
+    offset += part.length;
+  }
+  return out;
+}
+
+function uint(size, value) {
+  const bytes = new Uint8Array(size);
+  const view = dataView(bytes);
+  if (size === 8) view.setBigUint64(0, BigInt(value));
+  else if (size === 4) view.setUint32(0, value);
+  else if (size === 2) view.setUint16(0, value);
+  else bytes[0] = value;
+  return bytes;
+}
+
+function ascii(text) {
+  return Uint8Array.from(text, char => char.charCodeAt(0));
+}
+
+function box(type, ...parts) {
+  const body = concatBytes(parts);
+  return concatBytes([uint(4, body.length + 8), ascii(type), body]);
+}
+
+function fullBox(type, version, flags, ...parts) {
+  return box(type, uint(4, (version << 24) | flags), ...parts);
+}
+
+// Big-endian table of 32-bit fields
+function table(rows, fields) {
+  const bytes = new Uint8Array(rows.length * fields * 4);
+  const view = dataView(bytes);
+  rows.forEach((row, i) => {
+    for (let j = 0; j < fields; j++) {
+      const value = fields === 1 ? row : row[j];
+      if (value < 0) view.setInt32((i * fields + j) * 4, value);
+      else view.setUint32((i * fields + j) * 4, value);
+    }
+  });
+  return bytes;
+}
+
+// Consecutive equal values as [count, value] pairs
+function runs(values) {
+  const result = [];
+  for (const value of values) {
+    const last = result[result.length - 1];
+    if (last && last[1] === value) last[0]++;
+    else result.push([1, value]);
+  }
+  return result;
+}
+
+const MATRIX = table([0x00010000, 0, 0, 0, 0x00010000, 0, 0, 0, 0x40000000], 1);
+
+function createTrack(id, handler, timescale) {
+  return {
+    id: id,
+    handler: handler,
+    timescale: timescale,
+    sizes: [],
+    dts: [],
+    cts: [],
+    syncs: [],
+    chunkOffsets: [],
+    chunkCounts: [],
+    chunkStart: 0,
+    end: 0
+  };
+}
+
+async function writeSample(mux, track, data, dts, cts, sync, duration) {
+  const last = track.dts.length ? track.dts[track.dts.length - 1] : -1;
+  if (dts <= last) {
+    // Rounding may collide decode times; keep the presentation time
+    cts += dts - (last + 1);
+    dts = last + 1;
+  }
+  if (mux.chunkTrack !== track || dts - track.chunkStart >= CHUNK_SECONDS * track.timescale) {
+    track.chunkOffsets.push(mux.offset);
+    track.chunkCounts.push(0);
+    track.chunkStart = dts;
+    mux.chunkTrack = track;
+  }
+  track.chunkCounts[track.chunkCounts.length - 1]++;
+  track.sizes.push(data.length);
+  track.dts.push(dts);
+  track.cts.push(cts);
+  if (sync) track.syncs.push(track.sizes.length);
+  track.end = Math.max(track.end, dts + duration);
+
+  await mux.sink.write(data);
+  mux.offset += data.length;
+}
+
+function timeFields(version, value) {
+  return uint(version === 1 ? 8 : 4, value);
+}
+
+function sampleTable(track, entry) {
+  const count = track.sizes.length;
+  const durations = track.dts.map((dts, i) => (i + 1 < count ? track.dts[i + 1] : Math.max(track.end, dts + 1)) - dts);
+  const boxes = [
+    fullBox('stsd', 0, 0, uint(4, 1), entry),
+    fullBox('stts', 0, 0, uint(4, runs(durations).length), table(runs(durations), 2))
+  ];
+  if (track.cts.some(offset => offset !== 0)) {
+    const offsets = runs(track.cts);
+    boxes.push(fullBox('ctts', track.cts.some(offset => offset < 0) ? 1 : 0, 0, uint(4, offsets.length), table(offsets, 2)));
+  }
+  if (track.syncs.length < count) {
+    boxes.push(fullBox('stss', 0, 0, uint(4, track.syncs.length), table(track.syncs, 1)));
+  }
+
+  const chunkRuns = [];
+  track.chunkCounts.forEach((samples, i) => {
+    const last = chunkRuns[chunkRuns.length - 1];
+    if (!last || last[1] !== samples) chunkRuns.push([i + 1, samples, 1]);
+  });
+  boxes.push(fullBox('stsc', 0, 0, uint(4, chunkRuns.length), table(chunkRuns, 3)));
+  boxes.push(fullBox('stsz', 0, 0, uint(4, 0), uint(4, count), table(track.sizes, 1)));
+  if (track.chunkOffsets.some(offset => offset > MAX_32)) {
+    boxes.push(fullBox('co64', 0, 0, uint(4, track.chunkOffsets.length), concatBytes(track.chunkOffsets.map(offset => uint(8, offset)))));
+  } else {
+    boxes.push(fullBox('stco', 0, 0, uint(4, track.chunkOffsets.length), table(track.chunkOffsets, 1)));
+  }
+  return box('stbl', ...boxes);
+}
+
+function trackBox(track, entry, width, height) {
+  const video = track.handler === 'vide';
+  const duration = track.dts.length ? Math.max(track.end, track.dts[track.dts.length - 1] + 1) : 0;
+  const movieDuration = Math.round(duration * MOVIE_TIMESCALE / track.timescale);
+  const version = Math.max(duration, movieDuration) > MAX_32 ? 1 : 0;
+
+  const tkhd = fullBox('tkhd', version, 0x3,
+    timeFields(version, 0), timeFields(version, 0), uint(4, track.id), uint(4, 0), timeFields(version, movieDuration),
+    new Uint8Array(8), uint(2, 0), uint(2, 0), uint(2, video ? 0 : 0x0100), uint(2, 0), MATRIX,
+    uint(4, video ? width * 0x10000 : 0), uint(4, video ? height * 0x10000 : 0));
+
+  const boxes = [tkhd];
+  if (track.cts.length && track.cts[0] > 0) {
+    // Start presentation at the first frame rather than at decode time zero
+    const elst = fullBox('elst', 0, 0, uint(4, 1), uint(4, movieDuration), uint(4, track.cts[0]), uint(2, 1), uint(2, 0));
+    boxes.push(box('edts', elst));
+  }
+
+  const mdhd = fullBox('mdhd', version, 0,
+    timeFields(version, 0), timeFields(version, 0), uint(4, track.timescale), timeFields(version, duration),
+    uint(2, 0x55C4), uint(2, 0));
+  const hdlr = fullBox('hdlr', 0, 0, uint(4, 0), ascii(track.handler), new Uint8Array(12),
+    ascii(video ? 'VideoHandler\0' : 'SoundHandler\0'));
+  const header = video ? fullBox('vmhd', 0, 1, new Uint8Array(8)) : fullBox('smhd', 0, 0, new Uint8Array(4));
+  const dinf = box('dinf', fullBox('dref', 0, 0, uint(4, 1), fullBox('url ', 0, 1)));
+  boxes.push(box('mdia', mdhd, hdlr, box('minf', header, dinf, sampleTable(track, entry))));
+  return box('trak', ...boxes);
+}
+
+function movieBox(tracks) {
+  const duration = Math.max(...tracks.map(({ track }) => Math.round(track.end * MOVIE_TIMESCALE / track.timescale)));
+  const version = duration > MAX_32 ? 1 : 0;
+  const mvhd = fullBox('mvhd', version, 0,
+    timeFields(version, 0), timeFields(version, 0), uint(4, MOVIE_TIMESCALE), timeFields(version, duration),
+    uint(4, 0x00010000), uint(2, 0x0100), new Uint8Array(10), MATRIX, new Uint8Array(24), uint(4, tracks.length + 1));
+  return box('moov', mvhd, ...tracks.map(({ track, entry, width, height }) => trackBox(track, entry, width, height)));
+}
+
+// Sample entry of an H.264 track
+function avcSampleEntry(format, width, height, avcC) {
+  const fields = new Uint8Array(VISUAL_SAMPLE_ENTRY_SIZE);
+  const view = dataView(fields);
+  view.setUint16(6, 1);
+  view.setUint16(24, width);
+  view.setUint16(26, height);
+  view.setUint32(28, 0x00480000);
+  view.setUint32(32, 0x00480000);
+  view.setUint16(40, 1);
+  view.setUint16(74, 0x18);
+  view.setInt16(76, -1);
+  return box(format, fields, box('avcC', avcC));
+}
+
+// SPS and PPS units of an avcC record, each behind a 4-byte length
+function parameterSets(avcC) {
+  const units = [];
+  let offset = 5;
+  for (const mask of [0x1F, 0xFF]) {
+    const count = avcC[offset++] & mask;
+    for (let i = 0; i < count; i++) {
+      const length = (avcC[offset] << 8) | avcC[offset + 1];
+      units.push(uint(4, length), avcC.subarray(offset + 2, offset + 2 + length));
+      offset += 2 + length;
+    }
+  }
+  return concatBytes(units);
+}
+
+// Clips
+
+// Split a clip's samples into windows of about WINDOW_BYTES, in decode order
+function* sampleWindows(plan) {
+  const video = plan.video;
+  const audio = plan.audioMode ? plan.audio : null;
+  let [i, iEnd] = plan.videoRange;
+  let [j, jEnd] = audio ? plan.audioRange : [0, 0];
+  while (i < iEnd || j < jEnd) {
+    const window = { video: [i, i], audio: [j, j], bytes: 0 };
+    while ((i < iEnd || j < jEnd) && window.bytes < WINDOW_BYTES) {
+      const videoNext = j >= jEnd ||
+        (i < iEnd && video.samples.dts[i] / video.timescale <= audio.samples.dts[j] / audio.timescale);
+      if (videoNext) {
+        window.bytes += video.samples.sizes[i++];
+      } else {
+        window.bytes += audio.samples.sizes[j++];
+      }
+    }
+    window.video[1] = i;
+    window.audio[1] = j;
+    yield window;
+  }
+}
+
+function byteSpan(track, range) {
+  if (range[0] >= range[1]) return null;
+  let start = Infinity;
+  let end = 0;
+  for (let i = range[0]; i < range[1]; i++) {
+    start = Math.min(start, track.samples.offsets[i]);
+    end = Math.max(end, track.samples.offsets[i] + track.samples.sizes[i]);
+  }
+  return [start, end];
+}
+
+// Fetch the bytes of a window's samples, in one request when the tracks are interleaved
+async function fetchWindow(plan, window) {
+  let spans = [byteSpan(plan.video, window.video)];
+  if (window.audio[0] < window.audio[1]) spans.push(byteSpan(plan.audio, window.audio));
+  spans = spans.filter(span => span !== null);
+  const start = Math.min(...spans.map(span => span[0]));
+  const end = Math.max(...spans.map(span => span[1]));
+  if (spans.length > 1 && end - start <= MAX_SPAN_WASTE * window.bytes) spans = [[start, end]];
+
+  const parts = await Promise.all(spans.map(async ([start, end]) => ({
+    start: start,
+    bytes: (await fetchRange(plan.clip.url, start, end - 1)).bytes
+  })));
+  reportBytes(window.bytes);
+  return parts;
+}
+
+function sampleData(parts, track, index) {
+  const offset = track.samples.offsets[index];
+  const size = track.samples.sizes[index];
+  for (const part of parts) {
+    if (offset >= part.start && offset + size <= part.start + part.bytes.length) {
+      return part.bytes.subarray(offset - part.start, offset - part.start + size);
+    }
+  }
+  throw new Error('Sample outside fetched range');
+}
+
+// Wait until a decoder or encoder has room for more work
+async function waitForCodec(codec) {
+  const queueSize = () => ('decodeQueueSize' in codec ? codec.decodeQueueSize : codec.encodeQueueSize);
+  while (codec.state === 'configured' && queueSize() > CODEC_QUEUE_SIZE) {
+    await Promise.race([
+      new Promise(resolve => codec.addEventListener('dequeue', resolve, { once: true })),
+      sleep(CODEC_POLL_MS)
+    ]);
+  }
+}
+
+function rescale(value, from, to) {
+  return Math.round(value * to / from);
+}
+
+async function writeVideoPacket(mux, data, dts, cts, sync, duration, avcC) {
+  const output = mux.output.video;
+  if (output.entry === null && output.avcC === null) output.avcC = avcC;
+  if (output.inBand && sync) data = concatBytes([parameterSets(avcC), data]);
+  await writeSample(mux, mux.videoTrack, data, dts, cts, sync, duration);
+}
+
+async function writeAudioPacket(mux, data, ticks) {
+  if (mux.audioSkip >= ticks / 2) {
+    // Earlier audio ran past the clip boundary: drop the overlap
+    mux.audioSkip -= ticks;
+    return;
+  }
+  await writeSample(mux, mux.audioTrack, data, mux.audioCursor, 0, true, ticks);
+  mux.audioCursor += ticks;
+}
+
+// Line the audio up with the video at a clip boundary, filling gaps with
+// silence and marking overlaps to drop
+async function alignAudio(mux, time) {
+  const audio = mux.output.audio;
+  if (!audio) return;
+  const target = Math.round(time * audio.timescale);
+  mux.audioSkip = 0;
+  while (audio.silence && target - mux.audioCursor >= audio.frameTicks / 2) {
+    await writeSample(mux, mux.audioTrack, audio.silence, mux.audioCursor, 0, true, audio.frameTicks);
+    mux.audioCursor += audio.frameTicks;
+  }
+  if (mux.audioCursor > target) mux.audioSkip = mux.audioCursor - target;
+}
+
+// Encoders are shared by all re-encoded clips, so they keep one configuration
+function videoEncoder(mux) {
+  if (!mux.videoEncoder) {
+    const queue = mux.encodedVideo;
+    const encoder = new VideoEncoder({
+      output: (chunk, metadata) => {
+        if (metadata && metadata.decoderConfig && metadata.decoderConfig.description) {
+          mux.encoderAvcC = new Uint8Array(metadata.decoderConfig.description);
+        }
+        const data = new Uint8Array(chunk.byteLength);
+        chunk.copyTo(data);
+        queue.push({ data: data, timestamp: chunk.timestamp, duration: chunk.duration || 0, sync: chunk.type === 'key' });
+      },
+      error: error => { mux.codecError = error; }
+    });
+    encoder.configure(mux.output.video.encoderConfig);
+    mux.videoEncoder = encoder;
+  }
+  return mux.videoEncoder;
+}
+
+function audioEncoder(mux) {
+  if (!mux.audioEncoder) {
+    const queue = mux.encodedAudio;
+    const encoder = new AudioEncoder({
+      output: chunk => {
+        const data = new Uint8Array(chunk.byteLength);
+        chunk.copyTo(data);
+        queue.push(data);
+      },
+      error: error => { mux.codecError = error; }
+    });
+    encoder.configure(mux.output.audio.encoderConfig);
+    mux.audioEncoder = encoder;
+  }
+  return mux.audioEncoder;
+}
+
+async function drainEncoded(mux) {
+  if (mux.codecError) throw mux.codecError;
+  const timescale = mux.output.video.timescale;
+  while (mux.encodedVideo.length) {
+    const packet = mux.encodedVideo.shift();
+    const dts = rescale(packet.timestamp, 1000000, timescale);
+    const duration = Math.max(1, rescale(packet.duration, 1000000, timescale));
+    await writeVideoPacket(mux, packet.data, dts, 0, packet.sync, duration, mux.encoderAvcC);
+  }
+  while (mux.encodedAudio.length) {
+    await writeAudioPacket(mux, mux.encodedAudio.shift(), mux.output.audio.frameTicks);
+  }
+}
+
+// Decoders for one re-encoded clip, feeding the shared encoders
+function openDecoders(mux, plan, clipStart) {
+  const decoders = {};
+  const output = mux.output.video;
+  const startUs = plan.spanStart * 1000000;
+
+  if (plan.videoMode === 'encode') {
+    const encoder = videoEncoder(mux);
+    let canvas = null;
+    let lastKey = -Infinity;
+    decoders.video = new VideoDecoder({
+      output: frame => {
+        const timestamp = Math.round(clipStart * 1000000 + frame.timestamp - startUs);
+        let scaled;
+        if (frame.displayWidth !== output.width || frame.displayHeight !== output.height) {
+          canvas = canvas || new OffscreenCanvas(output.width, output.height);
+          canvas.getContext('2d').drawImage(frame, 0, 0, output.width, output.height);
+          scaled = new VideoFrame(canvas, { timestamp: timestamp, duration: frame.duration || undefined });
+        } else {
+          scaled = new VideoFrame(frame, { timestamp: timestamp });
+        }
+        frame.close();
+        const keyFrame = timestamp - lastKey >= KEYFRAME_INTERVAL * 1000000;
+        if (keyFrame) lastKey = timestamp;
+        encoder.encode(scaled, { keyFrame: keyFrame });
+        scaled.close();
+      },
+      error: error => { mux.codecError = error; }
+    });
+    decoders.video.configure(videoDecoderConfig(plan.video));
+  }
+
+  if (plan.audioMode === 'encode') {
+    const encoder = audioEncoder(mux);
+    decoders.audio = new AudioDecoder({
+      output: data => {
+        encoder.encode(data);
+        data.close();
+      },
+      error: error => { mux.codecError = error; }
+    });
+    decoders.audio.configure(audioDecoderConfig(plan.audio));
+  }
+  return decoders;
+}
+
+async function closeDecoders(mux, decoders) {
+  for (const [kind, decoder] of Object.entries(decoders)) {
+    await decoder.flush();
+    decoder.close();
+    await (kind === 'video' ? mux.videoEncoder : mux.audioEncoder).flush();
+  }
+  await drainEncoded(mux);
+}
+
+async function writeClip(mux, plan, clipStart) {
+  const output = mux.output;
+  const video = plan.video;
+  const audio = plan.audio;
+  const videoBase = Math.round(clipStart * output.video.timescale);
+  const firstDts = video.samples.dts[plan.videoRange[0]];
+
+  await alignAudio(mux, clipStart);
+  const decoders = openDecoders(mux, plan, clipStart);
+
+  const writeVideo = async (parts, i) => {
+    const samples = video.samples;
+    const data = sampleData(parts, video, i);
+    if (plan.videoMode === 'copy') {
+      const dts = videoBase + rescale(samples.dts[i] - firstDts, video.timescale, output.video.timescale);
+      const cts = rescale(samples.cts[i], video.timescale, output.video.timescale);
+      const duration = rescale(sampleDuration(video, i), video.timescale, output.video.timescale);
+      await writeVideoPacket(mux, data, dts, cts, isSync(video, i), duration, video.config);
+      return;
+    }
+    decoders.video.decode(new EncodedVideoChunk({
+      type: isSync(video, i) ? 'key' : 'delta',
+      timestamp: rescale(samples.dts[i] + samples.cts[i], video.timescale, 1000000),
+      duration: rescale(sampleDuration(video, i), video.timescale, 1000000),
+      data: data
+    }));
+    await waitForCodec(decoders.video);
+    await waitForCodec(mux.videoEncoder);
+  };
+
+  const writeAudio = async (parts, j) => {
+    const data = sampleData(parts, audio, j);
+    if (plan.audioMode === 'copy') {
+      await writeAudioPacket(mux, data, rescale(sampleDuration(audio, j), audio.timescale, output.audio.timescale));
+      return;
+    }
+    decoders.audio.decode(new EncodedAudioChunk({
+      type: 'key',
+      timestamp: rescale(audio.samples.dts[j], audio.timescale, 1000000),
+      data: data
+    }));
+    await waitForCodec(decoders.audio);
+  };
+
+  const time = (track, index) => track.samples.dts[index] / track.timescale;
+  const windows = sampleWindows(plan);
+  let next = windows.next();
+  let pending = next.done ? null : fetchWindow(plan, next.value);
+  try {
+    while (pending) {
+      const window = next.value;
+      const parts = await pending;
+      // Start downloading the next window while this one is written
+      next = windows.next();
+      pending = next.done ? null : fetchWindow(plan, next.value);
+
+      let [i, iEnd] = window.video;
+      let [j, jEnd] = window.audio;
+      while (i < iEnd || j < jEnd) {
+        // About a second of each track at a time, so the tracks interleave
+        const sliceEnd = Math.min(i < iEnd ? time(video, i) : Infinity, j < jEnd ? time(audio, j) : Infinity) + CHUNK_SECONDS;
+        while (i < iEnd && time(video, i) < sliceEnd) await writeVideo(parts, i++);
+        while (j < jEnd && time(audio, j) < sliceEnd) await writeAudio(parts, j++);
+      }
+      await drainEncoded(mux);
+    }
+    await closeDecoders(mux, decoders);
+  } catch (error) {
+    if (pending) pending.catch(() => {});
+    Object.values(decoders).forEach(decoder => { if (decoder.state !== 'closed') decoder.close(); });
+    throw error;
+  }
+
+  const clipEnd = clipStart + plan.spanEnd - plan.spanStart;
+  mux.videoTrack.end = Math.max(mux.videoTrack.end, Math.round(clipEnd * output.video.timescale));
+  return clipEnd;
+}
+
+function ftypBox() {
+  return box('ftyp', ascii('isom'), uint(4, 0x200), ascii('isom'), ascii('iso2'), ascii('avc1'), ascii('mp41'));
+}
+
+async function exportReel(clips, fileHandle, concurrency) {
+  // Read every clip's moov first, a few at a time
+  const movies = new Array(clips.length);
+  let nextClip = 0;
+  const readNext = async () => {
+    while (nextClip < clips.length) {
+      const index = nextClip++;
+      movies[index] = await readMovie(clips[index].url).then(parseMovie).catch(error => ({ error: error }));
+    }
+  };
+  await Promise.all(Array.from({ length: Math.min(concurrency, clips.length) }, readNext));
+
+  let skipped = 0;
+  const plans = [];
+  clips.forEach((clip, index) => {
+    try {
+      if (movies[index].error) throw movies[index].error;
+      plans.push(planClip(clip, movies[index]));
+    } catch (error) {
+      console.warn('Skipping ' + clip.name + ':', error);
+      skipped++;
+      self.postMessage({ type: 'file' });
+    }
+  });
+  if (!plans.length) throw new Error('None of the clips could be read');
+
+  const output = await planOutput(plans);
+  skipped += output.skipped;
+  for (let i = 0; i < output.skipped; i++) self.postMessage({ type: 'file' });
+  if (!plans.length) throw new Error('None of the clips can be joined in this browser');
+  plans.forEach(plan => {
+    const bytes = rangeBytes(plan.video, plan.videoRange) + (plan.audioMode ? rangeBytes(plan.audio, plan.audioRange) : 0);
+    self.postMessage({ type: 'size', bytes: bytes });
+  });
+
+  const sink = await openSink(fileHandle);
+  const ftyp = ftypBox();
+  // 64-bit mdat header; the size is written once the media is
+  const head = concatBytes([ftyp, uint(4, 1), ascii('mdat'), uint(8, 0)]);
+  const mux = {
+    sink: sink,
+    output: output,
+    offset: 0,
+    chunkTrack: null,
+    videoTrack: createTrack(1, 'vide', output.video.timescale),
+    audioTrack: output.audio ? createTrack(2, 'soun', output.audio.timescale) : null,
+    audioCursor: 0,
+    audioSkip: 0,
+    encodedVideo: [],
+    encodedAudio: [],
+    encoderAvcC: null,
+    videoEncoder: null,
+    audioEncoder: null,
+    codecError: null
+  };
+
+  try {
+    await sink.write(head);
+    mux.offset = head.length;
+
+    let clipStart = 0;
+    for (const plan of plans) {
+      clipStart = await writeClip(mux, plan, clipStart);
+      reportBytes(0, true);
+      self.postMessage({ type: 'file' });
+    }
+    await alignAudio(mux, clipStart);
+
+    const video = output.video;
+    const entry = video.entry || avcSampleEntry(video.inBand ? 'avc3' : 'avc1', video.width, video.height, video.avcC);
+    const tracks = [{ track: mux.videoTrack, entry: entry, width: video.width, height: video.height }];
+    if (mux.audioTrack && mux.audioTrack.sizes.length) tracks.push({ track: mux.audioTrack, entry: output.audio.entry });
+
+    const mediaSize = mux.offset - ftyp.length;
+    await sink.write(movieBox(tracks));
+    await sink.patch(ftyp.length + 8, uint(8, mediaSize));
+  } catch (error) {
+    await sink.abort();
+    throw error;
+  } finally {
+    if (mux.videoEncoder && mux.videoEncoder.state !== 'closed') mux.videoEncoder.close();
+    if (mux.audioEncoder && mux.audioEncoder.state !== 'closed') mux.audioEncoder.close();
+  }
+
+  const blob = await sink.close();
+  return {
+    added: plans.length,
+    skipped: skipped,
+    reencoded: plans.filter(plan => plan.videoMode === 'encode' || plan.audioMode === 'encode').length,
+    silent: plans.filter(plan => plan.audio && plan.audioMode !== 'copy' && plan.audioMode !== 'encode').length,
+    blob: blob
+  };
+}
+
+self.onmessage = async (event) => {
+  const { clips, fileHandle, concurrency } = event.data;
+  try {
+    const result = await exportReel(clips, fileHandle, Math.max(1, concurrency || 1));
+    self.postMessage(Object.assign({ type: 'done' }, result));
+  } catch (error) {
+    self.postMessage({ type: 'error', message: error.message || String(error) });
+  }
+};
@@ -0,0 +1,164 @@
+// Tracking overlay worker: draws per-frame player and ball positions on the
+// OffscreenCanvas handed over by the player, so drawing never competes with
+// playback on the main thread.
+//
+// Files are in the format written by tracking_data.py and are used in place
+// as typed arrays. The frame for a video frame is found by binary search.
+//
+// Input messages: { type: 'canvas', canvas }, { type: 'resize', width, height },
+//                 { type: 'load', url },
+//                 { type: 'frame', url, time, videoWidth, videoHeight }
+
+const FORMAT_MAGIC = 'SKTR';
+const FORMAT_VERSION = 1;
+const HEADER_SIZE = 16;
+// Parsed files kept for clips played again or coming up
+const MAX_FILES = 4;
+// Marker radius as a fraction of the video's height
+const MARKER_RADIUS = 0.012;
+// Styles by group: home, away, official, ball
+const GROUP_STYLES = [
+  { fill: '#e53935', stroke: '#ffffff', text: '#ffffff', scale: 1 },
+  { fill: '#1e88e5', stroke: '#ffffff', text: '#ffffff', scale: 1 },
+  { fill: '#fdd835', stroke: '#000000', text: '#000000', scale: 0.8 },
+  { fill: '#ffffff', stroke: '#000000', text: null, scale: 0.6 }
+];
+
+let canvas = null;
+let context = null;
+// url -> parsed file, or null while loading or when it failed
+const files = new Map();
+let lastDrawn = '';
+let lastFrame = null;
+
+function parseTracking(buffer) {
+  const view = new DataView(buffer);
+  const magic = String.fromCharCode(view.getUint8(0), view.getUint8(1), view.getUint8(2), view.getUint8(3));
+  if (magic !== FORMAT_MAGIC || view.getUint16(4, true) !== FORMAT_VERSION) {
+    throw new Error('Not a tracking file of a supported version');
+  }
+  const frameCount = view.getUint32(8, true);
+  const rowCount = view.getUint32(12, true);
+
+  let offset = HEADER_SIZE;
+  const column = (type, length) => {
+    const values = new type(buffer, offset, length);
+    offset += values.byteLength;
+    return values;
+  };
+  const track = {
+    times: column(Float64Array, frameCount),
+    starts: column(Uint32Array, frameCount + 1),
+    x: column(Float32Array, rowCount),
+    y: column(Float32Array, rowCount),
+    labels: column(Uint16Array, rowCount),
+    groups: column(Uint8Array, rowCount)
+  };
+  // Frames further than this from a video frame's time are not drawn on it
+  track.tolerance = frameCount > 1 ? (track.times[frameCount - 1] - track.times[0]) / (frameCount - 1) : Infinity;
+  return track;
+}
+
+function loadTracking(url) {
+  if (files.has(url)) {
+    // Keep recently used files at the end, away from eviction
+    const track = files.get(url);
+    files.delete(url);
+    files.set(url, track);
+    return track;
+  }
+
+  files.set(url, null);
+  while (files.size > MAX_FILES) files.delete(files.keys().next().value);
+  fetch(url)
+    .then(response => {
+      if (!response.ok) throw new Error('HTTP ' + response.status);
+      return response.arrayBuffer();
+    })
+    .then(buffer => {
+      if (!files.has(url)) return;
+      files.set(url, parseTracking(buffer));
+      // Draw the waiting frame now rather than on the next one
+      if (lastFrame && lastFrame.url === url) drawFrame(lastFrame);
+    })
+    .catch(error => console.warn('Failed to load tracking data ' + url + ':', error));
+  return null;
+}
+
+// Index of the frame nearest to `time`, or -1 when there is none close enough
+function frameAt(track, time) {
+  const times = track.times;
+  let low = 0;
+  let high = times.length;
+  while (low < high) {
+    const mid = (low + high) >> 1;
+    if (times[mid] < time) low = mid + 1;
+    else high = mid;
+  }
+  let index = low;
+  if (index === times.length || (index > 0 && time - times[index - 1] < times[index] - time)) index--;
+  if (index < 0 || Math.abs(times[index] - time) > track.tolerance) return -1;
+  return index;
+}
+
+function drawFrame(frame) {
+  if (!context) return;
+  const track = frame.url ? loadTracking(frame.url) : null;
+  const index = track ? frameAt(track, frame.time) : -1;
+
+  const key = [frame.url, index, canvas.width, canvas.height, frame.videoWidth, frame.videoHeight].join(':');
+  if (key === lastDrawn) return;
+  lastDrawn = key;
+
+  context.clearRect(0, 0, canvas.width, canvas.height);
+  if (index < 0 || !frame.videoWidth || !frame.videoHeight) return;
+
+  // The video is letterboxed into the canvas (object-fit: contain)
+  const scale = Math.min(canvas.width / frame.videoWidth, canvas.height / frame.videoHeight);
+  const width = frame.videoWidth * scale;
+  const height = frame.videoHeight * scale;
+  const left = (canvas.width - width) / 2;
+  const top = (canvas.height - height) / 2;
+  const radius = Math.max(3, height * MARKER_RADIUS);
+
+  context.lineWidth = Math.max(1, radius / 6);
+  context.font = 'bold ' + Math.round(radius * 1.1) + 'px sans-serif';
+  context.textAlign = 'center';
+  context.textBaseline = 'middle';
+  for (let row = track.starts[index]; row < track.starts[index + 1]; row++) {
+    const style = GROUP_STYLES[track.groups[row]] || GROUP_STYLES[0];
+    const x = left + track.x[row] * width;
+    const y = top + track.y[row] * height;
+
+    context.beginPath();
+    context.arc(x, y, radius * style.scale, 0, 2 * Math.PI);
+    context.fillStyle = style.fill;
+    context.fill();
+    context.strokeStyle = style.stroke;
+    context.stroke();
+
+    if (style.text && track.labels[row]) {
+      context.fillStyle = style.text;
+      context.fillText(String(track.labels[row]), x, y);
+    }
+  }
+}
+
+self.onmessage = (event) => {
+  const message = event.data;
+  if (message.type === 'canvas') {
+    canvas = message.canvas;
+    context = canvas.getContext('2d');
+  } else if (message.type === 'resize') {
+    if (!canvas) return;
+    canvas.width = message.width;
+    canvas.height = message.height;
+    lastDrawn = '';
+    if (lastFrame) drawFrame(lastFrame);
+  } else if (message.type === 'load') {
+    loadTracking(message.url);
+  } else if (message.type === 'frame') {
+    lastFrame = message;
+    drawFrame(message);
+  }
+};
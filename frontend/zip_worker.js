@@ -0,0 +1,450 @@
+// ZIP export worker: streams clips from their response bodies into a
+// STORE-mode archive. Several clips download at once, each buffering at most
+// READ_AHEAD_BYTES ahead of the writer. Given a file handle, the archive is
+// written to disk as it is built, so memory stays bounded; without one it is
+// collected in a Blob, which the browser may page out but which grows with
+// the archive. A URL used by several clips is downloaded once and written
+// under each name. Clips that cannot be fetched, or whose download breaks off
+// and cannot be resumed, are left out and listed in ERRORS_NAME.
+//
+// Input message:  { clips: [{ name, url }], fileHandle, concurrency }
+// Output messages: { type: 'size', bytes }, { type: 'bytes', bytes },
+//                  { type: 'file' }, { type: 'done', added, skipped, blob },
+//                  { type: 'error', message }
+
+const RETRIES = 3;
+const RETRY_DELAY_MS = 500;
+const PROGRESS_INTERVAL_MS = 200;
+// Merge buffered parts of an in-memory archive so the browser can page them out
+const BLOB_COMPACT_BYTES = 16 * 1024 * 1024;
+// Body bytes a clip may download ahead of the archive writer
+const READ_AHEAD_BYTES = 16 * 1024 * 1024;
+const MAX_32 = 0xFFFFFFFF;
+// Archive entry listing the clips an export left out
+const ERRORS_NAME = 'export_errors.txt';
+
+const CRC_TABLE = (() => {
+  const table = new Uint32Array(256);
+  for (let n = 0; n < 256; n++) {
+    let c = n;
+    for (let k = 0; k < 8; k++) {
+      c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+    }
+    table[n] = c >>> 0;
+  }
+  return table;
+})();
+
+function crc32Update(crc, bytes) {
+  for (let i = 0; i < bytes.length; i++) {
+    crc = CRC_TABLE[(crc ^ bytes[i]) & 0xFF] ^ (crc >>> 8);
+  }
+  return crc;
+}
+
+function sleep(ms) {
+  return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+// Progress is batched so large exports don't flood the main thread
+let pendingBytes = 0;
+let lastReport = 0;
+
+function reportBytes(bytes, force) {
+  pendingBytes += bytes;
+  const now = performance.now();
+  if (pendingBytes && (force || now - lastReport >= PROGRESS_INTERVAL_MS)) {
+    self.postMessage({ type: 'bytes', bytes: pendingBytes });
+    pendingBytes = 0;
+    lastReport = now;
+  }
+}
+
+// Request a clip from byte `offset`, retrying network errors and 5xx/429
+async function requestClip(url, offset) {
+  for (let attempt = 0; ; attempt++) {
+    try {
+      const init = offset ? { headers: { Range: 'bytes=' + offset + '-' } } : {};
+      const response = await fetch(url, init);
+      if (offset && response.status !== 206) {
+        throw new Error('Server cannot resume ' + url);
+      }
+      if (!response.ok) {
+        const error = new Error('Failed to fetch ' + url + ': ' + response.status);
+        error.retryable = response.status >= 500 || response.status === 429;
+        throw error;
+      }
+      return response;
+    } catch (error) {
+      const retryable = error.retryable !== undefined ? error.retryable : error instanceof TypeError;
+      if (!retryable || attempt >= RETRIES) throw error;
+      await sleep(RETRY_DELAY_MS * Math.pow(2, attempt));
+    }
+  }
+}
+
+async function openSink(fileHandle) {
+  if (fileHandle) {
+    const writable = await fileHandle.createWritable();
+    return {
+      write: chunk => writable.write(chunk),
+      close: async () => { await writable.close(); return null; },
+      abort: () => writable.abort()
+    };
+  }
+
+  const archive = createBlobBuffer('application/zip');
+  return {
+    write: async chunk => archive.append(chunk),
+    close: async () => archive.finish(),
+    abort: async () => {}
+  };
+}
+
+function dosDateTime(date) {
+  return {
+    time: (date.getHours() << 11) | (date.getMinutes() << 5) | (date.getSeconds() >> 1),
+    date: ((date.getFullYear() - 1980) << 9) | ((date.getMonth() + 1) << 5) | date.getDate()
+  };
+}
+
+// Flags: sizes follow in a data descriptor (bit 3), UTF-8 names (bit 11)
+const ENTRY_FLAGS = 0x0808;
+
+function localHeader(entry) {
+  const view = new DataView(new ArrayBuffer(30 + entry.name.length));
+  view.setUint32(0, 0x04034B50, true);
+  view.setUint16(4, 20, true);
+  view.setUint16(6, ENTRY_FLAGS, true);
+  view.setUint16(8, 0, true);
+  view.setUint16(10, entry.dos.time, true);
+  view.setUint16(12, entry.dos.date, true);
+  // CRC and sizes are left at zero and written in the data descriptor
+  view.setUint16(26, entry.name.length, true);
+  new Uint8Array(view.buffer).set(entry.name, 30);
+  return new Uint8Array(view.buffer);
+}
+
+function dataDescriptor(entry) {
+  const view = new DataView(new ArrayBuffer(16));
+  view.setUint32(0, 0x08074B50, true);
+  view.setUint32(4, entry.crc, true);
+  view.setUint32(8, entry.size, true);
+  view.setUint32(12, entry.size, true);
+  return new Uint8Array(view.buffer);
+}
+
+function centralHeader(entry) {
+  const zip64 = entry.offset >= MAX_32;
+  const extraLength = zip64 ? 12 : 0;
+  const view = new DataView(new ArrayBuffer(46 + entry.name.length + extraLength));
+  view.setUint32(0, 0x02014B50, true);
+  view.setUint16(4, zip64 ? 45 : 20, true);
+  view.setUint16(6, zip64 ? 45 : 20, true);
+  view.setUint16(8, ENTRY_FLAGS, true);
+  view.setUint16(10, 0, true);
+  view.setUint16(12, entry.dos.time, true);
+  view.setUint16(14, entry.dos.date, true);
+  view.setUint32(16, entry.crc, true);
+  view.setUint32(20, entry.size, true);
+  view.setUint32(24, entry.size, true);
+  view.setUint16(28, entry.name.length, true);
+  view.setUint16(30, extraLength, true);
+  view.setUint32(42, zip64 ? MAX_32 : entry.offset, true);
+  new Uint8Array(view.buffer).set(entry.name, 46);
+  if (zip64) {
+    const extra = 46 + entry.name.length;
+    view.setUint16(extra, 0x0001, true);
+    view.setUint16(extra + 2, 8, true);
+    view.setBigUint64(extra + 4, BigInt(entry.offset), true);
+  }
+  return new Uint8Array(view.buffer);
+}
+
+function endOfCentralDirectory(count, directoryOffset, directorySize) {
+  const zip64 = count >= 0xFFFF || directoryOffset >= MAX_32 || directorySize >= MAX_32;
+  const records = [];
+
+  if (zip64) {
+    const record = new DataView(new ArrayBuffer(56));
+    record.setUint32(0, 0x06064B50, true);
+    record.setBigUint64(4, 44n, true);
+    record.setUint16(12, 45, true);
+    record.setUint16(14, 45, true);
+    record.setBigUint64(24, BigInt(count), true);
+    record.setBigUint64(32, BigInt(count), true);
+    record.setBigUint64(40, BigInt(directorySize), true);
+    record.setBigUint64(48, BigInt(directoryOffset), true);
+    records.push(new Uint8Array(record.buffer));
+
+    const locator = new DataView(new ArrayBuffer(20));
+    locator.setUint32(0, 0x07064B50, true);
+    locator.setBigUint64(8, BigInt(directoryOffset + directorySize), true);
+    locator.setUint32(16, 1, true);
+    records.push(new Uint8Array(locator.buffer));
+  }
+
+  const end = new DataView(new ArrayBuffer(22));
+  end.setUint32(0, 0x06054B50, true);
+  end.setUint16(8, Math.min(count, 0xFFFF), true);
+  end.setUint16(10, Math.min(count, 0xFFFF), true);
+  end.setUint32(12, Math.min(directorySize, MAX_32), true);
+  end.setUint32(16, Math.min(directoryOffset, MAX_32), true);
+  records.push(new Uint8Array(end.buffer));
+  return records;
+}
+
+// Downloads: each distinct URL is fetched once, by a task that reads its
+// body into a queue ahead of the archive writer. A queue holds at most
+// READ_AHEAD_BYTES, so clips downloading ahead of the one being written
+// wait for it instead of filling memory.
+function signal(source) {
+  const wake = source.wake;
+  source.wake = null;
+  if (wake) wake();
+}
+
+// Only one side waits at a time: the writer on an empty queue, the
+// download on a full one
+function waitFor(source) {
+  return new Promise(resolve => { source.wake = resolve; });
+}
+
+function startDownload(source) {
+  source.chunks = [];
+  source.buffered = 0;
+  source.done = false;
+  source.error = null;
+  source.wake = null;
+
+  (async () => {
+    let received = 0;
+    let resumed = false;
+    let reader = null;
+    try {
+      const response = await requestClip(source.url, 0);
+      const totalBytes = Number(response.headers.get('Content-Length')) || 0;
+      if (totalBytes) self.postMessage({ type: 'size', bytes: totalBytes });
+      // Extra names of the URL are copies and download nothing
+      source.names.slice(1).forEach(() => self.postMessage({ type: 'size', bytes: 0 }));
+
+      reader = response.body.getReader();
+      while (true) {
+        while (source.buffered >= READ_AHEAD_BYTES) await waitFor(source);
+        let result;
+        try {
+          result = await reader.read();
+        } catch (error) {
+          // Resume once where the connection dropped
+          if (resumed) throw error;
+          resumed = true;
+          reader = (await requestClip(source.url, received)).body.getReader();
+          continue;
+        }
+        if (result.done) break;
+
+        received += result.value.byteLength;
+        source.chunks.push(result.value);
+        source.buffered += result.value.byteLength;
+        reportBytes(result.value.byteLength);
+        signal(source);
+      }
+      source.done = true;
+    } catch (error) {
+      source.error = error;
+    }
+    signal(source);
+  })();
+}
+
+// Next chunk of a source's body, or null at its end
+async function takeChunk(source) {
+  while (!source.chunks.length && !source.done && !source.error) await waitFor(source);
+  if (source.chunks.length) {
+    const chunk = source.chunks.shift();
+    source.buffered -= chunk.byteLength;
+    signal(source);
+    return chunk;
+  }
+  if (source.error) throw source.error;
+  return null;
+}
+
+// Parts kept in a Blob, merged as they grow so the browser can page them out
+function createBlobBuffer(type) {
+  let blob = new Blob([]);
+  let parts = [];
+  let partBytes = 0;
+  return {
+    append: chunk => {
+      parts.push(chunk);
+      partBytes += chunk.byteLength;
+      if (partBytes >= BLOB_COMPACT_BYTES) {
+        blob = new Blob([blob, ...parts]);
+        parts = [];
+        partBytes = 0;
+      }
+    },
+    finish: () => new Blob([blob, ...parts], { type: type || '' })
+  };
+}
+
+async function beginEntry(zip, name) {
+  const entry = {
+    name: new TextEncoder().encode(name),
+    dos: dosDateTime(new Date()),
+    offset: zip.offset,
+    crc: 0xFFFFFFFF,
+    size: 0
+  };
+  await zip.write(localHeader(entry));
+  return entry;
+}
+
+async function endEntry(zip, entry) {
+  await zip.write(dataDescriptor(entry));
+  zip.entries.push(entry);
+  self.postMessage({ type: 'file' });
+}
+
+function leaveOut(zip, names, error) {
+  console.warn('Leaving out ' + names.join(', ') + ':', error);
+  names.forEach(name => {
+    zip.failures.push(name + ': ' + (error.message || String(error)));
+    self.postMessage({ type: 'file' });
+  });
+  return names.length;
+}
+
+// Write a source's body as one entry per name using it. The first entry is
+// copied from the download queue; later ones repeat it from a Blob kept
+// while copying, so the URL is downloaded only once.
+async function writeSource(zip, source) {
+  let chunk;
+  try {
+    chunk = await takeChunk(source);
+  } catch (error) {
+    // Nothing of the clip is in the archive yet
+    return leaveOut(zip, source.names, error);
+  }
+
+  const entry = await beginEntry(zip, source.names[0]);
+  const copy = source.names.length > 1 ? createBlobBuffer() : null;
+  let failure = null;
+  while (chunk) {
+    entry.crc = crc32Update(entry.crc, chunk);
+    entry.size += chunk.byteLength;
+    if (entry.size >= MAX_32) throw new Error(source.names[0] + ' is too large for a ZIP entry');
+    await zip.write(chunk);
+    if (copy) copy.append(chunk);
+    try {
+      chunk = await takeChunk(source);
+    } catch (error) {
+      failure = error;
+      break;
+    }
+  }
+  entry.crc = (entry.crc ^ 0xFFFFFFFF) >>> 0;
+
+  if (failure) {
+    // The body broke off and could not be resumed. Its bytes are written, so
+    // the entry is closed to keep the archive readable, but left out of the
+    // central directory, which is what unzip tools list.
+    await zip.write(dataDescriptor(entry));
+    return leaveOut(zip, source.names, failure);
+  }
+  await endEntry(zip, entry);
+
+  if (!copy) return 0;
+  const body = copy.finish();
+  for (const name of source.names.slice(1)) {
+    const duplicate = await beginEntry(zip, name);
+    const reader = body.stream().getReader();
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      await zip.write(value);
+    }
+    duplicate.crc = entry.crc;
+    duplicate.size = entry.size;
+    await endEntry(zip, duplicate);
+  }
+  return 0;
+}
+
+async function writeErrors(zip) {
+  const report = new TextEncoder().encode(
+    'Clips left out of this export:\n' + zip.failures.map(line => line + '\n').join(''));
+  const entry = await beginEntry(zip, ERRORS_NAME);
+  await zip.write(report);
+  entry.crc = (crc32Update(entry.crc, report) ^ 0xFFFFFFFF) >>> 0;
+  entry.size = report.byteLength;
+  await zip.write(dataDescriptor(entry));
+  zip.entries.push(entry);
+}
+
+async function exportZip(clips, fileHandle, concurrency) {
+  const sink = await openSink(fileHandle);
+  const zip = {
+    offset: 0,
+    entries: [],
+    failures: [],
+    write: async chunk => {
+      await sink.write(chunk);
+      zip.offset += chunk.byteLength;
+    }
+  };
+
+  // One source per distinct URL, in order of first use
+  const sourcesByUrl = new Map();
+  clips.forEach(clip => {
+    if (!sourcesByUrl.has(clip.url)) sourcesByUrl.set(clip.url, { url: clip.url, names: [] });
+    sourcesByUrl.get(clip.url).names.push(clip.name);
+  });
+  const sources = Array.from(sourcesByUrl.values());
+
+  // Up to `concurrency` sources download at once: the one being written and
+  // those after it, each into its bounded queue
+  let started = 0;
+  const startDownloads = upTo => {
+    for (; started < Math.min(upTo, sources.length); started++) startDownload(sources[started]);
+  };
+
+  let skipped = 0;
+  let added = 0;
+  try {
+    for (let i = 0; i < sources.length; i++) {
+      startDownloads(i + concurrency);
+      skipped += await writeSource(zip, sources[i]);
+      sources[i] = null;
+      reportBytes(0, true);
+    }
+    added = zip.entries.length;
+    if (zip.failures.length) await writeErrors(zip);
+
+    const directoryOffset = zip.offset;
+    for (const entry of zip.entries) {
+      await zip.write(centralHeader(entry));
+    }
+    const directorySize = zip.offset - directoryOffset;
+    for (const record of endOfCentralDirectory(zip.entries.length, directoryOffset, directorySize)) {
+      await zip.write(record);
+    }
+  } catch (error) {
+    await sink.abort();
+    throw error;
+  }
+
+  const blob = await sink.close();
+  return { added: added, skipped: skipped, blob: blob };
+}
+
+self.onmessage = async (event) => {
+  const { clips, fileHandle, concurrency } = event.data;
+  try {
+    const result = await exportZip(clips, fileHandle, Math.max(1, concurrency || 1));
+    self.postMessage(Object.assign({ type: 'done' }, result));
+  } catch (error) {
+    self.postMessage({ type: 'error', message: error.message || String(error) });
+  }
+};
@@ -56,6 +56,8 @@ with st.sidebar.container(border=True):
         st.success(f"Video '{delete_name}' deleted.")
         st.rerun()
 
+live_mode = st.sidebar.toggle("Live mode", help="Continue with newly added clips when the playlist runs out")
+
 st.write('Video clip dictionary:')
 st.write(st.session_state.videos)
-video_stream_player(video_dict=st.session_state.videos)
\ No newline at end of file
+video_stream_player(video_dict=st.session_state.videos, live=live_mode, key="player")
\ No newline at end of file
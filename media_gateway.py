@@ -0,0 +1,834 @@
+import asyncio
+import collections
+import hashlib
+import http.client
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import parse_qs
+
+from mp4_parser import (
+    LARGE_BOX_HEADER_SIZE,
+    MP4Error,
+    find_box,
+    plan_faststart,
+    read_box_header,
+    read_layout,
+    track_index,
+    window_span,
+)
+from source_version import read_version
+
+logger = logging.getLogger(__name__)
+
+# Disk space the cache may use before evicting least recently used clips
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+
+# Bytes read or sent per iteration when streaming
+CHUNK_SIZE = 256 * 1024
+
+# Faststart layouts and sample indexes kept in memory, by object digest
+LAYOUT_CACHE_ENTRIES = 64
+
+# Sources too large to cache whole, such as full match recordings, are
+# fetched from their origin in aligned blocks of this size as they are read
+BLOCK_SIZE = 4 * 1024 * 1024
+
+# Seconds the size and validator of such a source are trusted before asking again
+SOURCE_INFO_TTL = 300
+
+# Seconds a cached clip is served before its origin is asked whether it changed
+REVALIDATE_SECONDS = 300
+
+# Top-level boxes skipped while looking for moov in a source read in blocks
+MAX_BOX_HOPS = 16
+
+# Largest moov box read from a source read in blocks
+MAX_MOOV_BYTES = 64 * 1024 * 1024
+
+USER_AGENT = "media-gateway"
+
+CacheEntry = collections.namedtuple(
+    "CacheEntry",
+    ["digest", "size", "content_type", "path", "etag", "last_modified", "checked_at"],
+    defaults=(None, None, 0.0),
+)
+CacheEntry.__doc__ = "A cached object; etag and last_modified are the origin's validators, if it sent any."
+
+SourceInfo = collections.namedtuple("SourceInfo", ["url", "size", "content_type", "validator", "checked_at"])
+SourceInfo.__doc__ = "Size and validator of a source served from blocks; validator tells versions apart."
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+class _TooLargeToCache(Exception):
+    pass
+
+
+class _RangesUnsupported(OSError):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range "Range: bytes=..." header.
+
+    Returns:
+        tuple: Inclusive (start, end) byte positions, or None when the whole
+            body should be sent (no header, or a form that is not supported).
+
+    Raises:
+        RangeNotSatisfiable: If the range lies outside the body.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(0, size - int(last))
+            end = size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+class MediaCache:
+    """
+    Content-addressed clip store on disk with a byte budget and LRU eviction.
+
+    Files are named by the SHA-256 of their content, so URLs that serve the
+    same bytes share one copy. An SQLite index maps URLs to objects and keeps
+    the access times used for eviction.
+
+    Args:
+        directory (str): Where objects and the index are stored.
+        max_bytes (int): Disk space objects may use.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "url TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL, "
+            "content_type TEXT, last_access REAL NOT NULL)"
+        )
+        # Validators were added later; indexes from before get the columns empty
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(entries)")}
+        for column, kind in (("etag", "TEXT"), ("last_modified", "TEXT"), ("checked_at", "REAL NOT NULL DEFAULT 0")):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE entries ADD COLUMN {column} {kind}")
+        self._db.commit()
+
+    def object_path(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], digest)
+
+    def lookup(self, url):
+        """
+        Return the cached entry for a URL and mark it as recently used.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT digest, size, content_type, etag, last_modified, checked_at FROM entries WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+
+            digest, size, content_type, etag, last_modified, checked_at = row
+            path = self.object_path(digest)
+            if not os.path.exists(path):
+                self._db.execute("DELETE FROM entries WHERE url = ?", (url,))
+                self._db.commit()
+                return None
+
+            self._db.execute("UPDATE entries SET last_access = ? WHERE digest = ?", (time.time(), digest))
+            self._db.commit()
+            return CacheEntry(digest, size, content_type, path, etag, last_modified, checked_at)
+
+    def mark_checked(self, url):
+        """
+        Record that the origin confirmed a URL's cached copy is current.
+        """
+        with self._lock:
+            self._db.execute("UPDATE entries SET checked_at = ? WHERE url = ?", (time.time(), url))
+            self._db.commit()
+
+    def store(self, url, temp_path, digest, size, content_type, etag=None, last_modified=None):
+        """
+        Move a downloaded file into the store and index it under its URL,
+        with the origin's validators for revalidating it later.
+        """
+        path = self.object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, path)
+
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(url, digest, size, content_type, last_access, etag, last_modified, checked_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, size, content_type, now, etag, last_modified, now),
+            )
+            self._db.commit()
+            self._evict(keep=digest)
+        return CacheEntry(digest, size, content_type, path, etag, last_modified, now)
+
+    def _evict(self, keep):
+        rows = self._db.execute(
+            "SELECT digest, MAX(size), MAX(last_access) FROM entries "
+            "GROUP BY digest ORDER BY MAX(last_access)"
+        ).fetchall()
+        total = sum(size for _, size, _ in rows)
+
+        for digest, size, _ in rows:
+            if total <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            self._db.execute("DELETE FROM entries WHERE digest = ?", (digest,))
+            try:
+                # Responses already streaming from the file keep their handle
+                os.remove(self.object_path(digest))
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._db.commit()
+
+
+def _open_origin(url, headers=None, timeout=30):
+    request = urllib.request.Request(url, headers=dict(headers or {}, **{"User-Agent": USER_AGENT}))
+    return urllib.request.urlopen(request, timeout=timeout)
+
+
+def _needs_revalidation(entry):
+    # Entries without validators, such as blocks keyed by their source's
+    # validator, never change under their key
+    if not (entry.etag or entry.last_modified):
+        return False
+    return time.time() - entry.checked_at >= REVALIDATE_SECONDS
+
+
+def _keyframes(tracks):
+    video = next((samples for handler, samples in tracks if handler == b"vide"), [])
+    return [(sample.time, sample.offset) for sample in video if sample.keyframe]
+
+
+def parse_window(query):
+    """
+    Read the start and end parameters of a sub-clip window, in seconds.
+
+    Returns:
+        tuple: (start, end or None), or None when the request has no window.
+
+    Raises:
+        ValueError: If a parameter is not a number.
+    """
+    start = query.get("start", [None])[0]
+    end = query.get("end", [None])[0]
+    if start is None and end is None:
+        return None
+    return float(start or 0), None if end is None else float(end)
+
+
+class MediaGateway:
+    """
+    ASGI app that serves clips from an on-disk cache in front of their origin.
+
+    Clips are requested as GET /?url=<origin url>. The gateway answers HTTP
+    Range and If-None-Match requests from the cache, sends cached files with
+    the zero-copy send extension when the server supports it, and collapses
+    concurrent requests for the same uncached clip into one origin fetch.
+    Objects larger than max_object_bytes are proxied without caching.
+    Cached clips are revalidated with their origin's ETag or Last-Modified
+    once they are REVALIDATE_SECONDS old, and served from the cache while the
+    origin is unreachable; clips from origins sending neither are assumed
+    never to change.
+
+    MP4s whose moov box follows the media data are served with it moved to
+    the front, so browsers can start playback after the first request.
+    GET /?url=<origin url>&index=keyframes returns the keyframe times and
+    byte offsets of a clip as JSON.
+
+    Sources too large to cache whole are read from their origin in blocks
+    of BLOCK_SIZE bytes, cached like clips, so clips cut from the same
+    recording share what has been fetched. Adding &start=<s>&end=<s> names
+    a window of the source: range requests running past the window's media,
+    found from the MP4 sample tables, are cut short at its last byte, so the
+    browser's read-ahead does not pull the rest of the recording.
+
+    Run it with any ASGI server, for example:
+        uvicorn.run(MediaGateway("/var/cache/clips"), port=8503)
+
+    Args:
+        cache_dir (str): Directory of the on-disk cache.
+        max_bytes (int): Disk budget of the cache.
+        max_object_bytes (int): Largest object worth caching, a quarter of
+            max_bytes by default.
+        allowed_url_prefixes (list): If given, only origin URLs starting with
+            one of these prefixes are served.
+        max_age (int): Cache-Control max-age sent to browsers, in seconds.
+        faststart (bool): Relocate trailing moov boxes of cached clips.
+    """
+
+    def __init__(
+        self,
+        cache_dir,
+        max_bytes=DEFAULT_MAX_BYTES,
+        max_object_bytes=None,
+        allowed_url_prefixes=None,
+        max_age=86400,
+        faststart=True,
+    ):
+        self.cache = MediaCache(cache_dir, max_bytes)
+        self.max_object_bytes = max_object_bytes or max_bytes // 4
+        self.allowed_url_prefixes = tuple(allowed_url_prefixes or ())
+        self.max_age = max_age
+        self.faststart = faststart
+        self._inflight = {}
+        self._layouts = collections.OrderedDict()
+        self._layouts_lock = threading.Lock()
+        self._sources = collections.OrderedDict()
+
+    def is_allowed(self, url):
+        if not url.startswith(("http://", "https://")):
+            return False
+        return not self.allowed_url_prefixes or url.startswith(self.allowed_url_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        method = scope["method"]
+        if method == "OPTIONS":
+            await self._send_empty(send, 204, [
+                (b"access-control-allow-methods", b"GET, HEAD, OPTIONS"),
+                (b"access-control-allow-headers", b"range, if-none-match"),
+            ])
+            return
+        if method not in ("GET", "HEAD"):
+            await self._send_empty(send, 405)
+            return
+
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        url = query.get("url", [""])[0]
+        if not self.is_allowed(url):
+            await self._send_empty(send, 403)
+            return
+
+        try:
+            window = parse_window(query)
+        except ValueError:
+            await self._send_empty(send, 400)
+            return
+
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        try:
+            if url in self._sources:
+                raise _TooLargeToCache()
+            entry = await self._get(url)
+        except _TooLargeToCache:
+            await self._serve_source(url, method, headers, window, query, send)
+            return
+        except (OSError, ValueError) as error:
+            logger.warning("Failed to fetch %s: %s", url, error)
+            status = error.code if isinstance(error, urllib.error.HTTPError) else 502
+            await self._send_empty(send, status)
+            return
+
+        if query.get("index") == ["keyframes"]:
+            await self._serve_index(entry, send)
+            return
+        await self._serve(entry, method, headers, window, scope, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _get(self, url):
+        entry = await asyncio.to_thread(self.cache.lookup, url)
+        if entry is not None and not _needs_revalidation(entry):
+            return entry
+
+        # Everyone asking for the same uncached or stale clip waits on one request
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(self._download, url, entry))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _: self._inflight.pop(url, None))
+        return await asyncio.shield(task)
+
+    def _download(self, url, cached=None):
+        """
+        Download a clip into the cache, or, given its cached entry, only if
+        the origin has a newer version. A cached copy is kept when the origin
+        cannot be reached or fails.
+        """
+        conditional = {}
+        if cached is not None:
+            if cached.etag:
+                conditional["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                conditional["If-Modified-Since"] = cached.last_modified
+        try:
+            response = _open_origin(url, conditional)
+        except urllib.error.HTTPError as error:
+            if cached is None or (error.code != 304 and error.code < 500):
+                raise
+            if error.code == 304:
+                self.cache.mark_checked(url)
+            else:
+                logger.warning("Serving cached %s, origin answered %s", url, error.code)
+            return cached
+        except OSError as error:
+            if cached is None:
+                raise
+            logger.warning("Serving cached %s, origin unreachable: %s", url, error)
+            return cached
+
+        with response:
+            length = int(response.headers.get("Content-Length") or 0)
+            if length > self.max_object_bytes:
+                raise _TooLargeToCache()
+
+            content_type = response.headers.get("Content-Type", "application/octet-stream")
+            fd, temp_path = tempfile.mkstemp(dir=self.cache.directory, suffix=".part")
+            try:
+                digest = hashlib.sha256()
+                size = 0
+                with os.fdopen(fd, "wb") as f:
+                    while True:
+                        chunk = response.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        size += len(chunk)
+                        if size > self.max_object_bytes:
+                            raise _TooLargeToCache()
+                        f.write(chunk)
+                return self.cache.store(
+                    url, temp_path, digest.hexdigest(), size, content_type,
+                    etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"),
+                )
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+    def _remember_layout(self, key, value):
+        with self._layouts_lock:
+            self._layouts[key] = value
+            while len(self._layouts) > LAYOUT_CACHE_ENTRIES:
+                self._layouts.popitem(last=False)
+        return value
+
+    def _cached_layout(self, key):
+        with self._layouts_lock:
+            if key in self._layouts:
+                self._layouts.move_to_end(key)
+                return self._layouts[key]
+        return None
+
+    def _layout(self, entry):
+        """
+        Return (faststart layout or None, track index) for a cached object.
+
+        The track index describes the file as served, after any relocation.
+        """
+        cached = self._cached_layout(entry.digest)
+        if cached is not None:
+            return cached
+
+        layout = None
+        tracks = []
+        try:
+            with open(entry.path, "rb") as f:
+                layout = plan_faststart(f) if self.faststart else None
+                if layout is not None:
+                    tracks = track_index(layout.moov)
+                else:
+                    f.seek(0)
+                    # Already faststart: the moov box is near the front
+                    head = f.read(CHUNK_SIZE)
+                    moov = find_box(head, [b"moov"])
+                    if moov is not None and moov.size is not None:
+                        f.seek(moov.offset)
+                        tracks = track_index(f.read(moov.size), moov._replace(offset=0))
+        except MP4Error as error:
+            # Not an MP4 we understand: serve it unchanged
+            logger.debug("No layout for %s: %s", entry.path, error)
+
+        return self._remember_layout(entry.digest, (layout, tracks))
+
+    async def _serve_index(self, entry, send):
+        _, tracks = await asyncio.to_thread(self._layout, entry)
+        await self._send_index(tracks, send)
+
+    async def _send_index(self, tracks, send):
+        body = json.dumps({"keyframes": _keyframes(tracks)}, separators=(",", ":")).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": self._common_headers() + [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"cache-control", f"public, max-age={self.max_age}".encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def _common_headers(self):
+        return [
+            (b"accept-ranges", b"bytes"),
+            (b"access-control-allow-origin", b"*"),
+            (b"access-control-expose-headers", b"content-length, content-range, etag"),
+        ]
+
+    async def _send_empty(self, send, status, headers=()):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": self._common_headers() + list(headers) + [(b"content-length", b"0")],
+        })
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _start_response(self, send, method, headers, size, etag, content_type, span):
+        """
+        Answer conditional and range headers and send the response head.
+
+        Args:
+            span (tuple): Inclusive byte positions of a sub-clip window's
+                media; ranges running past its end are cut short there.
+
+        Returns:
+            tuple: Inclusive (start, end) of the body still to be sent, or
+                None when the response is already complete.
+        """
+        cache_headers = [
+            (b"etag", etag.encode()),
+            (b"cache-control", f"public, max-age={self.max_age}".encode()),
+        ]
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+            await self._send_empty(send, 304, cache_headers)
+            return None
+
+        byte_range = None
+        if headers.get("if-range", etag) == etag:
+            try:
+                byte_range = parse_range(headers.get("range"), size)
+            except RangeNotSatisfiable:
+                await self._send_empty(send, 416, [(b"content-range", f"bytes */{size}".encode())])
+                return None
+
+        if byte_range and span and byte_range[0] <= span[1] < byte_range[1]:
+            # A partial answer is allowed; the browser asks again if it needs more
+            byte_range = (byte_range[0], span[1])
+
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1 if size else 0
+        response_headers = self._common_headers() + cache_headers + [
+            (b"content-type", content_type.encode("latin-1")),
+            (b"content-length", str(length).encode()),
+        ]
+        if byte_range:
+            response_headers.append((b"content-range", f"bytes {start}-{end}/{size}".encode()))
+
+        await send({
+            "type": "http.response.start",
+            "status": 206 if byte_range else 200,
+            "headers": response_headers,
+        })
+        if method == "HEAD" or not length:
+            await send({"type": "http.response.body", "body": b""})
+            return None
+        return start, end
+
+    async def _serve(self, entry, method, headers, window, scope, send):
+        layout, tracks = await asyncio.to_thread(self._layout, entry)
+        size = layout.size if layout else entry.size
+        # A relocated file differs from the origin's bytes, so it gets its own tag
+        etag = f'"{entry.digest}-faststart"' if layout else f'"{entry.digest}"'
+        span = window_span(tracks, *window) if window and tracks else None
+
+        body_range = await self._start_response(send, method, headers, size, etag, entry.content_type, span)
+        if body_range is None:
+            return
+        start, end = body_range
+        length = end - start + 1
+
+        with open(entry.path, "rb") as f:
+            if layout is not None:
+                pieces = read_layout(f, layout, start, end)
+                remaining = length
+                while remaining:
+                    chunk = await asyncio.to_thread(next, pieces, b"")
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+                return
+
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f,
+                    "offset": start,
+                    "count": length,
+                })
+                return
+
+            f.seek(start)
+            remaining = length
+            while remaining:
+                chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+
+    async def _source(self, url):
+        """
+        Return the SourceInfo of a source read in blocks, asking the origin when stale.
+        """
+        info = self._sources.get(url)
+        if info is not None and time.time() - info.checked_at < SOURCE_INFO_TTL:
+            self._sources.move_to_end(url)
+            return info
+
+        info = await asyncio.to_thread(self._probe_source, url)
+        self._sources[url] = info
+        self._sources.move_to_end(url)
+        while len(self._sources) > LAYOUT_CACHE_ENTRIES:
+            self._sources.popitem(last=False)
+        return info
+
+    def _probe_source(self, url):
+        version = read_version(url, user_agent=USER_AGENT)
+        if not version.ranges or version.size is None:
+            raise _RangesUnsupported()
+        # Block keys need a validator; without one only the size tells versions apart
+        validator = version.validator or f"/{version.size}"
+        return SourceInfo(url, version.size, version.content_type, validator, time.time())
+
+    async def _block(self, source, index):
+        """
+        Return the cache entry of one block of a source, fetching it once.
+        """
+        key = f"{source.url}#block={index}@{source.validator}"
+        entry = await asyncio.to_thread(self.cache.lookup, key)
+        if entry is not None:
+            return entry
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(self._download_block, source, index, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def _download_block(self, source, index, key):
+        start = index * BLOCK_SIZE
+        end = min(source.size, start + BLOCK_SIZE) - 1
+        with _open_origin(source.url, {"Range": f"bytes={start}-{end}"}) as response:
+            if response.status != 206:
+                raise _RangesUnsupported()
+
+            fd, temp_path = tempfile.mkstemp(dir=self.cache.directory, suffix=".part")
+            try:
+                digest = hashlib.sha256()
+                size = 0
+                with os.fdopen(fd, "wb") as f:
+                    while size < end - start + 1:
+                        chunk = response.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        size += len(chunk)
+                        f.write(chunk)
+                if size != end - start + 1:
+                    raise OSError(f"Short read from origin: {size} of {end - start + 1} bytes")
+                return self.cache.store(key, temp_path, digest.hexdigest(), size, source.content_type)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+
+    async def _iter_source(self, source, start, end):
+        """
+        Yield bytes start..end (inclusive) of a source, block by block.
+        """
+        for index in range(start // BLOCK_SIZE, end // BLOCK_SIZE + 1):
+            entry = await self._block(source, index)
+            block_start = index * BLOCK_SIZE
+            first = max(start, block_start) - block_start
+            last = min(end, block_start + entry.size - 1) - block_start
+            with open(entry.path, "rb") as f:
+                f.seek(first)
+                remaining = last - first + 1
+                while remaining > 0:
+                    chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise OSError("Cached block shorter than expected")
+                    remaining -= len(chunk)
+                    yield chunk
+
+    async def _read_source(self, source, start, end):
+        return b"".join([chunk async for chunk in self._iter_source(source, start, min(end, source.size - 1))])
+
+    async def _source_tracks(self, source):
+        """
+        Return the track index of a source read in blocks, or [] if it has none.
+        """
+        key = f"{source.url}@{source.validator}"
+        cached = self._cached_layout(key)
+        if cached is not None:
+            return cached[1]
+
+        tracks = []
+        try:
+            offset = 0
+            for _ in range(MAX_BOX_HOPS):
+                if offset >= source.size:
+                    break
+                header = await self._read_source(source, offset, offset + LARGE_BOX_HEADER_SIZE - 1)
+                box = read_box_header(header, 0, source.size - offset)
+                if box is None or box.size is None:
+                    break
+                if box.type == b"moov":
+                    if box.size > MAX_MOOV_BYTES:
+                        raise MP4Error("moov box too large")
+                    data = await self._read_source(source, offset, offset + box.size - 1)
+                    tracks = await asyncio.to_thread(track_index, data, box._replace(offset=0))
+                    break
+                offset += box.size
+        except MP4Error as error:
+            logger.debug("No sample index for %s: %s", source.url, error)
+
+        self._remember_layout(key, (None, tracks))
+        return tracks
+
+    async def _serve_source(self, url, method, headers, window, query, send):
+        try:
+            source = await self._source(url)
+        except _RangesUnsupported:
+            self._sources.pop(url, None)
+            await self._proxy(url, method, headers, send)
+            return
+        except (OSError, ValueError) as error:
+            logger.warning("Failed to fetch %s: %s", url, error)
+            status = error.code if isinstance(error, urllib.error.HTTPError) else 502
+            await self._send_empty(send, status)
+            return
+
+        try:
+            if query.get("index") == ["keyframes"]:
+                await self._send_index(await self._source_tracks(source), send)
+                return
+
+            span = None
+            if window:
+                tracks = await self._source_tracks(source)
+                span = window_span(tracks, *window) if tracks else None
+
+            etag = '"' + hashlib.sha256(f"{url}@{source.validator}".encode()).hexdigest()[:32] + '"'
+            body_range = await self._start_response(send, method, headers, source.size, etag, source.content_type, span)
+        except (OSError, ValueError) as error:
+            logger.warning("Failed to read %s: %s", url, error)
+            status = error.code if isinstance(error, urllib.error.HTTPError) else 502
+            await self._send_empty(send, status)
+            return
+        if body_range is None:
+            return
+
+        start, end = body_range
+        remaining = end - start + 1
+        try:
+            async for chunk in self._iter_source(source, start, end):
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        except (OSError, http.client.HTTPException) as error:
+            # The status is already sent; a body shorter than its
+            # Content-Length tells the client the response broke off
+            logger.warning("Failed to read %s after %d bytes: %s", url, end - start + 1 - remaining, error)
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    async def _proxy(self, url, method, headers, send):
+        forwarded = {name.title(): headers[name] for name in ("range", "if-range") if name in headers}
+        try:
+            response = await asyncio.to_thread(_open_origin, url, forwarded)
+        except (OSError, ValueError) as error:
+            # HTTPError carries the origin's status; DNS, connection and
+            # timeout failures are URLError or plain OSError
+            logger.warning("Failed to proxy %s: %s", url, error)
+            status = error.code if isinstance(error, urllib.error.HTTPError) else 502
+            await self._send_empty(send, status)
+            return
+
+        with response:
+            passed = [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in response.headers.items()
+                if name.lower() in ("content-type", "content-length", "content-range", "etag", "last-modified")
+            ]
+            await send({
+                "type": "http.response.start",
+                "status": response.status,
+                "headers": self._common_headers() + passed,
+            })
+            if method == "HEAD":
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(response.read, CHUNK_SIZE)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": bool(chunk)})
+                    if not chunk:
+                        break
+            except (OSError, http.client.HTTPException) as error:
+                # As in _serve_source, only the body can still be ended
+                logger.warning("Failed to proxy %s part way: %s", url, error)
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def run_gateway(cache_dir, host="127.0.0.1", port=8503, **kwargs):
+    """
+    Serve a MediaGateway with uvicorn (pip install uvicorn).
+    """
+    import uvicorn
+
+    uvicorn.run(MediaGateway(cache_dir, **kwargs), host=host, port=port)
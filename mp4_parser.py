@@ -0,0 +1,649 @@
+import bisect
+import collections
+import struct
+
+# Box header: 32-bit size and type, followed by a 64-bit size when size is 1
+BOX_HEADER_SIZE = 8
+LARGE_BOX_HEADER_SIZE = 16
+
+# Bytes between a sample entry's header and its child boxes
+_VISUAL_SAMPLE_ENTRY_SIZE = 78
+_AUDIO_SAMPLE_ENTRY_SIZE = 28
+
+# Boxes rebuilt on the way to the chunk offset tables when moov is moved
+_OFFSET_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+# Bytes read per iteration when serving a relocated file
+READ_SIZE = 256 * 1024
+
+Box = collections.namedtuple("Box", ["type", "offset", "header_size", "size"])
+Box.__doc__ = "An MP4 box: type as bytes, position and sizes in bytes."
+
+MovieInfo = collections.namedtuple("MovieInfo", ["duration", "width", "height", "codecs"])
+MovieInfo.__doc__ = "Metadata read from a moov box; codecs are RFC 6381 strings in track order."
+
+Sample = collections.namedtuple("Sample", ["time", "offset", "size", "keyframe"])
+Sample.__doc__ = "A media sample: decode time in seconds, byte position and size, sync flag."
+
+Layout = collections.namedtuple("Layout", ["size", "parts", "moov"])
+Layout.__doc__ = """
+A file rearranged for progressive playback. parts are (offset, length, data)
+pieces in order: a range of the original file when data is None, otherwise
+the bytes in data. moov holds the relocated moov box.
+"""
+
+
+class MP4Error(ValueError):
+    pass
+
+
+def read_box_header(data, offset, end=None):
+    """
+    Read the header of the box starting at `offset`.
+
+    Args:
+        data (bytes): Buffer holding the box header.
+        offset (int): Position of the box in `data`.
+        end (int): Position where the enclosing space ends, used for boxes
+            that extend to the end of the file (size 0). None if unknown.
+
+    Returns:
+        Box: The box, or None if `data` ends before the header does.
+    """
+    if offset + BOX_HEADER_SIZE > len(data):
+        return None
+
+    size, box_type = struct.unpack_from(">I4s", data, offset)
+    header_size = BOX_HEADER_SIZE
+    if size == 1:
+        if offset + LARGE_BOX_HEADER_SIZE > len(data):
+            return None
+        (size,) = struct.unpack_from(">Q", data, offset + BOX_HEADER_SIZE)
+        header_size = LARGE_BOX_HEADER_SIZE
+    elif size == 0:
+        size = None if end is None else end - offset
+
+    if size is not None and size < header_size:
+        raise MP4Error(f"Invalid size {size} for box {box_type!r} at {offset}")
+    return Box(box_type, offset, header_size, size)
+
+
+def iter_boxes(data, start=0, end=None):
+    """
+    Yield the consecutive boxes in data[start:end].
+
+    Stops at the first header that is cut off, so it can walk a buffer that
+    holds only the beginning of a file.
+    """
+    end = len(data) if end is None else end
+    offset = start
+    while offset < end:
+        box = read_box_header(data, offset, end)
+        if box is None:
+            return
+        yield box
+        if box.size is None:
+            return
+        offset += box.size
+
+
+def find_box(data, path, start=0, end=None):
+    """
+    Return the first box reached by following `path`, a list of box types,
+    from data[start:end], or None.
+    """
+    for box in iter_boxes(data, start, end):
+        if box.type == path[0]:
+            if len(path) == 1:
+                return box
+            return find_box(data, path[1:], box.offset + box.header_size, box.offset + box.size)
+    return None
+
+
+def _payload(data, box):
+    return data[box.offset + box.header_size:box.offset + box.size]
+
+
+def _full_box_version(payload):
+    return payload[0]
+
+
+def _movie_duration(data, moov):
+    mvhd = find_box(data, [b"mvhd"], moov.offset + moov.header_size, moov.offset + moov.size)
+    if mvhd is None:
+        raise MP4Error("moov has no mvhd box")
+    payload = _payload(data, mvhd)
+    if _full_box_version(payload) == 1:
+        timescale, duration = struct.unpack_from(">IQ", payload, 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", payload, 12)
+
+    if duration in (0, 0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+        # Fragmented files may only state their length in mvex/mehd
+        mehd = find_box(data, [b"mvex", b"mehd"], moov.offset + moov.header_size, moov.offset + moov.size)
+        if mehd is None:
+            return None
+        payload = _payload(data, mehd)
+        fmt = ">Q" if _full_box_version(payload) == 1 else ">I"
+        (duration,) = struct.unpack_from(fmt, payload, 4)
+    return duration / timescale if timescale else None
+
+
+def _track_size(data, trak):
+    tkhd = find_box(data, [b"tkhd"], trak.offset + trak.header_size, trak.offset + trak.size)
+    if tkhd is None:
+        return 0, 0
+    payload = _payload(data, tkhd)
+    offset = 88 if _full_box_version(payload) == 1 else 76
+    width, height = struct.unpack_from(">II", payload, offset)
+    # 16.16 fixed point
+    return width >> 16, height >> 16
+
+
+def _descriptor(payload, offset):
+    """
+    Read an MPEG-4 descriptor header, returning (tag, body offset, body size).
+    """
+    tag = payload[offset]
+    offset += 1
+    size = 0
+    for _ in range(4):
+        byte = payload[offset]
+        offset += 1
+        size = (size << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            break
+    return tag, offset, size
+
+
+def _aac_codec(esds):
+    """
+    Codec string of an mp4a sample entry from its esds box, e.g. mp4a.40.2.
+    """
+    offset = 4
+    tag, offset, _ = _descriptor(esds, offset)
+    if tag != 0x03:
+        return "mp4a"
+    flags = esds[offset + 2]
+    offset += 3
+    if flags & 0x80:
+        offset += 2
+    if flags & 0x40:
+        offset += 1 + esds[offset]
+    if flags & 0x20:
+        offset += 2
+
+    tag, offset, _ = _descriptor(esds, offset)
+    if tag != 0x04:
+        return "mp4a"
+    object_type = esds[offset]
+    offset += 13
+
+    codec = f"mp4a.{object_type:02x}"
+    if offset < len(esds):
+        tag, offset, size = _descriptor(esds, offset)
+        if tag == 0x05 and size:
+            audio_object_type = esds[offset] >> 3
+            if audio_object_type == 31:
+                audio_object_type = 32 + (((esds[offset] & 0x07) << 3) | (esds[offset + 1] >> 5))
+            codec += f".{audio_object_type}"
+    return codec
+
+
+def _hevc_codec(fourcc, hvcc):
+    """
+    Codec string of an HEVC sample entry from its hvcC box, e.g. hvc1.1.6.L93.B0.
+    """
+    profile_space = hvcc[1] >> 6
+    tier = "H" if hvcc[1] & 0x20 else "L"
+    profile = hvcc[1] & 0x1F
+    (compatibility,) = struct.unpack_from(">I", hvcc, 2)
+    # The compatibility flags are written in reverse bit order
+    compatibility = int(f"{compatibility:032b}"[::-1], 2)
+    constraints = bytearray(hvcc[6:12])
+    while constraints and not constraints[-1]:
+        constraints.pop()
+    level = hvcc[12]
+
+    parts = [fourcc, "ABC"[profile_space - 1] + str(profile) if profile_space else str(profile)]
+    parts.append(f"{compatibility:X}")
+    parts.append(f"{tier}{level}")
+    parts.extend(f"{byte:X}" for byte in constraints)
+    return ".".join(parts)
+
+
+def _sample_entry_codec(data, entry):
+    fourcc = entry.type.decode("latin-1")
+    children_start = entry.offset + entry.header_size
+    children_end = entry.offset + entry.size
+
+    if entry.type in (b"avc1", b"avc3", b"hvc1", b"hev1"):
+        children_start += _VISUAL_SAMPLE_ENTRY_SIZE
+        for child in iter_boxes(data, children_start, children_end):
+            payload = _payload(data, child)
+            if child.type == b"avcC":
+                return f"{fourcc}.{payload[1]:02x}{payload[2]:02x}{payload[3]:02x}"
+            if child.type == b"hvcC":
+                return _hevc_codec(fourcc, payload)
+    elif entry.type == b"mp4a":
+        children_start += _AUDIO_SAMPLE_ENTRY_SIZE
+        for child in iter_boxes(data, children_start, children_end):
+            if child.type == b"esds":
+                return _aac_codec(_payload(data, child))
+    elif entry.type == b"Opus":
+        return "opus"
+    elif entry.type == b"fLaC":
+        return "flac"
+    return fourcc
+
+
+def _track_codec(data, trak):
+    stsd = find_box(
+        data,
+        [b"mdia", b"minf", b"stbl", b"stsd"],
+        trak.offset + trak.header_size,
+        trak.offset + trak.size,
+    )
+    if stsd is None:
+        return None
+    # Full box header and entry count precede the sample entries
+    entries_start = stsd.offset + stsd.header_size + 8
+    for entry in iter_boxes(data, entries_start, stsd.offset + stsd.size):
+        return _sample_entry_codec(data, entry)
+    return None
+
+
+def parse_movie(data, moov=None):
+    """
+    Read duration, video size and codecs from a moov box.
+
+    Args:
+        data (bytes): Buffer holding the whole moov box.
+        moov (Box): The moov box in `data`. By default `data` is searched for
+            a top-level moov box.
+
+    Returns:
+        MovieInfo: Duration in seconds (None if unknown), the size of the
+            largest video track and the codec of every track.
+
+    Raises:
+        MP4Error: If the moov box is missing or malformed.
+    """
+    if moov is None:
+        moov = find_box(data, [b"moov"])
+    if moov is None or moov.size is None or moov.offset + moov.size > len(data):
+        raise MP4Error("No complete moov box")
+
+    try:
+        duration = _movie_duration(data, moov)
+        width = height = 0
+        codecs = []
+        for trak in iter_boxes(data, moov.offset + moov.header_size, moov.offset + moov.size):
+            if trak.type != b"trak":
+                continue
+            track_width, track_height = _track_size(data, trak)
+            if track_width * track_height > width * height:
+                width, height = track_width, track_height
+            codec = _track_codec(data, trak)
+            if codec:
+                codecs.append(codec)
+    except (struct.error, IndexError) as error:
+        raise MP4Error(f"Malformed moov box: {error}") from error
+
+    return MovieInfo(duration, width, height, codecs)
+
+
+def iter_file_boxes(f):
+    """
+    Yield the top-level boxes of a seekable binary file, reading only headers.
+    """
+    f.seek(0, 2)
+    file_size = f.tell()
+    offset = 0
+    while offset < file_size:
+        f.seek(offset)
+        box = read_box_header(f.read(LARGE_BOX_HEADER_SIZE), 0, file_size - offset)
+        if box is None:
+            return
+        yield box._replace(offset=offset)
+        offset += box.size
+
+
+def is_faststart(boxes):
+    """
+    Whether moov comes before the media data, so playback can start as soon
+    as the beginning of the file has arrived.
+
+    Args:
+        boxes (list): Top-level boxes, e.g. from iter_file_boxes.
+    """
+    for box in boxes:
+        if box.type == b"moov":
+            return True
+        if box.type == b"mdat":
+            return False
+    return False
+
+
+class _OffsetOverflow(Exception):
+    pass
+
+
+def _box_header(box_type, payload_size):
+    if payload_size + BOX_HEADER_SIZE > 0xFFFFFFFF:
+        return struct.pack(">I4sQ", 1, box_type, payload_size + LARGE_BOX_HEADER_SIZE)
+    return struct.pack(">I4s", payload_size + BOX_HEADER_SIZE, box_type)
+
+
+def _rewrite_offsets(data, box, shift, use_co64):
+    """
+    Copy a box, passing every chunk offset in it through `shift`.
+    """
+    start = box.offset + box.header_size
+    end = box.offset + box.size
+    if box.type in _OFFSET_CONTAINERS:
+        payload = b"".join(_rewrite_offsets(data, child, shift, use_co64) for child in iter_boxes(data, start, end))
+        return _box_header(box.type, len(payload)) + payload
+
+    if box.type in (b"stco", b"co64"):
+        version_flags, count = struct.unpack_from(">II", data, start)
+        width = "Q" if box.type == b"co64" else "I"
+        offsets = [shift(offset) for offset in struct.unpack_from(f">{count}{width}", data, start + 8)]
+        if not use_co64 and box.type == b"stco":
+            if offsets and max(offsets) > 0xFFFFFFFF:
+                raise _OffsetOverflow()
+            payload = struct.pack(f">II{count}I", version_flags, count, *offsets)
+            return _box_header(b"stco", len(payload)) + payload
+        payload = struct.pack(f">II{count}Q", version_flags, count, *offsets)
+        return _box_header(b"co64", len(payload)) + payload
+
+    return bytes(data[box.offset:end])
+
+
+def relocate_moov(data, moov, insert_at, removed_at):
+    """
+    Rewrite a moov box for a file where it is moved in front of the media.
+
+    Chunk offsets at or after `insert_at` move back by the size of the new
+    moov box, and those after the original moov box also move forward by its
+    old size. 32-bit offset tables are widened to co64 if they overflow.
+
+    Args:
+        data (bytes): Buffer holding the moov box.
+        moov (Box): The moov box in `data`.
+        insert_at (int): File position the moov box is moved to.
+        removed_at (int): Original file position of the moov box.
+
+    Returns:
+        bytes: The new moov box.
+    """
+    old_end = removed_at + moov.size
+    new_size = moov.size
+    use_co64 = False
+    while True:
+        def shift(offset, new_size=new_size):
+            if offset < insert_at:
+                return offset
+            return offset + new_size - (moov.size if offset >= old_end else 0)
+
+        try:
+            moved = _rewrite_offsets(data, moov, shift, use_co64)
+        except _OffsetOverflow:
+            use_co64 = True
+            continue
+        if len(moved) == new_size:
+            return moved
+        new_size = len(moved)
+
+
+def plan_faststart(f):
+    """
+    Plan serving a file with its moov box in front of the media data.
+
+    Nothing is copied: the plan describes the rearranged file as ranges of
+    the original plus the relocated moov box, so it can be streamed and
+    seeked into with read_layout.
+
+    Args:
+        f: Seekable binary file.
+
+    Returns:
+        Layout: The rearranged file, or None if the file already starts with
+            its moov box, has none, or is fragmented.
+    """
+    boxes = list(iter_file_boxes(f))
+    if is_faststart(boxes):
+        return None
+    moov = next((box for box in boxes if box.type == b"moov"), None)
+    mdat = next((box for box in boxes if box.type == b"mdat"), None)
+    if moov is None or mdat is None:
+        return None
+
+    f.seek(moov.offset)
+    data = f.read(moov.size)
+    # A last box may have size 0, running to the end of the file
+    local = read_box_header(data, 0, len(data))
+    if find_box(data, [b"mvex"], local.header_size, local.size) is not None:
+        # Fragment offsets may be absolute, so leave fragmented files alone
+        return None
+
+    moved = relocate_moov(data, local, mdat.offset, moov.offset)
+    moov_end = moov.offset + moov.size
+    file_size = boxes[-1].offset + boxes[-1].size
+    parts = [
+        (0, mdat.offset, None),
+        (0, len(moved), moved),
+        (mdat.offset, moov.offset - mdat.offset, None),
+        (moov_end, file_size - moov_end, None),
+    ]
+    parts = [part for part in parts if part[1]]
+    return Layout(file_size - moov.size + len(moved), parts, moved)
+
+
+def read_layout(f, layout, start, end):
+    """
+    Yield bytes start..end (inclusive) of a file rearranged by plan_faststart.
+    """
+    position = 0
+    for offset, length, data in layout.parts:
+        part_end = position + length
+        if part_end > start and position <= end:
+            first = max(start, position) - position
+            last = min(end + 1, part_end) - position
+            if data is not None:
+                yield data[first:last]
+            else:
+                f.seek(offset + first)
+                remaining = last - first
+                while remaining:
+                    chunk = f.read(min(READ_SIZE, remaining))
+                    if not chunk:
+                        raise MP4Error("File shorter than its layout")
+                    remaining -= len(chunk)
+                    yield chunk
+        position = part_end
+
+
+def _full_box_payload(data, box):
+    # Version and flags precede the fields of a full box
+    return box.offset + box.header_size + 4
+
+
+def _tracks(data, moov):
+    """
+    Yield (handler type, trak box) for every track, such as b"vide" or b"soun".
+    """
+    for trak in iter_boxes(data, moov.offset + moov.header_size, moov.offset + moov.size):
+        if trak.type != b"trak":
+            continue
+        hdlr = find_box(data, [b"mdia", b"hdlr"], trak.offset + trak.header_size, trak.offset + trak.size)
+        if hdlr is not None:
+            yield data[_full_box_payload(data, hdlr) + 4:_full_box_payload(data, hdlr) + 8], trak
+
+
+def _video_track(data, moov):
+    for handler, trak in _tracks(data, moov):
+        if handler == b"vide":
+            return trak
+    return None
+
+
+def _table(data, box, entry_format):
+    """
+    Unpack the entries of a sample table box with an entry count.
+    """
+    start = _full_box_payload(data, box)
+    (count,) = struct.unpack_from(">I", data, start)
+    entry_size = struct.calcsize(">" + entry_format)
+    return [struct.unpack_from(">" + entry_format, data, start + 4 + i * entry_size) for i in range(count)]
+
+
+def sample_index(data, moov=None):
+    """
+    List the samples of the first video track, for keyframe-aware seeking.
+
+    Times are decode times from stts; composition offsets and edit lists are
+    not applied, which is close enough to pick the keyframe before a seek.
+
+    Args:
+        data (bytes): Buffer holding the whole moov box.
+        moov (Box): The moov box in `data`, found by default.
+
+    Returns:
+        list: Sample tuples in decode order, empty without a video track.
+
+    Raises:
+        MP4Error: If the sample tables are missing or malformed.
+    """
+    if moov is None:
+        moov = find_box(data, [b"moov"])
+    if moov is None:
+        raise MP4Error("No moov box")
+
+    trak = _video_track(data, moov)
+    if trak is None:
+        return []
+    return _track_samples(data, trak)
+
+
+def track_index(data, moov=None):
+    """
+    List the samples of every video and audio track.
+
+    Returns:
+        list: (handler type, samples) per track in file order, where the
+            handler type is b"vide" or b"soun" and samples are as returned
+            by sample_index.
+
+    Raises:
+        MP4Error: If the moov box or a track's sample tables are malformed.
+    """
+    if moov is None:
+        moov = find_box(data, [b"moov"])
+    if moov is None:
+        raise MP4Error("No moov box")
+    return [(handler, _track_samples(data, trak)) for handler, trak in _tracks(data, moov) if handler in (b"vide", b"soun")]
+
+
+def window_span(tracks, start, end):
+    """
+    Find the bytes holding the media of a time window.
+
+    Video is taken from the keyframe at or before `start`, so the window
+    decodes on its own, and audio from the same time.
+
+    Args:
+        tracks (list): As returned by track_index.
+        start (float): Window start in seconds.
+        end (float): Window end in seconds, or None for the end of the file.
+
+    Returns:
+        tuple: Inclusive (first, last) byte positions in the file the index
+            was read from, or None if no sample falls in the window.
+    """
+    video = next((samples for handler, samples in tracks if handler == b"vide"), None)
+    if video:
+        # The first video sample is a keyframe in any playable file
+        index = bisect.bisect_right([sample.time for sample in video], start) - 1
+        while index > 0 and not video[index].keyframe:
+            index -= 1
+        start = video[max(index, 0)].time
+
+    first = last = None
+    for _, samples in tracks:
+        times = [sample.time for sample in samples]
+        # The sample playing at `start` is needed too
+        lo = max(0, bisect.bisect_right(times, start) - 1)
+        hi = bisect.bisect_left(times, end) if end is not None else len(samples)
+        for sample in samples[lo:hi]:
+            if first is None or sample.offset < first:
+                first = sample.offset
+            if last is None or sample.offset + sample.size - 1 > last:
+                last = sample.offset + sample.size - 1
+    if first is None:
+        return None
+    return first, last
+
+
+def _track_samples(data, trak):
+    try:
+        start, end = trak.offset + trak.header_size, trak.offset + trak.size
+        mdhd = find_box(data, [b"mdia", b"mdhd"], start, end)
+        stbl = find_box(data, [b"mdia", b"minf", b"stbl"], start, end)
+        if mdhd is None or stbl is None:
+            raise MP4Error("Track without sample tables")
+
+        mdhd_fields = _full_box_payload(data, mdhd)
+        version = data[mdhd_fields - 4]
+        (timescale,) = struct.unpack_from(">I", data, mdhd_fields + (16 if version == 1 else 8))
+
+        tables = {box.type: box for box in iter_boxes(data, stbl.offset + stbl.header_size, stbl.offset + stbl.size)}
+        chunk_table = tables.get(b"stco") or tables.get(b"co64")
+        if not all(name in tables for name in (b"stts", b"stsc", b"stsz")) or chunk_table is None:
+            raise MP4Error("Incomplete sample tables")
+
+        stsz_fields = _full_box_payload(data, tables[b"stsz"])
+        uniform_size, count = struct.unpack_from(">II", data, stsz_fields)
+        if uniform_size:
+            sizes = [uniform_size] * count
+        else:
+            sizes = struct.unpack_from(f">{count}I", data, stsz_fields + 8)
+
+        chunk_offsets = [entry[0] for entry in _table(data, chunk_table, "Q" if chunk_table.type == b"co64" else "I")]
+        keyframes = None
+        if b"stss" in tables:
+            # Sample numbers are 1-based; without stss every sample is a keyframe
+            keyframes = {entry[0] - 1 for entry in _table(data, tables[b"stss"], "I")}
+
+        offsets = []
+        runs = _table(data, tables[b"stsc"], "III")
+        for i, (first_chunk, samples_per_chunk, _) in enumerate(runs):
+            last_chunk = runs[i + 1][0] if i + 1 < len(runs) else len(chunk_offsets) + 1
+            for chunk in range(first_chunk, last_chunk):
+                offset = chunk_offsets[chunk - 1]
+                for _ in range(samples_per_chunk):
+                    if len(offsets) == count:
+                        break
+                    offsets.append(offset)
+                    offset += sizes[len(offsets) - 1]
+
+        samples = []
+        decode_time = 0
+        for sample_count, delta in _table(data, tables[b"stts"], "II"):
+            for _ in range(sample_count):
+                index = len(samples)
+                if index >= len(offsets):
+                    break
+                keyframe = keyframes is None or index in keyframes
+                samples.append(Sample(decode_time / timescale, offsets[index], sizes[index], keyframe))
+                decode_time += delta
+    except (struct.error, IndexError) as error:
+        raise MP4Error(f"Malformed sample tables: {error}") from error
+    return samples
+
+
+def keyframe_index(data, moov=None):
+    """
+    Return (time, byte offset) of every keyframe of the first video track.
+    """
+    return [(sample.time, sample.offset) for sample in sample_index(data, moov) if sample.keyframe]
@@ -0,0 +1,123 @@
+import functools
+import hashlib
+import os
+import re
+
+# Static player assets live next to this module
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend")
+
+# Compiled assets served by Streamlit's component handler
+BUILD_DIR = os.path.join(FRONTEND_DIR, "build")
+
+# Scripts the player loads by URL, such as Web Workers. Their hashed names are
+# substituted for "@@<name>@@" placeholders in player.js.
+WORKER_SCRIPTS = ("zip_worker.js", "reel_worker.js", "tracking_worker.js")
+
+# Scripts that must keep a stable URL, such as service workers
+STATIC_SCRIPTS = ("clip_sw.js",)
+
+_CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+_CSS_SPACE_RE = re.compile(r"\s*([{};:,>])\s*")
+
+
+def _read_asset(name):
+    with open(os.path.join(FRONTEND_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def _write_if_changed(path, content):
+    try:
+        with open(path, encoding="utf-8") as f:
+            if f.read() == content:
+                return
+    except OSError:
+        pass
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def minify_css(css):
+    """
+    Strip comments and redundant whitespace from a stylesheet.
+    """
+    css = _CSS_COMMENT_RE.sub("", css)
+    css = " ".join(css.split())
+    css = _CSS_SPACE_RE.sub(r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+def minify_js(js):
+    """
+    Conservatively shrink a script: indentation, blank lines and whole-line
+    comments are removed, but line breaks are kept so automatic semicolon
+    insertion and string contents are never affected.
+    """
+    lines = []
+    for line in js.splitlines():
+        line = line.strip()
+        if not line or line.startswith("//"):
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def hashed_name(name, content):
+    """
+    Return a file name carrying a hash of its content, e.g. player.1a2b3c4d5e6f.js.
+    """
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+    return f"{stem}.{digest}{ext}"
+
+
+@functools.lru_cache(maxsize=None)
+def build_frontend():
+    """
+    Compile the player into a directory Streamlit can serve as a component.
+
+    CSS and JS are minified and written under content-hashed names. Streamlit
+    serves index.html with "Cache-Control: no-cache" and every other asset as
+    cacheable, so browsers keep the player code until it actually changes.
+    This runs once per process.
+
+    Returns:
+        str: Path of the build directory.
+    """
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    current = {"index.html"}
+
+    def emit(name, content):
+        filename = hashed_name(name, content)
+        _write_if_changed(os.path.join(BUILD_DIR, filename), content)
+        current.add(filename)
+        return filename
+
+    for name in STATIC_SCRIPTS:
+        _write_if_changed(os.path.join(BUILD_DIR, name), minify_js(_read_asset(name)))
+        current.add(name)
+
+    script = _read_asset("player.js")
+    for name in WORKER_SCRIPTS:
+        filename = emit(name, minify_js(_read_asset(name)))
+        script = script.replace(f"@@{name}@@", filename)
+
+    assets = {
+        "@@STYLE@@": emit("player.css", minify_css(_read_asset("player.css"))),
+        "@@SCRIPT@@": emit("player.js", minify_js(script)),
+    }
+
+    page = _read_asset("player.html")
+    for placeholder, filename in assets.items():
+        page = page.replace(placeholder, filename)
+
+    page = "\n".join(line.strip() for line in page.splitlines() if line.strip())
+    _write_if_changed(os.path.join(BUILD_DIR, "index.html"), page)
+
+    # Drop assets left behind by earlier builds
+    for filename in os.listdir(BUILD_DIR):
+        if filename not in current:
+            os.remove(os.path.join(BUILD_DIR, filename))
+
+    return BUILD_DIR
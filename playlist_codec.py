@@ -0,0 +1,96 @@
+import base64
+import json
+import zlib
+
+from typed_arrays import _le_bytes
+
+# Version of the compact format, checked by the player
+FORMAT_VERSION = 1
+
+# Smallest typed array able to hold each index, as (array typecode, JS type)
+_INDEX_TYPES = (("B", "u8", 0xFF), ("H", "u16", 0xFFFF), ("I", "u32", 0xFFFFFFFF))
+
+
+def _column(values, typecode, js_type):
+    return {"type": js_type, "data": base64.b64encode(_le_bytes(values, typecode)).decode("ascii")}
+
+
+def _index_column(indexes, table_size):
+    for typecode, js_type, limit in _INDEX_TYPES:
+        if table_size <= limit:
+            return _column(indexes, typecode, js_type)
+    raise ValueError("Table too large for a compact playlist")
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def encode_playlist(video_dict, compress=False):
+    """
+    Encode a playlist in the compact form the player decodes lazily.
+
+    Clip URLs are split into a directory prefix, a file name and a query
+    string. Prefixes and query strings go into shared tables referenced by
+    typed index arrays, since a season of clips usually comes from a handful
+    of CDN paths. Fields that are numbers in every clip that has them, such
+    as start, end or duration, are stored as Float64 columns with NaN for
+    clips without the field; any other field is kept as a JSON list.
+
+    Args:
+        video_dict (dict): Playlist in the format video_stream_player takes.
+        compress (bool): Also deflate the encoded playlist. Worth it for large
+            playlists; the player inflates it with DecompressionStream.
+
+    Returns:
+        dict: The encoded playlist, ready to pass as a component argument.
+    """
+    clips = list(video_dict.values())
+    prefixes = {}
+    queries = {}
+    prefix_ids = []
+    query_ids = []
+    names = []
+    for clip in clips:
+        base, mark, query = clip["url"].partition("?")
+        head, slash, name = base.rpartition("/")
+        prefix_ids.append(prefixes.setdefault(head + slash, len(prefixes)))
+        query_ids.append(queries.setdefault(mark + query, len(queries)))
+        names.append(name)
+
+    fields = []
+    for clip in clips:
+        for field in clip:
+            if field != "url" and field not in fields:
+                fields.append(field)
+
+    numbers = {}
+    values = {}
+    for field in fields:
+        column = [clip.get(field) for clip in clips]
+        if all(value is None or _is_number(value) for value in column):
+            numbers[field] = _column([float("nan") if value is None else value for value in column], "d", "f64")
+        else:
+            values[field] = column
+
+    encoded = {
+        "format": "compact",
+        "version": FORMAT_VERSION,
+        "keys": list(video_dict),
+        "prefixes": list(prefixes),
+        "queries": list(queries),
+        "prefix": _index_column(prefix_ids, len(prefixes)),
+        "query": _index_column(query_ids, len(queries)),
+        "names": names,
+        "numbers": numbers,
+        "values": values,
+    }
+    if not compress:
+        return encoded
+
+    body = zlib.compress(json.dumps(encoded, separators=(",", ":")).encode("utf-8"), 9)
+    return {
+        "format": "compact",
+        "version": FORMAT_VERSION,
+        "deflate": base64.b64encode(body).decode("ascii"),
+    }
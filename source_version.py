@@ -0,0 +1,46 @@
+import collections
+import urllib.request
+
+SourceVersion = collections.namedtuple("SourceVersion", ["validator", "size", "content_type", "ranges"])
+SourceVersion.__doc__ = """
+What identifies the current content of a URL. validator is the ETag, or the
+Last-Modified date and size, and None when the server sends neither, so
+versions cannot be told apart; size is None when unknown, and ranges says
+whether the server answered a Range request.
+"""
+
+
+def response_version(response):
+    """
+    Read the SourceVersion of a response to a GET, ranged or not.
+    """
+    headers = response.headers
+    if response.status == 206:
+        total = headers.get("Content-Range", "").rpartition("/")[2]
+        size = int(total) if total.isdigit() else None
+    else:
+        length = headers.get("Content-Length", "")
+        size = int(length) if length.isdigit() else None
+
+    validator = headers.get("ETag")
+    if not validator and headers.get("Last-Modified"):
+        validator = f"{headers['Last-Modified']}/{size}"
+    content_type = headers.get("Content-Type", "application/octet-stream")
+    return SourceVersion(validator, size, content_type, response.status == 206)
+
+
+def read_version(url, timeout=30, user_agent="video-stream-player"):
+    """
+    Ask a server for the SourceVersion of a URL with a one-byte ranged GET.
+
+    Some servers answer HEAD differently from GET, or not at all, so the
+    request is the GET the content would be read with. A server that ignores
+    the Range header starts sending the whole body, which is closed unread.
+
+    Raises:
+        urllib.error.URLError: If the URL cannot be fetched, including
+            HTTPError for error statuses.
+    """
+    request = urllib.request.Request(url, headers={"Range": "bytes=0-0", "User-Agent": user_agent})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response_version(response)
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from samples import SLOW_SECONDS, clip_body
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _ClipHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in clip host.
+
+    /clip/<size> serves a body with Range support, /slow/<size> waits first,
+    /broken/<size> stops half way but can be resumed, /broken-norange/<size>
+    stops half way and ignores Range, /file/<name> serves a body a test put
+    in `files`, with an ETag. Anything else is a 404. Every request's path
+    and Range header are kept in `requests`.
+    """
+
+    protocol_version = "HTTP/1.1"
+    files = {}
+    requests = []
+
+    def do_GET(self):
+        type(self).requests.append((self.path, self.headers.get("Range")))
+        name = self.path[len("/file/"):] if self.path.startswith("/file/") else None
+        if name in self.files:
+            kind, body = "file", self.files[name]
+        else:
+            match = re.match(r"^/(clip|slow|broken|broken-norange)/(\d+)$", self.path)
+            if match is None:
+                self.send_error(404)
+                return
+            kind, body = match.group(1), clip_body(int(match.group(2)))
+        if kind == "slow":
+            time.sleep(SLOW_SECONDS)
+
+        size = len(body)
+        range_match = re.match(r"^bytes=(\d+)-(\d*)$", self.headers.get("Range", ""))
+        if range_match and kind != "broken-norange":
+            start = int(range_match.group(1))
+            end = min(int(range_match.group(2) or size - 1), size - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.send_header("Content-Length", str(end - start + 1))
+            self._send_etag(kind, body)
+            self.end_headers()
+            self.wfile.write(body[start:end + 1])
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(size))
+        self._send_etag(kind, body)
+        self.end_headers()
+        if kind.startswith("broken"):
+            self.wfile.write(body[: size // 2])
+            self.close_connection = True
+        else:
+            self.wfile.write(body)
+
+    def _send_etag(self, kind, body):
+        if kind == "file":
+            self.send_header("ETag", '"' + hashlib.sha256(body).hexdigest()[:16] + '"')
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def clip_host():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _ClipHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def clip_file(clip_host):
+    """
+    Serve bytes from the clip host: call it with a file name and a body to
+    get the file's URL. Requests made during the test are in the returned
+    function's `requests` list.
+    """
+    _ClipHandler.requests.clear()
+
+    def serve(name, body):
+        _ClipHandler.files[name] = body
+        return f"{clip_host}/file/{name}"
+
+    serve.requests = _ClipHandler.requests
+    yield serve
+    _ClipHandler.files.clear()
@@ -0,0 +1,82 @@
+import struct
+
+# Delay of the stand-in clip host's /slow/ clips, in seconds
+SLOW_SECONDS = 0.3
+
+# Sizes of the synthetic MP4's video samples, one sample per chunk
+SAMPLE_SIZES = (300, 120, 80, 500, 40)
+
+# What probing the synthetic MP4 should find
+DURATION = 0.5
+WIDTH = 1280
+HEIGHT = 720
+CODEC = "avc1.640028"
+
+
+def clip_body(size):
+    return bytes(i % 251 for i in range(size))
+
+
+def box(box_type, payload, size=None):
+    return struct.pack(">I4s", 8 + len(payload) if size is None else size, box_type) + payload
+
+
+def full_box(box_type, payload):
+    # Version 0, no flags
+    return box(box_type, b"\0\0\0\0" + payload)
+
+
+def moov_box(chunk_offsets, co64=False, size=None):
+    """
+    Build a moov box with one H.264 track whose samples sit at chunk_offsets.
+    """
+    count = len(SAMPLE_SIZES)
+    if co64:
+        chunks = full_box(b"co64", struct.pack(f">I{count}Q", count, *chunk_offsets))
+    else:
+        chunks = full_box(b"stco", struct.pack(f">I{count}I", count, *chunk_offsets))
+    avcc = box(b"avcC", bytes.fromhex("01640028ffe1"))
+    sample_entry = box(b"avc1", bytes(78) + avcc)
+    stbl = box(b"stbl", b"".join([
+        full_box(b"stsd", struct.pack(">I", 1) + sample_entry),
+        full_box(b"stts", struct.pack(">III", 1, count, 100)),
+        full_box(b"stss", struct.pack(">II", 1, 1)),
+        full_box(b"stsc", struct.pack(">IIII", 1, 1, 1, 1)),
+        full_box(b"stsz", struct.pack(f">II{count}I", 0, count, *SAMPLE_SIZES)),
+        chunks,
+    ]))
+    mdia = box(b"mdia", b"".join([
+        full_box(b"mdhd", struct.pack(">IIIIHH", 0, 0, 1000, 100 * count, 0, 0)),
+        full_box(b"hdlr", struct.pack(">I4s12x", 0, b"vide") + b"\0"),
+        box(b"minf", stbl),
+    ]))
+    # Width and height are 16.16 fixed point at the end of tkhd
+    tkhd = full_box(b"tkhd", bytes(72) + struct.pack(">II", WIDTH << 16, HEIGHT << 16))
+    mvhd = full_box(b"mvhd", struct.pack(">IIII", 0, 0, 1000, int(DURATION * 1000)) + bytes(80))
+    return box(b"moov", mvhd + box(b"trak", tkhd + mdia), size=size)
+
+
+def sample_bodies():
+    return [bytes([index + 1]) * size for index, size in enumerate(SAMPLE_SIZES)]
+
+
+def mp4_clip(co64=False, moov_size_zero=False, padding=0):
+    """
+    Build a clip with its moov box after the media, as cameras write them.
+
+    Args:
+        co64 (bool): Use 64-bit chunk offsets.
+        moov_size_zero (bool): Give moov size 0, meaning it runs to the end
+            of the file.
+        padding (int): Bytes added after the samples, to push moov further
+            from the start.
+    """
+    ftyp = box(b"ftyp", b"isom\0\0\0\0isomavc1")
+    mdat = box(b"mdat", b"".join(sample_bodies()) + bytes(padding))
+    offsets = []
+    position = len(ftyp) + 8
+    for size in SAMPLE_SIZES:
+        offsets.append(position)
+        position += size
+    moov = moov_box(offsets, co64=co64, size=0 if moov_size_zero else None)
+    return ftyp + mdat + moov
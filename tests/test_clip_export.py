@@ -0,0 +1,142 @@
+import http.client
+import io
+import json
+import threading
+import time
+import zipfile
+
+import pytest
+
+from clip_export import ERRORS_NAME, ExportServer, stream_zip
+from samples import SLOW_SECONDS, clip_body
+
+
+@pytest.fixture()
+def export_server():
+    server = ExportServer(("127.0.0.1", 0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _zip(clips, **kwargs):
+    return zipfile.ZipFile(io.BytesIO(b"".join(stream_zip(clips, **kwargs))))
+
+
+def test_skips_clips_that_cannot_be_fetched(clip_host):
+    archive = _zip([("a.mp4", clip_host + "/clip/1000"), ("b.mp4", clip_host + "/missing")])
+    assert archive.testzip() is None
+    assert archive.namelist() == ["a.mp4", ERRORS_NAME]
+    assert archive.read("a.mp4") == clip_body(1000)
+    assert "b.mp4: HTTP Error 404" in archive.read(ERRORS_NAME).decode()
+
+
+def test_resumes_a_body_that_stops_part_way(clip_host):
+    archive = _zip([("a.mp4", clip_host + "/broken/100000"), ("b.mp4", clip_host + "/clip/10")])
+    assert archive.testzip() is None
+    assert archive.read("a.mp4") == clip_body(100000)
+    assert archive.read("b.mp4") == clip_body(10)
+    assert ERRORS_NAME not in archive.namelist()
+
+
+def test_leaves_out_a_body_that_cannot_be_resumed(clip_host):
+    archive = _zip([("a.mp4", clip_host + "/broken-norange/100000"), ("b.mp4", clip_host + "/clip/10")])
+    assert archive.testzip() is None
+    assert archive.namelist() == ["b.mp4", ERRORS_NAME]
+    assert archive.read("b.mp4") == clip_body(10)
+    assert "a.mp4: stopped after 50000 bytes" in archive.read(ERRORS_NAME).decode()
+
+
+def test_opens_clip_requests_in_parallel(clip_host):
+    clips = [(f"{i}.mp4", clip_host + "/slow/100") for i in range(4)]
+    started = time.monotonic()
+    archive = _zip(clips, concurrency=4)
+    elapsed = time.monotonic() - started
+    assert len(archive.namelist()) == 4
+    assert elapsed < 2 * SLOW_SECONDS
+
+
+def test_streams_an_export_request(clip_host, export_server):
+    connection = http.client.HTTPConnection("127.0.0.1", export_server.server_address[1])
+    body = json.dumps([{"name": "a.mp4", "url": clip_host + "/clip/5000"}])
+    connection.request("POST", "/", body, {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    assert response.status == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.read()))
+    assert archive.read("a.mp4") == clip_body(5000)
+
+
+@pytest.mark.parametrize("body", [b"\xff\xfe\xfd", b"{not json", b'{"clips": 3}'])
+def test_rejects_malformed_export_requests(export_server, body):
+    connection = http.client.HTTPConnection("127.0.0.1", export_server.server_address[1])
+    connection.request("POST", "/", body, {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    response.read()
+    assert response.status == 400
+
+
+def test_rejects_job_requests_that_are_not_utf8(export_server):
+    connection = http.client.HTTPConnection("127.0.0.1", export_server.server_address[1])
+    connection.request("POST", "/jobs", b"\xff\xfe\xfd", {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    response.read()
+    assert response.status == 400
+
+
+def test_reports_a_missing_job_queue(export_server):
+    connection = http.client.HTTPConnection("127.0.0.1", export_server.server_address[1])
+    connection.request("GET", "/jobs")
+    response = connection.getresponse()
+    assert response.status == 200
+    assert json.loads(response.read()) == {"jobs": False}
+
+    body = json.dumps({"clips": [{"url": "http://127.0.0.1/clip.mp4", "start": 1, "end": 2}]})
+    connection.request("POST", "/jobs", body, {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    response.read()
+    # The player falls back to cutting or joining in the browser on this answer
+    assert response.status == 404
+
+
+class _SlowCuts:
+    """
+    Stand-in JobQueue whose cuts take CUT_SECONDS and yield a fixed file.
+    """
+
+    CUT_SECONDS = 1.0
+
+    def __init__(self, path):
+        self.path = path
+
+    def cut(self, segment):
+        time.sleep(self.CUT_SECONDS)
+        return self.path
+
+    def release(self, path):
+        pass
+
+
+def test_streams_before_windowed_clips_are_cut(clip_host, tmp_path):
+    cut_path = tmp_path / "cut.mp4"
+    cut_path.write_bytes(clip_body(300))
+    server = ExportServer(("127.0.0.1", 0), jobs=_SlowCuts(str(cut_path)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+        body = json.dumps([
+            {"name": "a.mp4", "url": clip_host + "/clip/5000"},
+            {"name": "b.mp4", "url": clip_host + "/clip/100000", "start": 1, "end": 2},
+        ])
+        started = time.monotonic()
+        connection.request("POST", "/", body, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        first = response.read(1)
+        assert time.monotonic() - started < _SlowCuts.CUT_SECONDS
+
+        archive = zipfile.ZipFile(io.BytesIO(first + response.read()))
+        assert archive.read("a.mp4") == clip_body(5000)
+        assert archive.read("b.mp4") == clip_body(300)
+    finally:
+        server.shutdown()
+        server.server_close()
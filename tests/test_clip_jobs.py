@@ -0,0 +1,91 @@
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from clip_jobs import JobError, JobQueue, Segment
+from mp4_parser import parse_movie
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="JobQueue needs ffmpeg")
+
+# Length of the test source in seconds; it has a keyframe every second
+SOURCE_SECONDS = 6
+
+
+@pytest.fixture(scope="module")
+def source_mp4(tmp_path_factory):
+    path = tmp_path_factory.mktemp("source") / "source.mp4"
+    subprocess.run(
+        [
+            "ffmpeg", "-v", "error", "-f", "lavfi",
+            "-i", f"testsrc=duration={SOURCE_SECONDS}:size=320x240:rate=25",
+            "-c:v", "mpeg4", "-g", "25", str(path),
+        ],
+        check=True,
+    )
+    return path.read_bytes()
+
+
+@pytest.fixture()
+def queue(tmp_path):
+    jobs = JobQueue(str(tmp_path / "jobs"), workers=2)
+    yield jobs
+    jobs.close()
+
+
+def _duration(path):
+    with open(path, "rb") as f:
+        return parse_movie(f.read()).duration
+
+
+def _wait(queue, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while queue.status(job_id)["state"] in ("queued", "running"):
+        assert time.monotonic() < deadline
+        time.sleep(0.1)
+    return queue.status(job_id)
+
+
+def test_cuts_a_segment_from_the_keyframe_before_its_start(queue, clip_file, source_mp4):
+    url = clip_file("source.mp4", source_mp4)
+    path = queue.cut(Segment(url, 2.5, 4))
+    try:
+        # Up to one GOP early
+        assert 1.5 <= _duration(path) <= 2.6
+    finally:
+        queue.release(path)
+
+
+def test_joins_segments_into_one_video(queue, clip_file, source_mp4):
+    url = clip_file("source.mp4", source_mp4)
+    segments = [Segment(url, 0, 2), Segment(url, 3, 5)]
+    job_id = queue.submit(segments)
+    assert queue.submit(segments) == job_id
+
+    status = _wait(queue, job_id)
+    assert status["state"] == "done" and status["progress"] == 1.0
+    assert 3.5 <= _duration(queue.result_path(job_id)) <= 4.6
+
+
+def test_keeps_leased_files_when_evicting(tmp_path, clip_file, source_mp4):
+    url = clip_file("source.mp4", source_mp4)
+    queue = JobQueue(str(tmp_path / "jobs"), workers=1, max_bytes=1)
+    try:
+        path = queue.cut(Segment(url, 0, 2))
+        # A job finishing while the cut is read evicts everything but the cut
+        job_id = queue.submit([Segment(url, 3, 5)])
+        assert _wait(queue, job_id)["state"] == "done"
+        assert os.path.exists(path)
+
+        queue.release(path)
+        queue._evict()
+        assert not os.path.exists(path)
+    finally:
+        queue.close()
+
+
+def test_refuses_jobs_whose_source_is_missing(queue, clip_host):
+    with pytest.raises(JobError, match="HTTP 404"):
+        queue.submit([Segment(clip_host + "/missing", 0, 1)])
@@ -0,0 +1,47 @@
+import pytest
+
+from clip_probe import HEAD_BYTES, ClipInfo, probe_clip, probe_playlist
+from samples import CODEC, DURATION, HEIGHT, WIDTH, mp4_clip
+
+
+@pytest.mark.parametrize("moov_size_zero", [False, True])
+def test_reads_a_moov_box_at_the_end_of_the_clip(clip_file, moov_size_zero):
+    body = mp4_clip(moov_size_zero=moov_size_zero, padding=4 * HEAD_BYTES)
+    url = clip_file("tail.mp4", body)
+    assert probe_clip(url) == ClipInfo(url, len(body), DURATION, CODEC, WIDTH, HEIGHT, None)
+    # The head, then the moov header and the moov box; never the media
+    assert len(clip_file.requests) == 3
+
+
+def test_gives_clips_it_cannot_parse_empty_metadata(clip_host):
+    url = clip_host + "/clip/5000"
+    assert probe_clip(url) == ClipInfo(url, 5000, None, None, None, None, None)
+
+
+def test_reports_clips_that_cannot_be_fetched(clip_host):
+    url = clip_host + "/missing"
+    assert probe_clip(url) == ClipInfo(url, None, None, None, None, None, "HTTP 404")
+
+
+def test_reuses_cached_results_of_unchanged_clips(clip_file, tmp_path):
+    url = clip_file("a.mp4", mp4_clip())
+    playlist = {"A": {"url": url}}
+    cache_path = str(tmp_path / "probes.sqlite3")
+    first = probe_playlist(playlist, cache_path=cache_path)
+    assert first == {"A": {"url": url, "duration": DURATION, "size": len(mp4_clip()),
+                           "width": WIDTH, "height": HEIGHT, "codecs": CODEC}}
+
+    clip_file.requests.clear()
+    assert probe_playlist(playlist, cache_path=cache_path) == first
+    # Only the validator request; the head is not downloaded again
+    assert clip_file.requests == [("/file/a.mp4", "bytes=0-0")]
+
+    clip_file("a.mp4", mp4_clip(co64=True))
+    clip_file.requests.clear()
+    probe_playlist(playlist, cache_path=cache_path)
+    assert len(clip_file.requests) == 2
+
+
+def test_marks_missing_clips_in_a_playlist(clip_host):
+    playlist = {"A": {"url": clip_host + "/missing", "start": 3}}
+    assert probe_playlist(playlist) == {"A": {"url": clip_host + "/missing", "start": 3, "error": "HTTP 404"}}
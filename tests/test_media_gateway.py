@@ -0,0 +1,139 @@
+import asyncio
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+
+import pytest
+
+import media_gateway
+from media_gateway import MediaGateway
+from samples import clip_body
+
+
+class _Origin(BaseHTTPRequestHandler):
+    """
+    Stand-in origin serving one clip whose content the tests can change.
+    """
+
+    protocol_version = "HTTP/1.1"
+    body = b"version 1"
+    etag = '"1"'
+    requests = []
+
+    def do_GET(self):
+        type(self).requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.send_header("ETag", self.etag)
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture()
+def origin():
+    _Origin.body, _Origin.etag, _Origin.requests = b"version 1", '"1"', []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Origin)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/clip.mp4"
+    server.shutdown()
+    server.server_close()
+
+
+def _get(gateway, url, headers=(), messages=None):
+    """
+    Run one GET through the ASGI app and return (status, body). The messages
+    it sends are appended to `messages` when given.
+    """
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "query_string": ("url=" + quote(url, safe="")).encode(),
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+        "extensions": {},
+    }
+    messages = [] if messages is None else messages
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(gateway(scope, receive, send))
+    status = next(m["status"] for m in messages if m["type"] == "http.response.start")
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    return status, body
+
+
+def _unused_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_revalidates_cached_clips_with_their_etag(origin, tmp_path, monkeypatch):
+    gateway = MediaGateway(str(tmp_path), faststart=False)
+    assert _get(gateway, origin) == (200, b"version 1")
+    assert _get(gateway, origin) == (200, b"version 1")
+    assert _Origin.requests == [None]
+
+    monkeypatch.setattr(media_gateway, "REVALIDATE_SECONDS", 0)
+    assert _get(gateway, origin) == (200, b"version 1")
+    assert _Origin.requests == [None, '"1"']
+
+    _Origin.body, _Origin.etag = b"version 2", '"2"'
+    assert _get(gateway, origin) == (200, b"version 2")
+
+
+def test_serves_cached_clips_while_the_origin_is_down(origin, tmp_path, monkeypatch):
+    gateway = MediaGateway(str(tmp_path), faststart=False)
+    assert _get(gateway, origin) == (200, b"version 1")
+
+    monkeypatch.setattr(media_gateway, "REVALIDATE_SECONDS", 0)
+    monkeypatch.setattr(media_gateway, "_open_origin", _refuse)
+    assert _get(gateway, origin) == (200, b"version 1")
+
+
+def test_answers_502_when_a_proxied_origin_is_unreachable(tmp_path):
+    gateway = MediaGateway(str(tmp_path))
+    url = f"http://127.0.0.1:{_unused_port()}/clip.mp4"
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(gateway._proxy(url, "GET", {}, send))
+    assert sent[0]["status"] == 502
+    assert _get(gateway, url)[0] == 502
+
+
+def _refuse(*args, **kwargs):
+    raise ConnectionRefusedError("origin down")
+
+
+def test_ends_the_body_when_a_source_breaks_off(clip_host, tmp_path, monkeypatch):
+    # Sources over max_object_bytes are read in blocks; the second one fails
+    monkeypatch.setattr(media_gateway, "BLOCK_SIZE", 1000)
+    open_origin = media_gateway._open_origin
+
+    def first_block_only(url, headers=None, timeout=30):
+        if headers and not headers.get("Range", "").startswith("bytes=0-"):
+            raise ConnectionResetError("origin dropped")
+        return open_origin(url, headers, timeout)
+
+    monkeypatch.setattr(media_gateway, "_open_origin", first_block_only)
+    gateway = MediaGateway(str(tmp_path), max_object_bytes=100)
+    messages = []
+    assert _get(gateway, clip_host + "/clip/5000", messages=messages) == (200, clip_body(1000))
+    assert messages[-1]["more_body"] is False
@@ -0,0 +1,56 @@
+import io
+import struct
+
+import pytest
+
+from mp4_parser import find_box, iter_boxes, plan_faststart, read_layout, relocate_moov, track_index
+from samples import SAMPLE_SIZES, moov_box, mp4_clip, sample_bodies
+
+
+def _sample_bytes(data):
+    [(_, samples)] = track_index(data)
+    return [data[sample.offset:sample.offset + sample.size] for sample in samples]
+
+
+@pytest.mark.parametrize("co64", [False, True])
+@pytest.mark.parametrize("moov_size_zero", [False, True])
+def test_moves_moov_in_front_of_the_media(co64, moov_size_zero):
+    original = mp4_clip(co64=co64, moov_size_zero=moov_size_zero)
+    f = io.BytesIO(original)
+    layout = plan_faststart(f)
+
+    moved = b"".join(read_layout(f, layout, 0, layout.size - 1))
+    assert len(moved) == layout.size
+    assert [box.type for box in iter_boxes(moved)] == [b"ftyp", b"moov", b"mdat"]
+    assert find_box(moved, [b"moov", b"trak", b"mdia", b"minf", b"stbl", b"co64" if co64 else b"stco"])
+    assert _sample_bytes(moved) == sample_bodies()
+
+
+def test_reads_any_range_of_a_layout():
+    f = io.BytesIO(mp4_clip())
+    layout = plan_faststart(f)
+    moved = b"".join(read_layout(f, layout, 0, layout.size - 1))
+    for start, end in [(0, 0), (0, 99), (30, len(layout.moov) + 50), (layout.size - 10, layout.size - 1)]:
+        assert b"".join(read_layout(f, layout, start, end)) == moved[start:end + 1]
+
+
+def test_leaves_faststart_clips_alone():
+    f = io.BytesIO(mp4_clip())
+    layout = plan_faststart(f)
+    moved = b"".join(read_layout(f, layout, 0, layout.size - 1))
+    assert plan_faststart(io.BytesIO(moved)) is None
+
+
+def test_widens_chunk_offsets_that_no_longer_fit_32_bits():
+    # Media just below 4 GiB, behind a moov box that moves in front of it
+    offsets = [0xFFFFFF00 + 10 * index for index in range(len(SAMPLE_SIZES))]
+    data = moov_box(offsets)
+    moov = find_box(data, [b"moov"])
+
+    moved = relocate_moov(data, moov, insert_at=0, removed_at=0x100000000)
+    stbl = [b"moov", b"trak", b"mdia", b"minf", b"stbl"]
+    assert find_box(moved, stbl + [b"stco"]) is None
+    co64 = find_box(moved, stbl + [b"co64"])
+    count = len(SAMPLE_SIZES)
+    shifted = struct.unpack_from(f">{count}Q", moved, co64.offset + co64.header_size + 8)
+    assert list(shifted) == [offset + len(moved) for offset in offsets]
@@ -0,0 +1,77 @@
+import base64
+import json
+import math
+import sys
+import zlib
+from array import array
+
+import pytest
+
+from playlist_codec import FORMAT_VERSION, encode_playlist
+
+# array typecodes of the player's typed arrays
+_TYPECODES = {"u8": "B", "u16": "H", "u32": "I", "f64": "d"}
+
+
+def _decode_column(column):
+    values = array(_TYPECODES[column["type"]], base64.b64decode(column["data"]))
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _decode(payload):
+    """
+    Decode a compact playlist into plain clips, as the player's toJSON does.
+    """
+    assert payload["format"] == "compact" and payload["version"] == FORMAT_VERSION
+    if "deflate" in payload:
+        payload = json.loads(zlib.decompress(base64.b64decode(payload["deflate"])))
+
+    prefix = _decode_column(payload["prefix"])
+    query = _decode_column(payload["query"])
+    numbers = {field: _decode_column(column) for field, column in payload["numbers"].items()}
+    playlist = {}
+    for i, key in enumerate(payload["keys"]):
+        clip = {"url": payload["prefixes"][prefix[i]] + payload["names"][i] + payload["queries"][query[i]]}
+        clip.update((field, column[i]) for field, column in numbers.items() if not math.isnan(column[i]))
+        clip.update((field, column[i]) for field, column in payload["values"].items() if column[i] is not None)
+        playlist[key] = clip
+    return playlist
+
+
+PLAYLIST = {
+    "Goal 1": {"url": "https://cdn.example.com/season/match1/goal1.mp4?token=a", "start": 12.5, "end": 30},
+    "Goal 2": {"url": "https://cdn.example.com/season/match1/goal2.mp4?token=a", "duration": 41.25},
+    "Save": {"url": "https://cdn.example.com/season/match2/save.mp4", "codecs": "avc1.640028, mp4a.40.2"},
+    "Corner": {
+        "url": "https://other.example.com/corner.mp4?token=b",
+        "start": 0,
+        "events": [{"time": 3.5, "label": "Corner"}],
+    },
+}
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_round_trips_a_playlist(compress):
+    assert _decode(encode_playlist(PLAYLIST, compress=compress)) == PLAYLIST
+
+
+def test_shares_url_prefixes_and_queries():
+    encoded = encode_playlist(PLAYLIST)
+    assert encoded["prefixes"] == [
+        "https://cdn.example.com/season/match1/",
+        "https://cdn.example.com/season/match2/",
+        "https://other.example.com/",
+    ]
+    assert encoded["queries"] == ["?token=a", "", "?token=b"]
+    assert set(encoded["numbers"]) == {"start", "end", "duration"}
+    assert set(encoded["values"]) == {"codecs", "events"}
+
+
+def test_widens_index_columns_for_large_tables():
+    playlist = {f"Clip {i}": {"url": f"https://cdn.example.com/{i}/clip.mp4"} for i in range(300)}
+    encoded = encode_playlist(playlist)
+    assert encoded["prefix"]["type"] == "u16"
+    assert encoded["query"]["type"] == "u8"
+    assert _decode(encoded) == playlist
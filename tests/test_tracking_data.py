@@ -0,0 +1,61 @@
+import struct
+import sys
+from array import array
+
+from tracking_data import AWAY, BALL, FORMAT_VERSION, HOME, MAGIC, TrackedObject, encode_tracking, write_tracking
+
+HEADER_SIZE = 16
+
+
+def _decode(data):
+    """
+    Decode a tracking file into (time, objects) frames, as the player's worker reads it.
+    """
+    magic, version, _, frame_count, row_count = struct.unpack_from("<4sHHII", data)
+    assert magic == MAGIC and version == FORMAT_VERSION
+
+    offset = HEADER_SIZE
+    columns = []
+    layout = [("d", frame_count), ("I", frame_count + 1)] + [(typecode, row_count) for typecode in "ffHB"]
+    for typecode, count in layout:
+        values = array(typecode)
+        # Typed arrays need their offset aligned to their element size
+        assert offset % values.itemsize == 0
+        values.frombytes(data[offset:offset + count * values.itemsize])
+        if sys.byteorder == "big":
+            values.byteswap()
+        columns.append(values)
+        offset += count * values.itemsize
+    assert offset == len(data)
+
+    times, starts, xs, ys, labels, groups = columns
+    frames = []
+    for i in range(frame_count):
+        rows = range(starts[i], starts[i + 1])
+        frames.append((times[i], [TrackedObject(xs[row], ys[row], groups[row], labels[row]) for row in rows]))
+    return frames
+
+
+# Coordinates are exact in float32, so the round trip compares equal
+FRAMES = [
+    (0.04, [TrackedObject(0.25, 0.5, HOME, 10), TrackedObject(0.75, 0.125, AWAY, 7), (0.5, 0.5, BALL, 0)]),
+    (0.0, [TrackedObject(0.25, 0.375, HOME, 10)]),
+    (0.08, []),
+]
+
+
+def test_round_trips_tracking_frames():
+    expected = sorted((time, [TrackedObject(*obj) for obj in objects]) for time, objects in FRAMES)
+    assert _decode(encode_tracking(FRAMES)) == expected
+
+
+def test_encodes_an_empty_clip():
+    assert _decode(encode_tracking([])) == []
+
+
+def test_writes_the_encoded_file(tmp_path):
+    path = str(tmp_path / "tracking.bin")
+    write_tracking(path, FRAMES)
+    with open(path, "rb") as f:
+        assert f.read() == encode_tracking(FRAMES)
+    assert [entry.name for entry in tmp_path.iterdir()] == ["tracking.bin"]
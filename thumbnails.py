@@ -0,0 +1,229 @@
+import concurrent.futures
+import hashlib
+import json
+import logging
+import math
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from mp4_parser import MP4Error, iter_file_boxes, parse_movie
+from source_version import read_version
+
+logger = logging.getLogger(__name__)
+
+# Seconds between thumbnails, stretched for clips that would exceed MAX_TILES
+DEFAULT_INTERVAL = 2.0
+MAX_TILES = 100
+COLUMNS = 10
+DEFAULT_TILE_WIDTH = 160
+
+# Bytes read per iteration when downloading a clip
+CHUNK_SIZE = 256 * 1024
+
+USER_AGENT = "video-stream-player-thumbnails"
+
+# Maps URL and validator to the content digest, so unchanged clips are not downloaded again
+INDEX_NAME = "sources.sqlite3"
+
+
+def _open_index(output_dir):
+    db = sqlite3.connect(os.path.join(output_dir, INDEX_NAME), timeout=30)
+    db.execute("CREATE TABLE IF NOT EXISTS sources (url TEXT PRIMARY KEY, validator TEXT NOT NULL, digest TEXT NOT NULL)")
+    return db
+
+
+def _download(url, directory, timeout):
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    fd, path = tempfile.mkstemp(dir=directory, suffix=".part")
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as f, urllib.request.urlopen(request, timeout=timeout) as response:
+            while True:
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, digest.hexdigest()
+
+
+def _movie_info(path):
+    with open(path, "rb") as f:
+        for box in iter_file_boxes(f):
+            if box.type == b"moov":
+                f.seek(box.offset)
+                return parse_movie(f.read(box.size))
+    raise MP4Error("No moov box found")
+
+
+def _write_atomic(path, content):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+
+def _vtt_time(seconds):
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{seconds:06.3f}"
+
+
+def _render(source, output_dir, digest, tile_width, interval):
+    """
+    Render the sprite sheet of one clip and write its JSON and WebVTT indexes.
+    """
+    movie = _movie_info(source)
+    if not movie.duration or not movie.width:
+        raise MP4Error("Clip has no video duration or size")
+
+    count = max(1, math.ceil(movie.duration / interval))
+    if count > MAX_TILES:
+        count = MAX_TILES
+        interval = movie.duration / count
+    columns = min(COLUMNS, count)
+    rows = math.ceil(count / columns)
+    # Even sizes keep every encoder happy
+    tile_height = max(2, round(tile_width * movie.height / movie.width / 2) * 2)
+
+    sprite_name = f"{digest}.jpg"
+    sprite_path = os.path.join(output_dir, sprite_name)
+    temp_sprite = os.path.join(output_dir, f"{digest}.tmp.jpg")
+    subprocess.run(
+        [
+            "ffmpeg", "-v", "error", "-y", "-i", source,
+            "-vf", f"fps=1/{interval},scale={tile_width}:{tile_height},tile={columns}x{rows}",
+            "-frames:v", "1", "-q:v", "5", temp_sprite,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    os.replace(temp_sprite, sprite_path)
+
+    cues = ["WEBVTT", ""]
+    for tile in range(count):
+        x = (tile % columns) * tile_width
+        y = (tile // columns) * tile_height
+        start = tile * interval
+        end = min(movie.duration, start + interval)
+        cues += [f"{_vtt_time(start)} --> {_vtt_time(end)}", f"{sprite_name}#xywh={x},{y},{tile_width},{tile_height}", ""]
+    _write_atomic(os.path.join(output_dir, f"{digest}.vtt"), "\n".join(cues))
+
+    index = {
+        "sprite": sprite_name,
+        "width": tile_width,
+        "height": tile_height,
+        "columns": columns,
+        "count": count,
+        "interval": interval,
+    }
+    # Written last: its presence marks the clip as done
+    _write_atomic(os.path.join(output_dir, f"{digest}.json"), json.dumps(index))
+
+
+def build_clip_thumbnails(url, output_dir, tile_width=DEFAULT_TILE_WIDTH, interval=DEFAULT_INTERVAL, timeout=60):
+    """
+    Produce the sprite sheet and indexes of one clip, reusing earlier results.
+
+    Outputs are named by the SHA-256 of the clip's content. A URL whose ETag
+    (or Last-Modified and length) is unchanged is not downloaded again.
+
+    Returns:
+        str: The content digest, naming <digest>.jpg, .json and .vtt.
+    """
+    try:
+        return _build_clip_thumbnails(url, output_dir, tile_width, interval, timeout)
+    except urllib.error.HTTPError as error:
+        # HTTPError holds the response and cannot be sent back from a worker process
+        raise OSError(f"HTTP {error.code}") from None
+
+
+def _build_clip_thumbnails(url, output_dir, tile_width, interval, timeout):
+    # Without a validator versions cannot be told apart, so the content is always checked
+    validator = read_version(url, timeout, USER_AGENT).validator
+    db = _open_index(output_dir)
+    try:
+        if validator is not None:
+            row = db.execute("SELECT digest FROM sources WHERE url = ? AND validator = ?", (url, validator)).fetchone()
+            if row and os.path.exists(os.path.join(output_dir, f"{row[0]}.json")):
+                return row[0]
+
+        source, digest = _download(url, output_dir, timeout)
+        try:
+            if not os.path.exists(os.path.join(output_dir, f"{digest}.json")):
+                _render(source, output_dir, digest, tile_width, interval)
+        finally:
+            os.remove(source)
+
+        if validator is not None:
+            db.execute("INSERT OR REPLACE INTO sources (url, validator, digest) VALUES (?, ?, ?)", (url, validator, digest))
+            db.commit()
+        return digest
+    finally:
+        db.close()
+
+
+def build_thumbnails(
+    video_dict,
+    output_dir,
+    base_url,
+    workers=None,
+    tile_width=DEFAULT_TILE_WIDTH,
+    interval=DEFAULT_INTERVAL,
+):
+    """
+    Render scrub-preview sprite sheets for a playlist with a process pool.
+
+    Requires ffmpeg on the PATH. Serve output_dir as static files, for
+    example from Streamlit's static folder, and pass the URL it is served
+    at as base_url. Clips that fail are logged and left without previews.
+
+    Args:
+        video_dict (dict): Playlist in the format video_stream_player takes.
+        output_dir (str): Where sprites and indexes are written and cached.
+        base_url (str): URL under which output_dir is served, such as
+            "/app/static/thumbnails/".
+        workers (int): Worker processes, one per CPU by default.
+        tile_width (int): Width of each thumbnail in pixels.
+        interval (float): Seconds between thumbnails.
+
+    Returns:
+        dict: A new playlist whose clips carry a "thumbnails" index URL.
+    """
+    if shutil.which("ffmpeg") is None:
+        raise RuntimeError("build_thumbnails needs ffmpeg on the PATH")
+    os.makedirs(output_dir, exist_ok=True)
+    _open_index(output_dir).close()
+
+    urls = list(dict.fromkeys(clip["url"] for clip in video_dict.values()))
+    digests = {}
+    started = time.monotonic()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(build_clip_thumbnails, url, output_dir, tile_width, interval): url for url in urls
+        }
+        for future in concurrent.futures.as_completed(futures):
+            url = futures[future]
+            try:
+                digests[url] = future.result()
+            except (OSError, ValueError, subprocess.CalledProcessError) as error:
+                logger.warning("No thumbnails for %s: %s", url, error)
+    logger.info("Thumbnails for %d of %d clips in %.1fs", len(digests), len(urls), time.monotonic() - started)
+
+    result = {}
+    for title, clip in video_dict.items():
+        clip = dict(clip)
+        digest = digests.get(clip["url"])
+        if digest:
+            clip["thumbnails"] = f"{base_url}{digest}.json"
+        result[title] = clip
+    return result
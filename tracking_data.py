@@ -0,0 +1,81 @@
+import collections
+import os
+import struct
+
+from typed_arrays import _le_bytes
+
+# File signature and version of the format, checked by the player
+MAGIC = b"SKTR"
+FORMAT_VERSION = 1
+
+# Object groups; the player draws each in its own style
+HOME = 0
+AWAY = 1
+OFFICIAL = 2
+BALL = 3
+
+TrackedObject = collections.namedtuple("TrackedObject", ["x", "y", "group", "label"])
+TrackedObject.__doc__ = """
+One object in one frame. x and y are fractions of the video frame's width and
+height, measured from its top-left corner; label is the number drawn on the
+marker, such as a jersey number, or 0 for none.
+"""
+
+
+def encode_tracking(frames):
+    """
+    Encode per-frame tracking data in the binary columnar format the player draws.
+
+    The file holds a header followed by one array per field, so the player
+    views them as typed arrays without parsing: frame times (float64), the
+    first row of each frame plus an end marker (uint32), then x and y
+    (float32), labels (uint16) and groups (uint8) for every object of every
+    frame. Columns are ordered by element size, which keeps each one aligned.
+
+    Args:
+        frames (iterable): (time, objects) pairs, with time in seconds on the
+            clip file's timeline and objects a list of TrackedObject or
+            (x, y, group, label) tuples. Frames are sorted by time.
+
+    Returns:
+        bytes: The encoded file.
+    """
+    times = []
+    starts = []
+    xs = []
+    ys = []
+    labels = []
+    groups = []
+    for time, objects in sorted(frames, key=lambda frame: frame[0]):
+        times.append(time)
+        starts.append(len(xs))
+        for x, y, group, label in objects:
+            xs.append(x)
+            ys.append(y)
+            groups.append(group)
+            labels.append(label)
+    starts.append(len(xs))
+
+    header = MAGIC + struct.pack("<HHII", FORMAT_VERSION, 0, len(times), len(xs))
+    return b"".join([
+        header,
+        _le_bytes(times, "d"),
+        _le_bytes(starts, "I"),
+        _le_bytes(xs, "f"),
+        _le_bytes(ys, "f"),
+        _le_bytes(labels, "H"),
+        _le_bytes(groups, "B"),
+    ])
+
+
+def write_tracking(path, frames):
+    """
+    Encode tracking data with encode_tracking and write it to path atomically.
+
+    Serve the file as a static file, for example from Streamlit's static
+    folder, and set its URL as the clip's "tracking" field.
+    """
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(encode_tracking(frames))
+    os.replace(temp_path, path)
@@ -0,0 +1,21 @@
+import sys
+from array import array
+
+
+def _le_bytes(values, typecode):
+    """
+    Pack numbers as the little-endian bytes of a browser typed array.
+
+    Args:
+        values (iterable): Numbers to pack.
+        typecode (str): array typecode of the elements, such as "I" for
+            Uint32Array or "d" for Float64Array.
+
+    Returns:
+        bytes: The packed values.
+    """
+    data = array(typecode, values)
+    # Typed arrays in the browser are little-endian on every platform we target
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()